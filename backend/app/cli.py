@@ -1,13 +1,39 @@
 from __future__ import annotations
 import os
 import argparse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.db import SessionLocal
-from app.ml.train import train_and_save
+from app import crud
+from app.crud import current_season
+from app.db import ANALYTICS_DATABASE_URL, SessionLocal, engine, make_engine
+from app.localdb import copy_tables
+from app.ml.predict import backfill_predictions, predictions_for_horizon
+from app.ml.features import FEATURE_ENGINES, rolling_engine_max_diff
+from app.ml.train import train_and_save, update_models
+from app.transfers import plan_transfers
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("cmd", choices=["train"])
+    parser.add_argument("cmd", choices=["train", "update", "backfill", "sync-local", "feature-parity", "plan-transfers"])
+    parser.add_argument("--no-snapshot", action="store_true", help="Re-query the full flat table instead of the cached snapshot")
+    parser.add_argument("--fold-workers", type=int, default=None, help="Processes for rolling-origin folds (env TRAIN_FOLD_WORKERS)")
+    parser.add_argument("--fold-threads", type=int, default=None, help="Threads per fold fit (env TRAIN_FOLD_THREADS)")
+    parser.add_argument("--no-fold-cache", action="store_true", help="Re-evaluate every fold instead of reusing unchanged ones")
+    parser.add_argument("--refresh-frac", type=float, default=None, help="update: share of trees replaced per run (env TRAIN_REFRESH_FRAC)")
+    parser.add_argument("--backend", default=None, help="train: model backend, rf or hgb (env MODEL_BACKEND, or MODEL_VERSION prefix)")
+    parser.add_argument("--evaluate-only", action="store_true", help="train: record the backend in backends.json without replacing the served models")
+    parser.add_argument("--from-gw", type=int, default=None, help="backfill: first GW to predict (default 1)")
+    parser.add_argument("--to-gw", type=int, default=None, help="backfill: last GW to predict (default: latest stats GW)")
+    parser.add_argument("--season", type=int, default=None, help="backfill: season (starting year) of the GWs (default: the latest)")
+    parser.add_argument("--chunk-gws", type=int, default=8, help="backfill: GWs scored per model call")
+    parser.add_argument("--feature-engine", choices=FEATURE_ENGINES, default=None, help="Rolling features in pandas or in SQL window functions (env FEATURE_ENGINE)")
+    parser.add_argument("--to", default=None, help="sync-local: target database URL (default ANALYTICS_DATABASE_URL)")
+    parser.add_argument("--squad", default=None, help="plan-transfers: the current 15 player ids, comma separated")
+    parser.add_argument("--start-gw", type=int, default=None, help="plan-transfers: first GW of the plan")
+    parser.add_argument("--horizon", type=int, default=6, help="plan-transfers: GWs planned")
+    parser.add_argument("--bank", type=float, default=0.0, help="plan-transfers: money in the bank")
+    parser.add_argument("--free-transfers", type=int, default=1, help="plan-transfers: free transfers for the first GW")
+    parser.add_argument("--max-transfers", type=int, default=2, help="plan-transfers: transfers considered per GW")
     args = parser.parse_args()
 
     model_dir = os.getenv("MODEL_DIR", "./models_store")
@@ -16,9 +42,75 @@ def main():
     db: Session = SessionLocal()
     try:
         if args.cmd == "train":
-            report = train_and_save(db, model_dir=model_dir, model_version=model_version)
-            print("TRAIN DONE")
+            report = train_and_save(
+                db, model_dir=model_dir, model_version=model_version, use_snapshot=not args.no_snapshot,
+                fold_workers=args.fold_workers, fold_threads=args.fold_threads,
+                use_fold_cache=not args.no_fold_cache, backend=args.backend, feature_engine=args.feature_engine,
+                evaluate_only=args.evaluate_only,
+            )
+            print("EVALUATE DONE" if args.evaluate_only else "TRAIN DONE")
             print(report)
+        elif args.cmd == "update":
+            # warm-start refresh of the saved forests on the latest data
+            _, _, report = update_models(
+                db, model_dir=model_dir, model_version=model_version, use_snapshot=not args.no_snapshot,
+                refresh_frac=args.refresh_frac, feature_engine=args.feature_engine,
+            )
+            print("UPDATE DONE")
+            print(report)
+        elif args.cmd == "backfill":
+            # one feature build for every season, then each GW of the chosen one is sliced from it
+            season = args.season if args.season is not None else current_season(db)
+            to_gw = args.to_gw
+            if to_gw is None:
+                to_gw = int(db.execute(text("SELECT COALESCE(MAX(gw), 0) FROM player_gameweek_stats WHERE season = :season"),
+                                       {"season": season}).scalar() or 0)
+            report = backfill_predictions(
+                db, args.from_gw or 1, to_gw, model_dir=model_dir, model_version=model_version,
+                chunk_gws=args.chunk_gws, use_snapshot=not args.no_snapshot, feature_engine=args.feature_engine,
+                season=season,
+            )
+            print("BACKFILL DONE")
+            print(report)
+        elif args.cmd == "sync-local":
+            # copy the source tables into the embedded analytics database
+            target = args.to or ANALYTICS_DATABASE_URL
+            if not target:
+                raise SystemExit("sync-local needs --to or ANALYTICS_DATABASE_URL (e.g. duckdb:///./analytics.duckdb)")
+            report = copy_tables(engine, make_engine(target))
+            print("SYNC DONE")
+            print(report)
+        elif args.cmd == "feature-parity":
+            # both rolling-feature engines on the same data; should differ by float rounding only
+            diff = rolling_engine_max_diff(db)
+            print({"max_rel_diff": diff, "ok": diff <= 1e-12})
+            if diff > 1e-12:
+                raise SystemExit(1)
+        elif args.cmd == "plan-transfers":
+            # predicts the horizon GWs that have no stored predictions yet
+            if not args.squad or args.start_gw is None:
+                raise SystemExit("plan-transfers needs --squad and --start-gw")
+            squad = []
+            for pid in (int(x) for x in args.squad.split(",") if x.strip()):
+                p = crud.get_player(db, pid)
+                if not p:
+                    raise SystemExit(f"player {pid} not found")
+                squad.append({"player_id": int(p["id"]), "name": p["name"], "team_id": int(p["team_id"]),
+                              "position": p["position"], "price": float(p["price"])})
+            preds = predictions_for_horizon(db, args.start_gw, args.horizon, model_dir=model_dir,
+                                            model_version=model_version)
+            if not any(preds.values()):
+                raise SystemExit(f"no predictions for GW {args.start_gw} onwards")
+            report = plan_transfers(preds, squad, bank=args.bank, free_transfers=args.free_transfers,
+                                    max_transfers_per_gw=args.max_transfers)
+            for step in report["plan"]:
+                moves = ", ".join(f"{t['out']['name']} -> {t['in']['name']}" for t in step["transfers"]) or "hold"
+                if step["gw"] in report["skipped_gws"]:
+                    moves += " (no predictions)"
+                print(f"GW {step['gw']}: {moves} (free {step['free_transfers']}, hits {step['hits']:g}, "
+                      f"bank {step['bank']:.1f}, points {step['points']:.2f})")
+            print({k: report[k] for k in ("skipped_gws", "net_points", "baseline_points", "gain", "complete", "nodes",
+                                          "seconds")})
     finally:
         db.close()
 
@@ -1,15 +1,33 @@
 from __future__ import annotations
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from typing import Optional, List, Dict, Any
 
+from .db import analytics_session
+from .timing import span
+
+# --- Seasons -------------------------------------------------------------------------
+#
+# Seasons are the starting year (2025 = 2025/26). The API's `gw` arguments mean a GW of
+# the current season: the latest imported one. Every GW-keyed read filters on the season
+# first, which the season-leading keys (sql/add_seasons.sql) turn into one index range.
+
+def current_season(db: Session) -> int:
+    """Latest season in the database (0 on an empty one)."""
+    row = db.execute(text("""SELECT COALESCE((SELECT MAX(season) FROM gameweeks),
+                                             (SELECT MAX(season) FROM player_gameweek_stats), 0) AS season""")).first()
+    return int(row[0] or 0)
+
+def _season(db: Session, season: int | None) -> int:
+    return current_season(db) if season is None else int(season)
+
 def list_players(db: Session, search: Optional[str]=None, team_id: Optional[int]=None, position: Optional[str]=None, limit:int=200):
     q = """SELECT p.id, p.name, p.team_id, p.position, p.price, p.status, p.photo,
                    t.name AS team_name, t.short_name AS team_short
             FROM players p
             LEFT JOIN teams t ON t.id = p.team_id
-            WHERE 1=1"""
-    params: Dict[str, Any] = {}
+            WHERE p.season = :season"""
+    params: Dict[str, Any] = {"season": current_season(db)}
     if search:
         q += " AND p.name LIKE :search"
         params["search"] = f"%{search}%"
@@ -26,18 +44,20 @@ def list_players(db: Session, search: Optional[str]=None, team_id: Optional[int]
 def list_teams(db: Session):
     q = """SELECT id, name, short_name, strength_attack, strength_defense
              FROM teams
+             WHERE season = :season
              ORDER BY name ASC"""
-    return db.execute(text(q)).mappings().all()
+    return db.execute(text(q), {"season": current_season(db)}).mappings().all()
 
 def get_gw_meta(db: Session):
     """Return current/next GW from gameweeks table (may be empty if not imported)."""
     q = """SELECT
              MAX(CASE WHEN is_current=1 THEN gw END) AS current_gw,
              MAX(CASE WHEN is_next=1 THEN gw END) AS next_gw
-           FROM gameweeks"""
-    return db.execute(text(q)).mappings().first()
+           FROM gameweeks
+           WHERE season = :season"""
+    return db.execute(text(q), {"season": current_season(db)}).mappings().first()
 
-def list_matches_for_gw(db: Session, gw: int):
+def list_matches_for_gw(db: Session, gw: int, season: int | None = None):
     q = """SELECT m.id, m.gw, m.kickoff_time,
                     m.home_team_id, ht.name AS home_team_name, ht.short_name AS home_team_short,
                     m.away_team_id, at.name AS away_team_name, at.short_name AS away_team_short,
@@ -45,9 +65,9 @@ def list_matches_for_gw(db: Session, gw: int):
              FROM matches m
              JOIN teams ht ON ht.id = m.home_team_id
              JOIN teams at ON at.id = m.away_team_id
-             WHERE m.gw = :gw
+             WHERE m.season = :season AND m.gw = :gw
              ORDER BY m.kickoff_time ASC, m.id ASC"""
-    return db.execute(text(q), {"gw": gw}).mappings().all()
+    return db.execute(text(q), {"season": _season(db, season), "gw": gw}).mappings().all()
 
 def get_player(db: Session, player_id: int):
     q = """SELECT p.id, p.name, p.team_id, p.position, p.price, p.status, p.photo,
@@ -58,35 +78,61 @@ def get_player(db: Session, player_id: int):
     row = db.execute(text(q), {"pid": player_id}).mappings().first()
     return row
 
-def get_player_history(db: Session, player_id: int, from_gw:int=1, to_gw:int=99):
+def get_player_history(db: Session, player_id: int, from_gw:int=1, to_gw:int=99, season: int | None = None):
     q = """SELECT s.gw, s.minutes, s.total_points, s.goals, s.assists,
                     s.clean_sheet, s.goals_conceded, s.saves, s.penalties_saved, s.penalties_missed, s.own_goals,
                     s.yellow, s.red,
                     s.influence, s.creativity, s.threat, s.ict_index, s.xg, s.xa, s.started
              FROM player_gameweek_stats s
-             WHERE s.player_id = :pid AND s.gw BETWEEN :from_gw AND :to_gw
+             WHERE s.player_id = :pid AND s.season = :season AND s.gw BETWEEN :from_gw AND :to_gw
              ORDER BY s.gw ASC"""
-    return [dict(r) for r in db.execute(text(q), {'pid': player_id, 'from_gw': from_gw, 'to_gw': to_gw}).mappings().all()]
+    params = {'pid': player_id, 'season': _season(db, season), 'from_gw': from_gw, 'to_gw': to_gw}
+    return [dict(r) for r in db.execute(text(q), params).mappings().all()]
+
+# predictions.points_p10/p50/p90 (sql/add_prediction_intervals.sql); older databases lack them
+INTERVAL_COLS = ("points_p10", "points_p50", "points_p90")
+_interval_support: Dict[str, bool] = {}
+
+def has_prediction_intervals(db: Session) -> bool:
+    key = str(db.get_bind().url)
+    if key not in _interval_support:
+        try:
+            cols = {c["name"] for c in inspect(db.get_bind()).get_columns("predictions")}
+            _interval_support[key] = "points_p10" in cols
+        except Exception:
+            db.rollback()
+            _interval_support[key] = False
+    return _interval_support[key]
 
-def get_predictions_for_gw(db: Session, gw:int, team_id: int|None=None, position: str|None=None):
-    q = """SELECT pr.gw, pr.player_id, pr.p_start, pr.expected_points, pr.model_version,
+def get_predictions_for_gw(db: Session, gw:int, team_id: int|None=None, position: str|None=None,
+                           model_version: str|None=None, season: int|None=None):
+    interval_sel = ", ".join(f"pr.{c}" for c in INTERVAL_COLS) if has_prediction_intervals(db) \
+        else ", ".join(f"NULL AS {c}" for c in INTERVAL_COLS)
+    q = f"""SELECT pr.season, pr.gw, pr.player_id, pr.p_start, pr.expected_points, pr.model_version, {interval_sel},
                     p.name, p.team_id, p.position, p.price, p.status, p.photo,
                     t.short_name AS team_short
              FROM predictions pr
              JOIN players p ON p.id = pr.player_id
              LEFT JOIN teams t ON t.id = p.team_id
-             WHERE pr.gw = :gw"""
-    params = {"gw": gw}
+             WHERE pr.season = :season AND pr.gw = :gw"""
+    params = {"season": _season(db, season), "gw": gw}
     if team_id:
         q += " AND p.team_id = :team_id"
         params["team_id"] = team_id
     if position:
         q += " AND p.position = :position"
         params["position"] = position
+    if model_version:
+        # shadow versions share the table (one row per season, gw, player, model_version)
+        q += " AND pr.model_version = :model_version"
+        params["model_version"] = model_version
     q += " ORDER BY pr.expected_points DESC"
-    return db.execute(text(q), params).mappings().all()
+    with span("get_predictions_for_gw") as sp:
+        rows = db.execute(text(q), params).mappings().all()
+        sp.rows = len(rows)
+    return rows
 
-def get_actual_candidates(db: Session, gw: int):
+def get_actual_candidates(db: Session, gw: int, season: int | None = None):
     q = text("""
         SELECT
           p.id AS player_id,
@@ -100,33 +146,68 @@ def get_actual_candidates(db: Session, gw: int):
         FROM player_gameweek_stats s
         JOIN players p ON p.id = s.player_id
         LEFT JOIN teams t ON t.id = p.team_id
-        WHERE s.gw = :gw
+        WHERE s.season = :season AND s.gw = :gw
         ORDER BY s.total_points DESC
     """)
-    rows = db.execute(q, {"gw": gw}).mappings().all()
+    rows = db.execute(q, {"season": _season(db, season), "gw": gw}).mappings().all()
     return [dict(r) for r in rows]
 
-def upsert_predictions(db: Session, gw:int, rows: list[dict]):
-    # rows: {player_id, p_start, expected_points, model_version}
-    sql = """INSERT INTO predictions (gw, player_id, p_start, expected_points, model_version)
-             VALUES (:gw, :player_id, :p_start, :expected_points, :model_version)
+def _upsert_predictions_sql(with_intervals: bool, dialect: str = "mysql") -> str:
+    cols = ["season", "gw", "player_id", "p_start", "expected_points", "model_version"]
+    if with_intervals:
+        cols += list(INTERVAL_COLS)
+    if dialect in ("sqlite", "duckdb"):
+        # embedded local/benchmark databases (see app/localdb.py)
+        updates = ",\n               ".join(f"{c}=excluded.{c}" for c in cols[3:])
+        return f"""INSERT INTO predictions ({", ".join(cols)})
+             VALUES ({", ".join(":" + c for c in cols)})
+             ON CONFLICT (season, gw, player_id, model_version) DO UPDATE SET
+               {updates}"""
+    updates = ",\n               ".join(f"{c}=VALUES({c})" for c in cols[3:])
+    return f"""INSERT INTO predictions ({", ".join(cols)})
+             VALUES ({", ".join(":" + c for c in cols)})
              ON DUPLICATE KEY UPDATE
-               p_start=VALUES(p_start),
-               expected_points=VALUES(expected_points),
-               model_version=VALUES(model_version)"""
+               {updates}"""
+
+def upsert_predictions(db: Session, gw:int, rows: list[dict], season: int | None = None):
+    # rows: {player_id, p_start, expected_points, model_version[, points_p10, points_p50, points_p90]}
+    season = _season(db, season)
+    with_intervals = has_prediction_intervals(db)
+    sql = _upsert_predictions_sql(with_intervals, db.get_bind().dialect.name)
     inserted = 0
-    for r in rows:
-        db.execute(text(sql), {"gw": gw, **r})
-        inserted += 1
-    db.commit()
+    with span("upsert_predictions", rows=len(rows)):
+        for r in rows:
+            params = {"season": season, "gw": gw, **r}
+            if with_intervals:
+                params.update({c: r.get(c) for c in INTERVAL_COLS})
+            db.execute(text(sql), params)
+            inserted += 1
+        db.commit()
     return inserted
 
+def bulk_upsert_predictions(db: Session, rows: list[dict]):
+    # rows: {season, gw, player_id, p_start, expected_points, model_version[, intervals]}, any
+    # number of GWs; sent as one executemany batch instead of a round trip per row
+    if not rows:
+        return 0
+    with_intervals = has_prediction_intervals(db)
+    keys = ("season", "gw", "player_id", "p_start", "expected_points", "model_version")
+    if with_intervals:
+        keys += INTERVAL_COLS
+    with span("bulk_upsert_predictions", rows=len(rows)):
+        sql = _upsert_predictions_sql(with_intervals, db.get_bind().dialect.name)
+        db.execute(text(sql), [{k: r.get(k) for k in keys} for r in rows])
+        db.commit()
+    return len(rows)
+
 def get_meta(db: Session):
-    current = db.execute(text("SELECT gw FROM gameweeks WHERE is_current=1 ORDER BY gw DESC LIMIT 1")).mappings().first()
-    nxt = db.execute(text("SELECT gw FROM gameweeks WHERE is_next=1 ORDER BY gw ASC LIMIT 1")).mappings().first()
-    max_finished = db.execute(text("SELECT MAX(gw) AS gw FROM gameweeks WHERE finished=1")).mappings().first()
-    max_stats = db.execute(text("SELECT MAX(gw) AS gw FROM player_gameweek_stats")).mappings().first()
+    p = {"season": current_season(db)}
+    current = db.execute(text("SELECT gw FROM gameweeks WHERE season=:season AND is_current=1 ORDER BY gw DESC LIMIT 1"), p).mappings().first()
+    nxt = db.execute(text("SELECT gw FROM gameweeks WHERE season=:season AND is_next=1 ORDER BY gw ASC LIMIT 1"), p).mappings().first()
+    max_finished = db.execute(text("SELECT MAX(gw) AS gw FROM gameweeks WHERE season=:season AND finished=1"), p).mappings().first()
+    max_stats = db.execute(text("SELECT MAX(gw) AS gw FROM player_gameweek_stats WHERE season=:season"), p).mappings().first()
     return {
+        "season": p["season"] or None,
         "current_gw": current["gw"] if current else None,
         "next_gw": nxt["gw"] if nxt else None,
         "max_finished_gw": max_finished["gw"] if max_finished and max_finished["gw"] is not None else None,
@@ -141,10 +222,10 @@ def get_team_next_fixture(db: Session, team_id: int):
            FROM matches m
            JOIN teams th ON th.id = m.home_team_id
            JOIN teams ta ON ta.id = m.away_team_id
-           WHERE (m.home_team_id=:tid OR m.away_team_id=:tid) AND m.kickoff_time IS NOT NULL AND m.finished=0
+           WHERE m.season=:season AND (m.home_team_id=:tid OR m.away_team_id=:tid) AND m.kickoff_time IS NOT NULL AND m.finished=0
            ORDER BY m.kickoff_time ASC
            LIMIT 1"""
-    return db.execute(text(q), {"tid": team_id}).mappings().first()
+    return db.execute(text(q), {"tid": team_id, "season": current_season(db)}).mappings().first()
 
 def get_team_last_fixture(db: Session, team_id: int):
     q = """SELECT m.gw, m.kickoff_time, m.finished, m.home_team_id, m.away_team_id,
@@ -154,13 +235,13 @@ def get_team_last_fixture(db: Session, team_id: int):
            FROM matches m
            JOIN teams th ON th.id = m.home_team_id
            JOIN teams ta ON ta.id = m.away_team_id
-           WHERE (m.home_team_id=:tid OR m.away_team_id=:tid) AND m.kickoff_time IS NOT NULL AND m.finished=1
+           WHERE m.season=:season AND (m.home_team_id=:tid OR m.away_team_id=:tid) AND m.kickoff_time IS NOT NULL AND m.finished=1
            ORDER BY m.kickoff_time DESC
            LIMIT 1"""
-    return db.execute(text(q), {"tid": team_id}).mappings().first()
+    return db.execute(text(q), {"tid": team_id, "season": current_season(db)}).mappings().first()
 
 def _leader_query(order_by: str, extra_where: str = ""):
-    where_clause = f"WHERE {extra_where}" if extra_where else ""
+    where_clause = "WHERE s.season = :season" + (f" AND {extra_where}" if extra_where else "")
     return f"""
         SELECT
             p.id AS player_id, p.name, p.position, p.team_id,
@@ -182,9 +263,16 @@ def _leader_query(order_by: str, extra_where: str = ""):
     """
 
 def get_leaders(db: Session, limit: int = 5):
+    # season aggregates over every stats row: served by the analytics engine when configured
+    with analytics_session(db) as adb:
+        return _get_leaders(adb, limit)
+
+def _get_leaders(db: Session, limit: int = 5):
+    params = {"limit": limit, "season": current_season(db)}
+
     def fetch(order_by: str, extra_where: str = ""):
         q = _leader_query(order_by, extra_where)
-        return db.execute(text(q), {"limit": limit}).mappings().all()
+        return db.execute(text(q), params).mappings().all()
 
     pom_q = """
         SELECT
@@ -198,7 +286,7 @@ def get_leaders(db: Session, limit: int = 5):
         FROM players p
         JOIN player_gameweek_stats s ON s.player_id = p.id
         LEFT JOIN teams t ON t.id = p.team_id
-        WHERE s.minutes >= 60
+        WHERE s.season = :season AND s.minutes >= 60
         GROUP BY p.id, p.name, p.position, p.team_id, t.short_name
         HAVING SUM(s.minutes) >= 900
         ORDER BY avg_bps DESC, minutes DESC
@@ -217,7 +305,7 @@ def get_leaders(db: Session, limit: int = 5):
         FROM players p
         JOIN player_gameweek_stats s ON s.player_id = p.id
         LEFT JOIN teams t ON t.id = p.team_id
-        WHERE p.position = 'GK' AND s.minutes >= 60
+        WHERE s.season = :season AND p.position = 'GK' AND s.minutes >= 60
         GROUP BY p.id, p.name, p.position, p.team_id, t.short_name
         HAVING SUM(s.minutes) >= 900
         ORDER BY avg_bps DESC, minutes DESC
@@ -229,6 +317,6 @@ def get_leaders(db: Session, limit: int = 5):
         "top_assists": fetch("SUM(s.assists) DESC, SUM(s.goals) DESC"),
         "most_yellow": fetch("SUM(s.yellow) DESC"),
         "most_red": fetch("SUM(s.red) DESC"),
-        "most_pom": db.execute(text(pom_q), {"limit": limit}).mappings().all(),
-        "best_gk": db.execute(text(best_gk_q), {"limit": limit}).mappings().all(),
+        "most_pom": db.execute(text(pom_q), params).mappings().all(),
+        "best_gk": db.execute(text(best_gk_q), params).mappings().all(),
     }
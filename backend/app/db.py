@@ -1,7 +1,8 @@
 from __future__ import annotations
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,16 +13,51 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASS = os.getenv("DB_PASS", "")
 DB_NAME = os.getenv("DB_NAME", "epl_predictor")
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+# DATABASE_URL overrides the MySQL settings above, e.g. sqlite:///./local.sqlite for a
+# server-less local run. ANALYTICS_DATABASE_URL (e.g. duckdb:///./analytics.duckdb or a
+# SQLite file, filled by `python -m app.cli sync-local`) takes the read-heavy queries:
+# the flat table, prediction-time features and the leaders board. Writes stay on DATABASE_URL.
+DATABASE_URL = os.getenv("DATABASE_URL") or \
+    f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL") or None
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-)
+
+def make_engine(url: str):
+    """Engine with per-backend settings: pooled MySQL, or an embedded SQLite / DuckDB file."""
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA foreign_keys=OFF")
+            cur.close()
+
+        return engine
+    if url.startswith("duckdb"):
+        # needs `pip install duckdb duckdb-engine`
+        return create_engine(url)
+    return create_engine(url, pool_pre_ping=True, pool_recycle=3600)
+
+
+def float_type(db: Session) -> str:
+    """SQL type name for CAST(... AS <type>) to a double on the session's backend."""
+    return "REAL" if db.get_bind().dialect.name == "sqlite" else "DOUBLE"
+
+
+def int_type(db: Session) -> str:
+    """SQL type name for CAST(... AS <type>) to a 64-bit-safe integer on the session's backend."""
+    return "SIGNED" if db.get_bind().dialect.name == "mysql" else "BIGINT"
+
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+analytics_engine = make_engine(ANALYTICS_DATABASE_URL) if ANALYTICS_DATABASE_URL else None
+AnalyticsSession = sessionmaker(autocommit=False, autoflush=False, bind=analytics_engine) if analytics_engine else None
+
 class Base(DeclarativeBase):
     pass
 
@@ -31,3 +67,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+@contextmanager
+def analytics_session(db: Session):
+    """Session for read-only analytical queries: the analytics engine if configured, else `db`."""
+    if AnalyticsSession is None:
+        yield db
+        return
+    s = AnalyticsSession()
+    try:
+        yield s
+    finally:
+        s.close()
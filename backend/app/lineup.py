@@ -1,6 +1,10 @@
 from __future__ import annotations
+import os
+import time
 from typing import List, Dict, Tuple
 
+import numpy as np
+
 FORMATION_MAP = {
     "4-4-2": {"GK":1, "DEF":4, "MID":4, "FWD":2},
     "4-3-3": {"GK":1, "DEF":4, "MID":3, "FWD":3},
@@ -9,12 +13,35 @@ FORMATION_MAP = {
     "5-3-2": {"GK":1, "DEF":5, "MID":3, "FWD":2},
 }
 
-def generate_lineup(pred_rows: List[dict], formation: str="4-4-2", budget: float=100.0, max_per_team:int=3):
-    if formation not in FORMATION_MAP:
-        formation = "4-4-2"
-    need = FORMATION_MAP[formation].copy()
+POSITIONS = ("GK", "DEF", "MID", "FWD")
+
+# search time budget per optimization; the best XI found so far is returned when it runs out
+LINEUP_TIME_BUDGET_MS = float(os.getenv("LINEUP_TIME_BUDGET_MS", "50"))
 
-    # score = expected_points * p_start
+# --- Exact constrained selection ---------------------------------------------------
+#
+# max sum(score) over a pick with exact per-position counts, total price <= budget and at
+# most max_per_team players per club, by branch and bound over compact per-position arrays.
+# Prices are integer tenths (FPL prices are multiples of 0.1m), so the budget is exact.
+# - Dominated candidates go first: if enough others of the same position score at least
+#   as much for no more money, one of them can always replace the candidate (see
+#   _undominated), so it is never needed.
+# - Bound: the same problem without the club limit, solved exactly by a DP over budget
+#   for every suffix of the candidate order (positions one after another):
+#   F[p][j, r, b] = best score of r more players from position p's candidates j.., plus
+#   full later positions, for at most b. A node's bound is one lookup, and its children
+#   are tried best bound first, so the first dive is the DP optimum; the search only
+#   branches further where the club limit cuts into it.
+# - When that optimum breaks the club limit, a few subgradient steps on per-club
+#   multipliers (Lagrangian relaxation of the limit) tighten the bound, and the optimum
+#   repaired into a legal pick (_repaired_pick) is the first incumbent.
+# When the time budget runs out the search unwinds, keeping the largest bound it leaves
+# unexplored: gap = that bound - best score (0 when the search finished: optimal).
+
+_NEG = -1e18
+LAGRANGE_STEPS = 12
+
+def _scored_rows(pred_rows: List[dict]) -> List[dict]:
     rows = []
     for r in pred_rows:
         r = dict(r)
@@ -27,51 +54,278 @@ def generate_lineup(pred_rows: List[dict], formation: str="4-4-2", budget: float
         r["price"] = float(r["price"])
         r["score"] = float(r["expected_points"] * r["p_start"])
         rows.append(r)
+    return rows
+
+def price_units(price: float) -> int:
+    return int(round(float(price) * 10))
+
+def budget_units(budget: float) -> int:
+    return int(np.floor(float(budget) * 10 + 1e-6))
 
-    # sort by score desc
-    rows.sort(key=lambda x: x["score"], reverse=True)
+def _undominated(score: np.ndarray, units: np.ndarray, team: np.ndarray, need_p: int, n_picks: int,
+                 max_per_team: int) -> np.ndarray:
+    """
+    Mask of the candidates (one position, sorted best first) worth keeping. y dominates x
+    if it comes earlier and costs no more. x can go if a dominator is always free to take
+    its place in any pick: either min(need_p, max_per_team) of them are x's teammates, or
+    they span more clubs than a pick can block (need_p - 1 by picking them plus
+    (n_picks - 1) // max_per_team by filling the club).
+    """
+    n = len(score)
+    dom = np.tri(n, k=-1, dtype=bool).T & (units[:, None] <= units[None, :])   # dom[y, x]
+    clubs, t_idx = np.unique(team, return_inverse=True)
+    onehot = np.zeros((n, len(clubs)))
+    onehot[np.arange(n), t_idx] = 1.0
+    per_club = dom.T.astype(float) @ onehot                                  # [x, club]: dominators
+    same = per_club[np.arange(n), t_idx]
+    other = (per_club > 0).sum(axis=1) - (same > 0)
+    return (same < min(need_p, max_per_team)) & (other < need_p + (n_picks - 1) // max_per_team)
 
-    picked = []
-    spent = 0.0
-    team_count: Dict[int,int] = {}
+def _suffix_tables(V: List[np.ndarray], C: List[np.ndarray], need: List[int], budget: int,
+                   root_only: bool = False) -> List[np.ndarray]:
+    """
+    F[p] of shape (n_p + 1, need_p + 1, budget + 1), see above; _NEG where infeasible.
+    V[p][i, r - 1] is candidate i's value when picked with r slots of position p left.
+    root_only keeps just F[p][:1] (two rows in memory instead of n_p + 1).
+    """
+    P = len(need)
+    F: List[np.ndarray] = [None] * P
+    tail = np.zeros(budget + 1)
+    for p in range(P - 1, -1, -1):
+        n, r_max = len(V[p]), need[p]
+        f = np.empty((2 if root_only else n + 1, r_max + 1, budget + 1))
+        last = n % 2 if root_only else n
+        f[last] = _NEG
+        f[last, 0] = tail
+        for i in range(n - 1, -1, -1):
+            cur, nxt = (i % 2, (i + 1) % 2) if root_only else (i, i + 1)
+            f[cur] = f[nxt]
+            c = int(C[p][i])
+            if r_max and c <= budget:
+                np.maximum(f[cur, 1:, c:], V[p][i][:, None] + f[nxt, :-1, :budget + 1 - c], out=f[cur, 1:, c:])
+        F[p] = f[:1] if root_only else f
+        tail = f[0, r_max]
+    return F
 
-    # greedy by best available for each position count
-    for pos in ["GK","DEF","MID","FWD"]:
-        candidates = [r for r in rows if r["position"] == pos]
-        for r in candidates:
-            if need[pos] <= 0:
+def _relaxed_pick(V: List[np.ndarray], C: List[np.ndarray], F: List[np.ndarray], need: List[int],
+                  budget: int) -> List[Tuple[int, int]]:
+    """(position, candidate) pairs of the optimum F[0] describes (club limit ignored)."""
+    out, left = [], budget
+    for p, r in enumerate(need):
+        f = F[p]
+        for i in range(len(V[p])):
+            if r == 0:
                 break
-            if spent + r["price"] > budget:
-                continue
-            tid = int(r["team_id"])
-            if team_count.get(tid,0) >= max_per_team:
-                continue
-            # avoid duplicates
-            if any(p["player_id"] == r["player_id"] for p in picked):
-                continue
-            picked.append(r)
-            spent += r["price"]
-            team_count[tid] = team_count.get(tid,0) + 1
-            need[pos] -= 1
-
-    # if not complete, fill remaining regardless of position (still respect budget/team cap)
-    remaining = sum(need.values())
-    if remaining > 0:
-        for r in rows:
-            if remaining <= 0:
+            c = int(C[p][i])
+            if c <= left and V[p][i, r - 1] + f[i + 1, r - 1, left - c] >= f[i, r, left] - 1e-9:
+                out.append((p, i))
+                r, left = r - 1, left - c
+    return out
+
+def _repaired_pick(S: List[np.ndarray], C: List[np.ndarray], club: List[np.ndarray],
+                   pick: List[Tuple[int, int]], budget: int, max_per_team: int) -> List[Tuple[int, int]] | None:
+    """
+    A relaxed pick made legal: keep the best max_per_team of every club and fill the other
+    slots with the relaxed optimum over candidates from clubs with room; repeat until legal.
+    """
+    for _ in range(len(pick)):
+        kept: Dict[int, int] = {}
+        keep, refill = [], [0] * len(S)
+        for p, i in sorted(pick, key=lambda pi: -S[pi[0]][pi[1]]):
+            if kept.get(club[p][i], 0) >= max_per_team:
+                refill[p] += 1
+            else:
+                keep.append((p, i))
+                kept[club[p][i]] = kept.get(club[p][i], 0) + 1
+        if not any(refill):
+            return pick
+        taken = set(keep)
+        free = [np.array([i for i in range(len(S[p])) if (p, i) not in taken
+                          and kept.get(club[p][i], 0) < max_per_team], dtype=np.int64) for p in range(len(S))]
+        left = budget - sum(int(C[p][i]) for p, i in keep)
+        sub_V = [np.repeat(S[p][free[p]][:, None], refill[p], axis=1) for p in range(len(S))]
+        sub_C = [C[p][free[p]] for p in range(len(S))]
+        F = _suffix_tables(sub_V, sub_C, refill, left)
+        if float(F[0][0, refill[0], left]) <= _NEG / 2:
+            return None
+        pick = keep + [(p, int(free[p][i])) for p, i in _relaxed_pick(sub_V, sub_C, F, refill, left)]
+    return None
+
+def select(score, units, team, pos, need: List[int], budget: int, max_per_team: int,
+           time_budget_ms: float | None = None, weights: List[List[float]] | None = None,
+           cutoff: float = -np.inf) -> Dict:
+    """
+    Exact pick of need[p] candidates with pos == p for every position p, maximising
+    sum(score) with sum(units) <= budget and at most max_per_team per team value.
+    weights[p] (non-increasing, >= 0; default all 1) weighs position p's picks from the
+    highest score down: the objective is sum over p, k of weights[p][k] * k-th best score.
+    Picks worth no more than cutoff are not searched for (cutoff=inf: just the root bound).
+    Returns {picked (candidate indices, None if none found), score, bound, gap,
+    optimal, nodes, candidates (left after dominance), seconds}.
+    """
+    t0 = time.perf_counter()
+    time_budget_ms = LINEUP_TIME_BUDGET_MS if time_budget_ms is None else float(time_budget_ms)
+    deadline = t0 + time_budget_ms / 1000.0
+    score = np.asarray(score, dtype=float)
+    units = np.asarray(units, dtype=np.int64)
+    team = np.asarray(team, dtype=np.int64)
+    pos = np.asarray(pos, dtype=np.int64)
+    budget = max(int(budget), 0)
+    P = len(need)
+
+    kept = 0
+
+    def _result(picked, best, bound, optimal, nodes):
+        return {"picked": picked, "score": float(best), "bound": float(bound), "gap": float(bound - best),
+                "optimal": optimal, "nodes": nodes, "candidates": kept, "seconds": time.perf_counter() - t0}
+
+    # club limit alone rules it out
+    _, per_team = np.unique(team, return_counts=True)
+    if int(np.minimum(per_team, max_per_team).sum()) < sum(need):
+        return _result(None, 0.0, 0.0, True, 0)
+
+    lists, S, C = [], [], []
+    for p in range(P):
+        idx = np.flatnonzero(pos == p)
+        idx = idx[np.lexsort((idx, units[idx], -score[idx]))]
+        idx = idx[_undominated(score[idx], units[idx], team[idx], need[p], sum(need), max_per_team)]
+        lists.append(idx)
+        S.append(score[idx])
+        C.append(units[idx])
+    kept = sum(len(idx) for idx in lists)
+    if any(len(lists[p]) < need[p] for p in range(P)):
+        return _result(None, 0.0, 0.0, True, 0)
+    clubs = np.unique(team)
+    club = [np.searchsorted(clubs, team[idx]) for idx in lists]
+    # V[p][i, r - 1]: value of candidate i picked with r slots left, i.e. as the
+    # (need - r)-th best of its position (candidates are sorted by score)
+    W = [np.asarray(weights[p] if weights is not None else np.ones(need[p]), dtype=float) for p in range(P)]
+    V = [S[p][:, None] * W[p][::-1][None, :] for p in range(P)]
+    if cutoff > -np.inf:
+        # most runs against a cutoff end at the root bound: get it without the full tables
+        root = float(_suffix_tables(V, C, need, budget, root_only=True)[0][0, need[0], budget])
+        if root <= cutoff:
+            return _result(None, 0.0, root if root > _NEG / 2 else -np.inf, True, 0)
+    F = _suffix_tables(V, C, need, budget)
+    root = float(F[0][0, need[0], budget])
+    if root <= _NEG / 2:
+        return _result(None, 0.0, 0.0, True, 0)
+
+    # club limit broken by the relaxed optimum: price it in (multipliers mu per club, by
+    # subgradient steps), score - mu[club] in the tables and max_per_team * sum(mu) on top
+    A, offset = V, 0.0
+    best_bound = root
+    mu = np.zeros(len(clubs))
+    cur_A, cur_F, step = V, F, float(np.mean([s_p[:r].mean() for s_p, r in zip(S, need) if r]))
+    for k in range(LAGRANGE_STEPS):
+        used = np.bincount([club[p][i] for p, i in _relaxed_pick(cur_A, C, cur_F, need, budget)],
+                           minlength=len(clubs)) - max_per_team
+        if (used <= 0).all() or time.perf_counter() > t0 + time_budget_ms / 4000.0:
+            break
+        mu = np.maximum(mu + step / (k + 1) * np.sign(used), 0.0)
+        cur_A = [V[p] - mu[club[p]][:, None] for p in range(P)]
+        cur_F = _suffix_tables(cur_A, C, need, budget)
+        b = float(cur_F[0][0, need[0], budget]) + max_per_team * mu.sum()
+        if b < best_bound:
+            best_bound, A, F, offset = b, cur_A, cur_F, max_per_team * mu.sum()
+        if best_bound <= cutoff:
+            return _result(None, 0.0, best_bound, True, 0)
+
+    counts: Dict[int, int] = {}
+    chosen: List[int] = []
+    st = {"best": cutoff, "best_pick": None, "open": -np.inf, "nodes": 0, "stopped": False}
+    seed = _repaired_pick(S, C, club, _relaxed_pick(A, C, F, need, budget), budget, max_per_team)
+    if seed is not None:
+        value = sum(float(V[p][i, need[p] - 1 - k]) for p in range(P)
+                    for k, i in enumerate(sorted(i for q, i in seed if q == p)))
+        if value > st["best"]:
+            st["best"], st["best_pick"] = value, [int(lists[p][i]) for p, i in seed]
+    eps = 1e-9
+
+    def dfs(p: int, i: int, r: int, cur: float, cur_a: float, left: int) -> None:
+        while r == 0:
+            p += 1
+            if p == P:
+                if cur > st["best"] + eps:
+                    st["best"], st["best_pick"] = cur, list(chosen)
+                return
+            i, r = 0, need[p]
+        f, a_p, c_p, t_p = F[p], A[p], C[p], club[p]
+        js = np.arange(i, len(a_p) - r + 1)
+        c = c_p[js]
+        ok = c <= left
+        child = np.full(len(js), _NEG)
+        child[ok] = cur_a + offset + a_p[js[ok], r - 1] + f[js[ok] + 1, r - 1, left - c[ok]]
+        for k in np.argsort(-child, kind="stable").tolist():
+            bound = float(child[k])
+            if bound <= st["best"] + eps or bound <= _NEG / 2:
                 break
-            if any(p["player_id"] == r["player_id"] for p in picked):
-                continue
-            if spent + r["price"] > budget:
+            st["nodes"] += 1
+            if st["stopped"] or (st["nodes"] & 63 == 0 and time.perf_counter() > deadline):
+                # children come in bound order: this one covers the rest
+                st["stopped"] = True
+                st["open"] = max(st["open"], bound)
+                return
+            j = int(js[k])
+            t = int(t_p[j])
+            n_t = counts.get(t, 0)
+            if n_t >= max_per_team:
                 continue
-            tid = int(r["team_id"])
-            if team_count.get(tid,0) >= max_per_team:
-                continue
-            picked.append(r)
-            spent += r["price"]
-            team_count[tid] = team_count.get(tid,0) + 1
-            remaining -= 1
-
-    total_expected = sum(float(p["expected_points"]) for p in picked)
-    total_score = sum(float(p["score"]) for p in picked)
-    return picked, total_expected, total_score
+            counts[t] = n_t + 1
+            chosen.append(int(lists[p][j]))
+            dfs(p, j + 1, r - 1, cur + float(V[p][j, r - 1]), cur_a + float(a_p[j, r - 1]), left - int(c_p[j]))
+            chosen.pop()
+            counts[t] = n_t
+            if st["stopped"]:
+                st["open"] = max(st["open"], bound)
+                return
+
+    dfs(0, 0, need[0] if P else 0, 0.0, 0.0, budget)
+
+    if st["best_pick"] is None:
+        # nothing (above cutoff) found: there is none if the search finished
+        bound = st["open"] if st["stopped"] else (cutoff if np.isfinite(cutoff) else 0.0)
+        return _result(None, 0.0, bound, not st["stopped"], st["nodes"])
+    best = st["best"]
+    bound = max(best, st["open"]) if st["stopped"] else best
+    return _result(st["best_pick"], best, bound, bound - best <= 1e-6, st["nodes"])
+
+def optimize_lineup(pred_rows: List[dict], formation: str="4-4-2", budget: float=100.0, max_per_team:int=3,
+                    time_budget_ms: float | None = None) -> Dict:
+    """
+    Best XI for the formation (score = expected_points * p_start), exact up to the time
+    budget. Returns {players, total_expected, total_score, formation, optimal, gap, bound,
+    nodes, candidates, seconds}; players is empty when no XI fits the budget and club
+    limit (optimal) or none was found in time (not optimal).
+    """
+    if formation not in FORMATION_MAP:
+        formation = "4-4-2"
+    need = FORMATION_MAP[formation]
+
+    cand = [r for r in _scored_rows(pred_rows) if need.get(r["position"], 0) > 0]
+    res = select(
+        [r["score"] for r in cand], [price_units(r["price"]) for r in cand], [int(r["team_id"]) for r in cand],
+        [POSITIONS.index(r["position"]) for r in cand], [need[p] for p in POSITIONS],
+        budget_units(budget), max_per_team, time_budget_ms=time_budget_ms,
+    )
+
+    picked = [cand[i] for i in res["picked"] or []]
+    picked.sort(key=lambda r: (POSITIONS.index(r["position"]), -r["score"], r["player_id"]))
+    return {
+        "players": picked,
+        "formation": formation,
+        "total_expected": sum(float(p["expected_points"]) for p in picked),
+        "total_score": sum(float(p["score"]) for p in picked),
+        "optimal": res["optimal"],
+        "gap": res["gap"],
+        "bound": res["bound"],
+        "nodes": res["nodes"],
+        "seconds": res["seconds"],
+        "candidates": res["candidates"],
+    }
+
+def generate_lineup(pred_rows: List[dict], formation: str="4-4-2", budget: float=100.0, max_per_team:int=3,
+                    time_budget_ms: float | None = None):
+    res = optimize_lineup(pred_rows, formation=formation, budget=budget, max_per_team=max_per_team,
+                          time_budget_ms=time_budget_ms)
+    return res["players"], res["total_expected"], res["total_score"]
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pandas as pd
+from sqlalchemy import Double, Float, MetaData, delete, select
+
+from .models import Base
+
+# --- Embedded database copies ----------------------------------------------------------
+#
+# The MySQL schema as declared in app.models is also created in SQLite / DuckDB files,
+# and the source tables are copied over in chunks. This is what ANALYTICS_DATABASE_URL
+# points at (feature extraction on a local engine), and what benchmarks/ builds its
+# synthetic data into. Predictions are not copied: they are written to the primary DB.
+
+TABLES = ("teams", "players", "gameweeks", "matches", "player_gameweek_stats", "history_version")
+
+
+def create_schema(engine) -> None:
+    tables = [Base.metadata.tables[t] for t in (*TABLES, "predictions")]
+    if engine.dialect.name != "duckdb":
+        Base.metadata.create_all(engine, tables=tables)
+        return
+    # DuckDB has no SERIAL: plain integer keys (copied ids are kept as they are);
+    # and its FLOAT is single precision, so float stats columns become DOUBLE
+    meta = MetaData()
+    for t in tables:
+        copy = t.to_metadata(meta)
+        for col in copy.primary_key.columns:
+            col.autoincrement = False
+        for col in copy.columns:
+            if type(col.type) is Float:
+                col.type = Double()
+    meta.create_all(engine)
+
+
+def copy_tables(src_engine, dst_engine, tables=TABLES, chunk_rows: int = 50_000) -> dict:
+    """Replace `tables` in dst with the rows of src (model columns only); {table: rows copied}."""
+    create_schema(dst_engine)
+    counts = {}
+    with src_engine.connect() as src, dst_engine.begin() as dst:
+        for name in tables:
+            table = Base.metadata.tables[name]
+            dst.execute(delete(table))
+            result = src.execution_options(stream_results=True).execute(select(*table.columns))
+            n = 0
+            while True:
+                rows = result.mappings().fetchmany(chunk_rows)
+                if not rows:
+                    break
+                _insert(dst, table, rows)
+                n += len(rows)
+            counts[name] = n
+    return counts
+
+
+def _insert(conn, table, rows) -> None:
+    if conn.dialect.name == "duckdb":
+        # row-at-a-time executemany is slow in DuckDB: hand it the chunk as one frame
+        cols = [c.name for c in table.columns]
+        raw = conn.connection.driver_connection
+        raw.register("_chunk", pd.DataFrame([tuple(r[c] for c in cols) for r in rows], columns=cols))
+        try:
+            raw.execute(f"INSERT INTO {table.name} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM _chunk")
+        finally:
+            raw.unregister("_chunk")
+        return
+    conn.execute(table.insert(), [dict(r) for r in rows])
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import logging
 import os
-from fastapi import FastAPI, Depends, HTTPException
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-from .db import get_db
+from .db import SessionLocal, get_db
 from . import crud
+from . import timing
 from .schemas import (
     TeamOut,
     TeamFixtureOut,
@@ -15,19 +20,49 @@ from .schemas import (
     PlayerHistory,
     LeadersOut,
     PredictResponse,
+    PredictRangeRequest,
+    PredictRangeResponse,
     LineupRequest,
     LineupResponse,
+    SquadRequest,
+    SquadResponse,
+    TransferPlanRequest,
+    TransferPlanResponse,
     ActualLineupRequest,
     ActualLineupResponse,
 )
-from .ml.predict import predict_gw
-from .lineup import generate_lineup
+from .ml.predict import (
+    predict_for_gw, predict_for_horizon, predictions_for_horizon, resolve_shadow_models, score_shadow_models,
+)
+from .lineup import optimize_lineup
+from .squad import optimize_squad
+from .transfers import plan_transfers
 from .services.lineup_actual import build_actual_lineup
 
 MODEL_DIR = os.getenv("MODEL_DIR", "./models_store")
 MODEL_VERSION = os.getenv("MODEL_VERSION", "rf_v1")
+# candidate versions scored next to the primary one: SHADOW_MODELS="hgb_v1=./models_hgb,..."
+SHADOW_MODELS = {v: d for v, d in resolve_shadow_models().items() if v != MODEL_VERSION}
+
+log = logging.getLogger(__name__)
+
+# PIPELINE_TIMING=1|mem: per-stage timings of every request, logged and aggregated
+TIMING = timing.timing_mode()
 
-app = FastAPI(title="EPL Lineup & Performance Predictor (FPL)")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if TIMING == "mem":
+        # traced for the server's lifetime, not per request (requests overlap); peaks are approximate
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if TIMING == "mem":
+            tracemalloc.stop()
+
+
+app = FastAPI(title="EPL Lineup & Performance Predictor (FPL)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,9 +73,30 @@ app.add_middleware(
 )
 
 
+if TIMING and not timing.log.handlers:
+    # one JSON line per request on stderr, next to uvicorn's access log
+    timing.log.addHandler(logging.StreamHandler())
+    timing.log.setLevel(logging.INFO)
+
+
+@app.middleware("http")
+async def pipeline_timing(request: Request, call_next):
+    if not TIMING:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    with timing.record(request.method) as rec:
+        response = await call_next(request)
+    # one series per route template (/players/{player_id}), not per concrete path, so the
+    # aggregate stays bounded; 404s and other unrouted requests share one bucket
+    route = request.scope.get("route")
+    rec.name = f"{request.method} {getattr(route, 'path', None) or 'unmatched'}"
+    timing.observe(rec, time.perf_counter() - t0, status=response.status_code)
+    return response
+
+
 @app.get("/health")
 def health():
-    return {"ok": True, "model_version": MODEL_VERSION}
+    return {"ok": True, "model_version": MODEL_VERSION, "shadow_versions": sorted(SHADOW_MODELS)}
 
 
 @app.get("/meta")
@@ -48,12 +104,18 @@ def api_meta(db: Session = Depends(get_db)):
     """Helper for UI: current/next/last-finished GW (requires import_fpl_api.py)."""
     m = crud.get_meta(db) or {}
     return {
+        "season": int(m["season"]) if m.get("season") is not None else None,
         "current_gw": int(m["current_gw"]) if m.get("current_gw") is not None else None,
         "next_gw": int(m["next_gw"]) if m.get("next_gw") is not None else None,
         "last_finished_gw": int(m["max_finished_gw"]) if m.get("max_finished_gw") is not None else None,
         "max_stats_gw": int(m["max_stats_gw"]) if m.get("max_stats_gw") is not None else None,
     }
 
+@app.get("/metrics/pipeline")
+def api_pipeline_metrics():
+    """Per-route, per-stage timings aggregated since start (PIPELINE_TIMING=1 or mem)."""
+    return {"enabled": bool(TIMING), "memory": TIMING == "mem", "routes": timing.stats()}
+
 @app.get("/leaders", response_model=LeadersOut)
 def api_leaders(limit: int = 5, db: Session = Depends(get_db)):
     safe_limit = max(1, min(int(limit or 5), 50))
@@ -188,30 +250,75 @@ def api_player_history(
     return [dict(r) for r in rows]
 
 
+def _opt_float(v):
+    return float(v) if v is not None else None
+
+
+def _prediction_payload(rows):
+    """predict_gw rows -> crud.upsert_predictions rows (point prediction + P10/P50/P90)."""
+    return [
+        {
+            "season": int(r["season"]),
+            "player_id": int(r["player_id"]),
+            "p_start": float(r["p_start"]),
+            "expected_points": float(r["expected_points"]),
+            "points_p10": _opt_float(r.get("points_p10")),
+            "points_p50": _opt_float(r.get("points_p50")),
+            "points_p90": _opt_float(r.get("points_p90")),
+            "model_version": MODEL_VERSION,
+        }
+        for r in rows
+    ]
+
+
+def _run_shadow_models(gw: int, features, intervals: bool | None = None) -> None:
+    """Background task: score the primary request's feature frame with every shadow model and store it."""
+    db = SessionLocal()
+    try:
+        for version, model_dir in SHADOW_MODELS.items():
+            try:
+                rows = score_shadow_models(features, gw, {version: model_dir}, intervals=intervals)[version]
+                crud.bulk_upsert_predictions(db, rows)
+            except Exception:
+                db.rollback()
+                log.exception("shadow model %s failed for GW %s", version, gw)
+    finally:
+        db.close()
+
+
+def _predict_gw(db: Session, gw: int, background_tasks: BackgroundTasks, intervals: bool | None = None):
+    """
+    Primary predictions for gw; shadow models score the same features after the response is sent.
+    intervals: P10/P50/P90 as well (None = PREDICTION_INTERVALS).
+    """
+    rows, _ver, features = predict_for_gw(
+        db, gw, model_dir=MODEL_DIR, model_version=MODEL_VERSION, intervals=intervals, return_features=True
+    )
+    if rows and SHADOW_MODELS:
+        background_tasks.add_task(_run_shadow_models, gw, features, intervals)
+    return rows
+
+
 @app.get("/predictions/gw/{gw}")
 def api_predictions_gw(
     gw: int,
+    background_tasks: BackgroundTasks,
     team_id: int | None = None,
     position: str | None = None,
+    model_version: str | None = None,
     db: Session = Depends(get_db),
 ):
-    rows = crud.get_predictions_for_gw(db, gw, team_id, position)
-    if not rows:
+    # model_version selects a shadow version's stored rows; default is the primary model
+    version = model_version or MODEL_VERSION
+    rows = crud.get_predictions_for_gw(db, gw, team_id, position, model_version=version)
+    if not rows and version == MODEL_VERSION:
         # Try auto-predict if missing
         try:
-            new_rows = predict_gw(db, gw=gw, model_dir=MODEL_DIR, model_version=MODEL_VERSION)
-            payload = [
-                {
-                    "player_id": int(r["player_id"]),
-                    "p_start": float(r["p_start"]),
-                    "expected_points": float(r["expected_points"]),
-                    "model_version": MODEL_VERSION,
-                }
-                for r in new_rows
-            ]
+            new_rows = _predict_gw(db, gw, background_tasks)
+            payload = _prediction_payload(new_rows)
             if payload:
                 crud.upsert_predictions(db, gw, payload)
-                rows = crud.get_predictions_for_gw(db, gw, team_id, position)
+                rows = crud.get_predictions_for_gw(db, gw, team_id, position, model_version=version)
         except Exception as e:
             raise HTTPException(400, f"No predictions for this GW and auto-predict failed: {e}")
     out = []
@@ -226,6 +333,9 @@ def api_predictions_gw(
                 "price": float(r["price"]),
                 "p_start": float(r["p_start"]),
                 "expected_points": float(r["expected_points"]),
+                "points_p10": _opt_float(r.get("points_p10")),
+                "points_p50": _opt_float(r.get("points_p50")),
+                "points_p90": _opt_float(r.get("points_p90")),
                 "model_version": r["model_version"],
             }
         )
@@ -233,46 +343,61 @@ def api_predictions_gw(
 
 
 @app.post("/predict/gw/{gw}", response_model=PredictResponse)
-def api_predict_gw(gw: int, db: Session = Depends(get_db)):
+def api_predict_gw(gw: int, background_tasks: BackgroundTasks, intervals: bool | None = None,
+                   db: Session = Depends(get_db)):
+    """intervals: also store P10/P50/P90 (forest models only; 400 when the model is hgb)."""
     try:
-        rows = predict_gw(db, gw=gw, model_dir=MODEL_DIR, model_version=MODEL_VERSION)
+        rows = _predict_gw(db, gw, background_tasks, intervals=intervals)
     except Exception as e:
         raise HTTPException(400, str(e))
 
     if not rows:
         raise HTTPException(400, f"No features/data for GW {gw}. Past stats might be missing.")
 
-    payload = [
-        {
-            "player_id": int(r["player_id"]),
-            "p_start": float(r["p_start"]),
-            "expected_points": float(r["expected_points"]),
-            "model_version": MODEL_VERSION,
-        }
-        for r in rows
-    ]
+    payload = _prediction_payload(rows)
     inserted = crud.upsert_predictions(db, gw, payload)
     return {"gw": gw, "model_version": MODEL_VERSION, "inserted": inserted}
 
 
-@app.post("/lineup/gw/{gw}", response_model=LineupResponse)
-def api_lineup(gw: int, req: LineupRequest, db: Session = Depends(get_db)):
-    rows = crud.get_predictions_for_gw(db, gw)
+MAX_HORIZON = 10
+
+
+@app.post("/predict/range", response_model=PredictRangeResponse)
+def api_predict_range(req: PredictRangeRequest, db: Session = Depends(get_db)):
+    """Predict req.start_gw .. start_gw + horizon - 1 in one pass (transfer planning)."""
+    if not 1 <= req.horizon <= MAX_HORIZON:
+        raise HTTPException(400, f"horizon must be between 1 and {MAX_HORIZON}")
+    try:
+        rows, _ver = predict_for_horizon(
+            db, req.start_gw, req.horizon, model_dir=MODEL_DIR, model_version=MODEL_VERSION,
+            intervals=req.intervals,
+        )
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+    if not rows:
+        raise HTTPException(400, f"No features/data before GW {req.start_gw}. Past stats might be missing.")
+
+    payload = [{**r, "model_version": MODEL_VERSION} for r in rows]
+    inserted = crud.bulk_upsert_predictions(db, payload)
+    return {
+        "start_gw": req.start_gw,
+        "gws": sorted({int(r["gw"]) for r in rows}),
+        "model_version": MODEL_VERSION,
+        "inserted": inserted,
+    }
+
+
+def _lineup_candidates(db: Session, gw: int, background_tasks: BackgroundTasks) -> list[dict]:
+    """Prediction rows for the GW as optimizer input (predicts the GW first if needed)."""
+    rows = crud.get_predictions_for_gw(db, gw, model_version=MODEL_VERSION)
     if not rows:
         # Attempt auto-predict if missing
         try:
-            new_rows = predict_gw(db, gw=gw, model_dir=MODEL_DIR, model_version=MODEL_VERSION)
-            payload = [
-                {
-                    "player_id": int(r["player_id"]),
-                    "p_start": float(r["p_start"]),
-                    "expected_points": float(r["expected_points"]),
-                    "model_version": MODEL_VERSION,
-                }
-                for r in new_rows
-            ]
+            new_rows = _predict_gw(db, gw, background_tasks)
+            payload = _prediction_payload(new_rows)
             crud.upsert_predictions(db, gw, payload)
-            rows = crud.get_predictions_for_gw(db, gw)
+            rows = crud.get_predictions_for_gw(db, gw, model_version=MODEL_VERSION)
         except Exception as e:
             raise HTTPException(400, f"No predictions for this GW and auto-train failed: {e}")
     if not rows:
@@ -294,18 +419,93 @@ def api_lineup(gw: int, req: LineupRequest, db: Session = Depends(get_db)):
                 "team_short": r.get("team_short"),
             }
         )
+    return pred_rows
 
-    picked, total_expected, total_score = generate_lineup(
-        pred_rows, formation=req.formation, budget=req.budget, max_per_team=req.max_per_team
-    )
+
+@app.post("/lineup/gw/{gw}", response_model=LineupResponse)
+def api_lineup(gw: int, req: LineupRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    pred_rows = _lineup_candidates(db, gw, background_tasks)
+    with timing.span("optimize_lineup", rows=len(pred_rows)):
+        res = optimize_lineup(
+            pred_rows, formation=req.formation, budget=req.budget, max_per_team=req.max_per_team,
+            time_budget_ms=req.time_budget_ms,
+        )
+    if not res["players"]:
+        if res["optimal"]:
+            raise HTTPException(400, "No XI fits this budget, formation and max_per_team.")
+        raise HTTPException(400, "No XI found within the time budget; raise time_budget_ms.")
+    return {
+        "formation": res["formation"],
+        "budget": req.budget,
+        "total_expected_points": float(res["total_expected"]),
+        "total_score": float(res["total_score"]),
+        "optimal": res["optimal"],
+        "gap": float(res["gap"]),
+        "bound": float(res["bound"]),
+        "search_ms": round(res["seconds"] * 1000.0, 3),
+        "players": res["players"],
+    }
+
+@app.post("/squad/gw/{gw}", response_model=SquadResponse)
+def api_squad(gw: int, req: SquadRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    pred_rows = _lineup_candidates(db, gw, background_tasks)
+    with timing.span("optimize_squad", rows=len(pred_rows)):
+        res = optimize_squad(
+            pred_rows, budget=req.budget, max_per_team=req.max_per_team,
+            bench_weight=req.bench_weight, time_budget_ms=req.time_budget_ms,
+        )
+    if not res["players"]:
+        if res["optimal"]:
+            raise HTTPException(400, "No 15-man squad fits this budget and max_per_team.")
+        raise HTTPException(400, "No squad found within the time budget; raise time_budget_ms.")
     return {
-        "formation": req.formation,
+        "gw": gw,
         "budget": req.budget,
-        "total_expected_points": float(total_expected),
-        "total_score": float(total_score),
-        "players": picked,
+        "formation": res["formation"],
+        "captain_id": res["captain_id"],
+        "vice_captain_id": res["vice_captain_id"],
+        "total_price": res["total_price"],
+        "xi_expected_points": float(res["xi_expected"]),
+        "xi_score": float(res["xi_score"]),
+        "bench_score": float(res["bench_score"]),
+        "objective": float(res["objective"]),
+        "optimal": res["optimal"],
+        "gap": float(res["gap"]),
+        "bound": float(res["bound"]),
+        "search_ms": round(res["seconds"] * 1000.0, 3),
+        "players": res["players"],
     }
 
+@app.post("/transfers/plan", response_model=TransferPlanResponse)
+def api_transfer_plan(req: TransferPlanRequest, db: Session = Depends(get_db)):
+    """Transfers for req.start_gw .. start_gw + horizon - 1 from the current squad (predicts missing GWs)."""
+    if not 1 <= req.horizon <= MAX_HORIZON:
+        raise HTTPException(400, f"horizon must be between 1 and {MAX_HORIZON}")
+    squad_rows = []
+    for pid in req.squad:
+        p = crud.get_player(db, pid)
+        if not p:
+            raise HTTPException(404, f"Player {pid} not found")
+        squad_rows.append({"player_id": int(p["id"]), "name": p["name"], "team_id": int(p["team_id"]),
+                           "position": p["position"], "price": float(p["price"])})
+    try:
+        preds = predictions_for_horizon(db, req.start_gw, req.horizon, model_dir=MODEL_DIR, model_version=MODEL_VERSION)
+    except Exception as e:
+        raise HTTPException(400, f"No predictions for these GWs and auto-predict failed: {e}")
+    if not any(preds.values()):
+        raise HTTPException(400, f"No features/data before GW {req.start_gw}. Past stats might be missing.")
+    try:
+        with timing.span("plan_transfers", rows=sum(len(rows) for rows in preds.values())):
+            res = plan_transfers(
+                preds, squad_rows, bank=req.bank, free_transfers=req.free_transfers,
+                max_per_team=req.max_per_team, max_transfers_per_gw=req.max_transfers_per_gw,
+                bench_weight=req.bench_weight, beam_width=req.beam_width,
+                time_budget_ms=req.time_budget_ms, node_budget=req.node_budget,
+            )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {**{k: v for k, v in res.items() if k != "seconds"}, "search_ms": round(res["seconds"] * 1000.0, 3)}
+
 @app.post("/lineup/actual/gw/{gw}", response_model=ActualLineupResponse)
 def api_lineup_actual(gw: int, body: ActualLineupRequest, db: Session = Depends(get_db)):
     candidates = crud.get_actual_candidates(db, gw)
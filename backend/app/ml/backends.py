@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from sklearn.ensemble import (
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+
+# --- Model backends ------------------------------------------------------------------
+#
+# A backend is a pair of estimator classes plus the hyperparameters used for the
+# rolling-origin folds and for the final fit. Everything downstream only relies on
+# predict_proba (start) and predict (points), so any sklearn-style pair fits here.
+
+BACKENDS: Dict[str, Dict[str, Any]] = {
+    "rf": {
+        "classifier": RandomForestClassifier,
+        "regressor": RandomForestRegressor,
+        "fold_clf": {"n_estimators": 500, "max_depth": None, "min_samples_leaf": 3, "random_state": 42},
+        "fold_reg": {"n_estimators": 600, "max_depth": None, "min_samples_leaf": 3, "random_state": 42},
+        "final_clf": {"n_estimators": 800, "min_samples_leaf": 3, "random_state": 42},
+        "final_reg": {"n_estimators": 900, "min_samples_leaf": 3, "random_state": 42},
+        "parallel": True,   # accepts n_jobs
+    },
+    # histogram gradient boosting: binned features, a few hundred shallow trees
+    "hgb": {
+        "classifier": HistGradientBoostingClassifier,
+        "regressor": HistGradientBoostingRegressor,
+        "fold_clf": {"max_iter": 300, "learning_rate": 0.05, "max_leaf_nodes": 31, "min_samples_leaf": 20,
+                     "l2_regularization": 1.0, "early_stopping": False, "random_state": 42},
+        "fold_reg": {"max_iter": 300, "learning_rate": 0.05, "max_leaf_nodes": 31, "min_samples_leaf": 20,
+                     "l2_regularization": 1.0, "early_stopping": False, "random_state": 42},
+        "final_clf": {"max_iter": 400, "learning_rate": 0.05, "max_leaf_nodes": 31, "min_samples_leaf": 20,
+                      "l2_regularization": 1.0, "early_stopping": False, "random_state": 42},
+        "final_reg": {"max_iter": 400, "learning_rate": 0.05, "max_leaf_nodes": 31, "min_samples_leaf": 20,
+                      "l2_regularization": 1.0, "early_stopping": False, "random_state": 42},
+        "parallel": False,  # threads via OpenMP (OMP_NUM_THREADS)
+    },
+}
+
+
+def resolve_backend(backend: str | None = None, model_version: str | None = None) -> str:
+    """Explicit name, else env MODEL_BACKEND, else the MODEL_VERSION prefix (e.g. 'hgb_v1'), else rf."""
+    name = backend or os.getenv("MODEL_BACKEND")
+    if not name and model_version:
+        name = str(model_version).split("_", 1)[0]
+        if name not in BACKENDS:
+            name = None
+    name = (name or "rf").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}'. Choose one of: {', '.join(sorted(BACKENDS))}")
+    return name
+
+
+def backend_params(backend: str, stage: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(classifier params, regressor params) for stage 'fold' or 'final'."""
+    spec = BACKENDS[backend]
+    return spec[f"{stage}_clf"], spec[f"{stage}_reg"]
+
+
+def make_models(backend: str, stage: str, n_jobs: int = -1):
+    spec = BACKENDS[backend]
+    clf_params, reg_params = backend_params(backend, stage)
+    extra = {"n_jobs": n_jobs} if spec["parallel"] else {}
+    return spec["classifier"](**clf_params, **extra), spec["regressor"](**reg_params, **extra)
+
+
+def predict_start(clf, X) -> np.ndarray:
+    return clf.predict_proba(X)[:, 1]
+
+
+def predict_points(reg, X) -> np.ndarray:
+    return reg.predict(X)
+
+
+def predict_points_quantiles(reg, trees, X, quantiles) -> Tuple[np.ndarray, np.ndarray | None]:
+    """
+    Point predictions plus (len(quantiles), n_rows) quantiles of the per-tree outputs of
+    `trees` (a PackedForest view of reg), or None for models without per-tree outputs.
+    One traversal of `trees` yields both: the mean of its float32 leaves is reg's
+    prediction to within PACKED_TOLERANCE (checked when the forests are saved).
+    """
+    if trees is None:
+        return predict_points(reg, X), None
+    per_tree = trees.tree_values(X)
+    return per_tree.mean(axis=0, dtype=np.float64), np.quantile(per_tree, quantiles, axis=0)
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..crud import current_season
+from .features import (ROLLING_COLS, history_fingerprint, history_version, latest_history_key,
+                       rolling_feature_cols, season_key, season_key_sql)
+
+# --- Persisted rolling state -------------------------------------------------------
+#
+# For every player we keep the raw values of their last WINDOW history rows plus the
+# rolling features of their latest row (what build_rolling_features yields for that row:
+# averages over the rows *before* it). When a new GW of stats lands we fold just those
+# rows into the state, so the cost is O(players) instead of O(season). Each window is
+# summed afresh here, while build_rolling_features replays pandas' running sum over the
+# player's whole history, so the two agree to summation-order rounding (~1e-14).
+#
+# GWs are tracked as season_gw keys, so a player's window carries over from their
+# latest earlier rows whatever season those are in, including across a season the
+# player missed: the same rule as build_rolling_features, so serving, training and
+# backfills see the same features.
+#
+# Staleness is checked against history_version (see features.py, "Change detection"):
+# while the importer's stamp is the one the state was checked at, a warm call costs two
+# index lookups and the version read. A moved stamp re-checks the fingerprint up to the
+# watermark once; folding new GWs adds their fingerprint to the stored one.
+
+WINDOW = 5
+STORE_FILE = "rolling_state.npz"
+
+
+def store_path(store_dir: str | None = None) -> str:
+    # lazy import: train imports features, which imports this module
+    from .train import resolve_model_dir
+    return os.path.join(resolve_model_dir(store_dir), STORE_FILE)
+
+
+def empty_state() -> dict:
+    return {
+        "player_id": np.empty(0, dtype=np.int64),
+        "last_season_gw": np.empty(0, dtype=np.int64),
+        # oldest -> newest, NaN padded at the front for short histories
+        "window": np.empty((0, WINDOW, len(ROLLING_COLS)), dtype=float),
+        "features": np.empty((0, 3 * len(ROLLING_COLS)), dtype=float),
+        # max season_gw folded into the state, and history_fingerprint up to it (staleness check)
+        "watermark": 0,
+        "fingerprint": np.zeros(2, dtype=np.int64),
+        # history_version the fingerprint was last checked at (-1: never / no table)
+        "version": -1,
+    }
+
+
+def load_state(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:
+            state = {k: z[k] for k in z.files}
+    except Exception:
+        return None
+    if "last_season_gw" not in state or "fingerprint" not in state:
+        return None  # written by an older version: rebuild
+    state["watermark"] = int(state["watermark"])
+    state["version"] = int(state["version"]) if "version" in state else -1
+    return state
+
+
+def save_state(state: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **state)
+    # atomic swap so concurrent readers never see a partial file
+    os.replace(tmp, path)
+
+
+def _window_features(window: np.ndarray) -> np.ndarray:
+    """(n, WINDOW, k) raw values -> (n, 3k) [avg_3, avg_5, trend] per column, 0 where no history."""
+    def _mean(w):
+        cnt = (~np.isnan(w)).sum(axis=1)
+        tot = np.nansum(w, axis=1)
+        return np.divide(tot, cnt, out=np.zeros_like(tot), where=cnt > 0)
+
+    avg3 = _mean(window[:, -3:, :])
+    avg5 = _mean(window)
+    return np.stack([avg3, avg5, avg3 - avg5], axis=2).reshape(len(window), -1)
+
+
+def fold_rows(state: dict, rows: pd.DataFrame) -> dict:
+    """Fold history rows (player_id, season_gw, ROLLING_COLS) into the state, GW by GW."""
+    if rows.empty:
+        return state
+
+    new_ids = np.setdiff1d(rows["player_id"].to_numpy(dtype=np.int64), state["player_id"])
+    if len(new_ids):
+        k = len(ROLLING_COLS)
+        pid = np.concatenate([state["player_id"], new_ids])
+        order = np.argsort(pid, kind="stable")
+        state = {
+            **state,
+            "player_id": pid[order],
+            "last_season_gw": np.concatenate([state["last_season_gw"], np.zeros(len(new_ids), dtype=np.int64)])[order],
+            "window": np.concatenate([state["window"], np.full((len(new_ids), WINDOW, k), np.nan)])[order],
+            "features": np.concatenate([state["features"], np.zeros((len(new_ids), 3 * k))])[order],
+        }
+
+    gws = rows["season_gw"].to_numpy(dtype=np.int64)
+    pids = rows["player_id"].to_numpy(dtype=np.int64)
+    vals = rows[ROLLING_COLS].to_numpy(dtype=float)
+    window = state["window"]
+    for g in np.unique(gws):
+        m = gws == g
+        idx = np.searchsorted(state["player_id"], pids[m])
+        # features of this row use only the rows before it
+        state["features"][idx] = _window_features(window[idx])
+        state["last_season_gw"][idx] = g
+        window[idx] = np.concatenate([window[idx, 1:], vals[m][:, None, :]], axis=1)
+
+    state["watermark"] = max(int(state["watermark"]), int(gws.max()))
+    return state
+
+
+def load_history_rows(db: Session, key_from: int, key_to: int) -> pd.DataFrame:
+    """Raw rolling inputs for key_from < season_gw <= key_to (same row set as load_flat_table)."""
+    key = season_key_sql(db)
+    q = f"""SELECT
+                {key} AS season_gw,
+                s.player_id,
+                s.minutes,
+                s.total_points AS expected_points_actual,
+                s.goals,
+                s.assists,
+                s.xg,
+                s.xa,
+                s.ict_index,
+                s.influence,
+                s.creativity,
+                s.threat,
+                s.bonus,
+                s.bps
+            FROM player_gameweek_stats s
+            JOIN players p ON p.id = s.player_id
+            JOIN teams t ON t.id = p.team_id
+            WHERE s.season BETWEEN :season_from AND :season_to
+              AND {key} > :key_from AND {key} <= :key_to
+            ORDER BY s.season ASC, s.gw ASC, s.player_id ASC"""
+    params = {"season_from": int(key_from) // 100, "season_to": int(key_to) // 100, "key_from": key_from, "key_to": key_to}
+    return pd.DataFrame(db.execute(text(q), params).mappings().all())
+
+
+def load_history_window(db: Session, key_to: int, n_last: int = WINDOW + 1) -> pd.DataFrame:
+    """
+    Last `n_last` rows per player with season_gw <= key_to, from any season up to key_to's.
+    The bound and the per-player window are applied in the database, so only
+    ~n_last * players rows are shipped.
+    WINDOW + 1 rows are enough to rebuild the state: WINDOW rows feed the features of the
+    latest row, and the latest WINDOW rows become the window.
+    """
+    key = season_key_sql(db, "h")
+    q = f"""SELECT
+                s.season_gw,
+                s.player_id,
+                s.minutes,
+                s.expected_points_actual,
+                s.goals,
+                s.assists,
+                s.xg,
+                s.xa,
+                s.ict_index,
+                s.influence,
+                s.creativity,
+                s.threat,
+                s.bonus,
+                s.bps
+            FROM (
+                SELECT
+                    {key} AS season_gw, h.player_id, h.minutes, h.total_points AS expected_points_actual,
+                    h.goals, h.assists, h.xg, h.xa, h.ict_index, h.influence, h.creativity,
+                    h.threat, h.bonus, h.bps,
+                    ROW_NUMBER() OVER (PARTITION BY h.player_id ORDER BY h.season DESC, h.gw DESC) AS rn
+                FROM player_gameweek_stats h
+                WHERE h.season <= :season_to AND {key} <= :key_to
+            ) s
+            JOIN players p ON p.id = s.player_id
+            JOIN teams t ON t.id = p.team_id
+            WHERE s.rn <= :n_last
+            ORDER BY s.season_gw ASC, s.player_id ASC"""
+    params = {"season_to": int(key_to) // 100, "key_to": key_to, "n_last": n_last}
+    return pd.DataFrame(db.execute(text(q), params).mappings().all())
+
+
+def _fingerprint_upto(db: Session, key: int, key_from: int | None = None) -> np.ndarray:
+    """history_fingerprint up to `key` (of the GWs after `key_from` if given)."""
+    return np.asarray(history_fingerprint(db, key, key_from=key_from), dtype=np.int64)
+
+
+def state_to_frame(state: dict) -> pd.DataFrame:
+    out = pd.DataFrame(state["features"], columns=rolling_feature_cols())
+    out.insert(0, "player_id", state["player_id"])
+    return out
+
+
+def rolling_features_asof(db: Session, gw: int, store_dir: str | None = None, season: int | None = None) -> pd.DataFrame:
+    """
+    Rolling features of each player's latest history row before `gw` of `season`
+    (default: the current one), player_id + rolling cols. Empty frame if there is no history.
+    """
+    key = season_key(current_season(db) if season is None else int(season), int(gw))
+    # read before the rows: an import committed in between leaves the stored version stale
+    version = history_version(db)
+    hist_max = latest_history_key(db, key)
+    if hist_max is None:
+        return pd.DataFrame()
+
+    path = store_path(store_dir)
+    state = load_state(path)
+    persist, changed = True, False
+    if state is not None and state["watermark"] > hist_max:
+        # store is ahead of the requested GW (backtest): build a throwaway state
+        state, persist = empty_state(), False
+    elif state is None:
+        state = empty_state()
+    elif version is None or version != state["version"]:
+        if np.array_equal(_fingerprint_upto(db, state["watermark"]), state["fingerprint"]):
+            changed = True
+        else:
+            # rows of earlier GWs were added, removed or corrected: rebuild from scratch
+            state = empty_state()
+
+    if state["watermark"] < hist_max:
+        if state["watermark"] == 0 or hist_max - state["watermark"] > WINDOW:
+            # cold start or far behind: only the last WINDOW + 1 rows per player matter
+            state = fold_rows(empty_state(), load_history_window(db, hist_max))
+            state["fingerprint"] = _fingerprint_upto(db, hist_max)
+        else:
+            delta = _fingerprint_upto(db, hist_max, key_from=state["watermark"])
+            state = fold_rows(state, load_history_rows(db, state["watermark"], hist_max))
+            state["fingerprint"] = state["fingerprint"] + delta
+        state["watermark"] = hist_max
+        changed = True
+    if changed and persist:
+        state["version"] = -1 if version is None else version
+        save_state(state, path)
+
+    return state_to_frame(state)
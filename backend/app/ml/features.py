@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import os
+
+import numpy as np
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
+from ..crud import current_season
+from ..db import analytics_session, float_type, int_type
+from ..timing import span
+
 # --- Data extraction (FPL schema) -------------------------------------------------
 
-def load_flat_table(db: Session) -> pd.DataFrame:
+def load_flat_table(db: Session, key_from: int | None = None) -> pd.DataFrame:
     """
-    Returns one row per (gw, player).
+    Returns one row per (season, gw, player), every season, optionally only rows after
+    the season_key `key_from` (see season_key).
     Target columns:
       - started (classification)
       - expected_points_actual (regression)  -> uses total_points
@@ -16,12 +24,119 @@ def load_flat_table(db: Session) -> pd.DataFrame:
       - minutes, total_points, goals, assists, xg, xa, ict_index, influence, creativity, threat
       - context: is_home, opp_strength_def, team_att, team_def, injury_flag, price
     """
-    q = """SELECT
+    with analytics_session(db) as adb:
+        return _load_flat_table(adb, key_from)
+
+# --- Seasons -------------------------------------------------------------------------
+#
+# History spans several seasons (season = starting year). Rows are ordered by
+# season_key = season * 100 + gw, so a player's rolling windows run on from the end of
+# one season into the start of the next. Range filters on the key always also bound
+# `season` itself, which the season-leading indexes can seek on.
+
+def season_key(season, gw):
+    """season * 100 + gw: one increasing key across seasons."""
+    return season * 100 + gw
+
+def season_key_sql(db: Session, alias: str = "s") -> str:
+    """season_key as an SQL expression (season is a SMALLINT: widened first, DuckDB checks overflow)."""
+    prefix = f"{alias}." if alias else ""
+    return f"CAST({prefix}season AS {int_type(db)}) * 100 + {prefix}gw"
+
+def _after_key_sql(db: Session, alias: str = "s") -> str:
+    return f"{alias}.season >= :key_season AND {season_key_sql(db, alias)} > :key"
+
+def _after_key_params(key: int) -> dict:
+    return {"key": int(key), "key_season": int(key) // 100}
+
+# --- Change detection ----------------------------------------------------------------
+#
+# The rolling state and the flat-table snapshot are built from the stats rows up to a
+# watermark and are reused while history_fingerprint of those rows is unchanged: the
+# row count plus a checksum over every stats value the flat table reads, each row
+# weighted by a hash of its (season, gw, player, opponent). A corrected bonus or xG in
+# a GW that was already folded changes the checksum though not the count, and so does
+# the importer's id renumbering at a season roll-over (roll_over_ids in
+# scripts/import_fpl_api.py), which would otherwise attach cached rows to whoever holds
+# the old ids now. Values are rounded to 1/100 and summed as integers (mod a prime per
+# row), so the result is exact, the same on every backend, and additive over GW ranges:
+# a cache that folds new GWs adds their fingerprint (key_from) instead of re-reading
+# the rows it already holds.
+#
+# Checksumming the whole history is still a full scan, so it is not done per request.
+# The importer bumps history_version (sql/add_history_version.sql) in every
+# transaction that writes stats or renumbers ids; the caches store the version they
+# were checked against and only recompute the fingerprint when it moved. Databases
+# without the table (history_version() is None) check the fingerprint every time.
+
+FINGERPRINT_COLS = [
+    "started", "minutes", "total_points", "goals", "assists", "clean_sheet", "saves", "yellow", "red",
+    "bonus", "bps", "influence", "creativity", "threat", "ict_index", "xg", "xa", "was_home", "difficulty",
+]
+_FINGERPRINT_MOD = 65521
+_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71)
+
+_version_support: dict[str, bool] = {}
+
+def history_version(db: Session) -> int | None:
+    """The importer's history_version stamp; None if the database has no such table."""
+    url = str(db.get_bind().url)
+    if url not in _version_support:
+        try:
+            _version_support[url] = inspect(db.get_bind()).has_table("history_version")
+        except Exception:
+            db.rollback()
+            _version_support[url] = False
+    if not _version_support[url]:
+        return None
+    v = db.execute(text("SELECT version FROM history_version WHERE id = 1")).scalar()
+    return None if v is None else int(v)
+
+def history_fingerprint(db: Session, key_to: int, key_from: int | None = None) -> list[int]:
+    """[rows, checksum] of the flat-table rows with key_from < season_gw <= key_to."""
+    it, ft, key = int_type(db), float_type(db), season_key_sql(db)
+    value = " + ".join(f"{p} * COALESCE(CAST(s.{c} AS {ft}), 0)" for p, c in zip(_PRIMES, FINGERPRINT_COLS))
+    row = (f"(CAST(s.player_id AS {it}) * 7919 + CAST(COALESCE(s.opponent_team_id, 0) AS {it}) * 65537"
+           f" + ({key}) * 104729) % {_FINGERPRINT_MOD}")
+    where = f"s.season <= :season_to AND {key} <= :key_to"
+    params = {"key_to": int(key_to), "season_to": int(key_to) // 100}
+    if key_from is not None:
+        where += f" AND {_after_key_sql(db)}"
+        params.update(_after_key_params(key_from))
+    q = f"""SELECT COUNT(*) AS n,
+                   SUM({row} * (CAST(ROUND(({value}) * 100) AS {it}) % {_FINGERPRINT_MOD})) AS checksum
+            FROM player_gameweek_stats s
+            JOIN players p ON p.id = s.player_id
+            JOIN teams t ON t.id = p.team_id
+            WHERE {where}"""
+    r = db.execute(text(q), params).mappings().first()
+    return [int(r["n"] or 0), int(r["checksum"] or 0)]
+
+def latest_history_key(db: Session, before_key: int) -> int | None:
+    """Max season_gw with stats before `before_key`, as two lookups on the (season, gw) index."""
+    season, gw = divmod(int(before_key), 100)
+    r = db.execute(text("SELECT MAX(gw) FROM player_gameweek_stats WHERE season = :season AND gw < :gw"),
+                   {"season": season, "gw": gw}).scalar()
+    if r is not None:
+        return season_key(season, int(r))
+    prev = db.execute(text("SELECT MAX(season) FROM player_gameweek_stats WHERE season < :season"),
+                      {"season": season}).scalar()
+    if prev is None:
+        return None
+    r = db.execute(text("SELECT MAX(gw) FROM player_gameweek_stats WHERE season = :season"),
+                   {"season": int(prev)}).scalar()
+    return season_key(int(prev), int(r))
+
+def _flat_table_sql(db: Session) -> str:
+    """The flat-table SELECT (no WHERE / ORDER BY), shared by both feature engines."""
+    return f"""SELECT
+                s.season,
                 s.gw,
+                {season_key_sql(db)} AS season_gw,
                 p.id AS player_id,
                 p.team_id,
                 p.position,
-                CAST(p.price AS DOUBLE) AS price,
+                CAST(p.price AS {float_type(db)}) AS price,
                 p.status,
                 COALESCE(p.chance_playing_next, 100) AS chance_playing_next,
 
@@ -33,7 +148,10 @@ def load_flat_table(db: Session) -> pd.DataFrame:
                 COALESCE(opp.strength_defense, 50) AS opp_strength_def,
 
                 -- per-GW stats (targets + raw)
-                s.started,
+                {_STATS_SELECT}
+            {_FLAT_FROM}"""
+
+_STATS_SELECT = """s.started,
                 s.minutes,
                 s.total_points AS expected_points_actual,
                 s.goals,
@@ -52,13 +170,225 @@ def load_flat_table(db: Session) -> pd.DataFrame:
                 s.xa,
 
                 s.was_home AS is_home,
-                COALESCE(s.difficulty, 3) AS difficulty
-            FROM player_gameweek_stats s
+                COALESCE(s.difficulty, 3) AS difficulty"""
+
+_FLAT_FROM = """FROM player_gameweek_stats s
             JOIN players p ON p.id = s.player_id
             JOIN teams t ON t.id = p.team_id
-            LEFT JOIN teams opp ON opp.id = s.opponent_team_id
-            ORDER BY s.gw ASC"""
-    df = pd.DataFrame(db.execute(text(q)).mappings().all())
+            LEFT JOIN teams opp ON opp.id = s.opponent_team_id"""
+
+def _load_flat_table(db: Session, key_from: int | None = None) -> pd.DataFrame:
+    params = {}
+    where = ""
+    if key_from is not None:
+        where = f"WHERE {_after_key_sql(db)}"
+        params = _after_key_params(key_from)
+    q = f"""{_flat_table_sql(db)}
+            {where}
+            ORDER BY s.season ASC, s.gw ASC"""
+    with span("load_flat_table.count"):
+        n = int(db.execute(text(f"SELECT COUNT(*) {_FLAT_FROM} {where}"), params).scalar() or 0)
+    with span("load_flat_table.sql", rows=n) as sp:
+        result = _stream(db, q, params)
+        buf = _ColumnBuffers(list(result.keys()), n)
+        for rows in result.partitions():
+            buf.append(rows)
+        sp.rows = buf.n
+    return _finish_flat_table(buf.frame())
+
+# --- Flat table from its stats rows ------------------------------------------------
+#
+# A flat-table row is a per-GW stats row joined with its player and clubs as they are
+# *now* (price, status, chance of playing, strengths). load_flat_stats reads the stats
+# side only, which does not change once a GW is final, and join_flat_table adds the
+# current players / teams (load_player_columns), giving the rows and columns of
+# load_flat_table. The flat-table snapshot (snapshot.py) stores the stats side.
+
+PLAYER_COLS = ["team_id", "position", "price", "status", "chance_playing_next", "team_att", "team_def"]
+
+def load_flat_stats(db: Session, key_from: int | None = None) -> pd.DataFrame:
+    """season, gw, season_gw, player_id, opponent_team_id and the per-GW stats of the flat-table rows."""
+    with analytics_session(db) as adb:
+        params = {}
+        where = ""
+        if key_from is not None:
+            where = f"WHERE {_after_key_sql(adb)}"
+            params = _after_key_params(key_from)
+        q = f"""SELECT
+                    s.season,
+                    s.gw,
+                    {season_key_sql(adb)} AS season_gw,
+                    s.player_id,
+                    COALESCE(s.opponent_team_id, 0) AS opponent_team_id,
+                    {_STATS_SELECT}
+                {_FLAT_FROM}
+                {where}
+                ORDER BY s.season ASC, s.gw ASC"""
+        n = int(adb.execute(text(f"SELECT COUNT(*) {_FLAT_FROM} {where}"), params).scalar() or 0)
+        with span("load_flat_stats.sql", rows=n) as sp:
+            result = _stream(adb, q, params)
+            buf = _ColumnBuffers(list(result.keys()), n)
+            for rows in result.partitions():
+                buf.append(rows)
+            sp.rows = buf.n
+    return buf.frame()
+
+def load_player_columns(db: Session) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(players: player_id + PLAYER_COLS, teams: id + strength_defense), both sorted by id."""
+    with analytics_session(db) as adb:
+        players = pd.DataFrame(adb.execute(text(f"""SELECT
+                    p.id AS player_id,
+                    p.team_id,
+                    p.position,
+                    CAST(p.price AS {float_type(adb)}) AS price,
+                    p.status,
+                    COALESCE(p.chance_playing_next, 100) AS chance_playing_next,
+                    t.strength_attack AS team_att,
+                    t.strength_defense AS team_def
+                FROM players p
+                JOIN teams t ON t.id = p.team_id
+                ORDER BY p.id""")).mappings().all(), columns=["player_id", *PLAYER_COLS])
+        teams = pd.DataFrame(adb.execute(text("SELECT id, strength_defense FROM teams ORDER BY id")).mappings().all(),
+                             columns=["id", "strength_defense"])
+    return players, teams
+
+def join_flat_table(stats: pd.DataFrame, players: pd.DataFrame, teams: pd.DataFrame) -> pd.DataFrame:
+    """
+    load_flat_stats rows + load_player_columns -> the flat table. Rows of players no longer
+    in `players` are dropped (the inner JOIN of load_flat_table); the stats columns are
+    passed through without a copy otherwise.
+    """
+    if stats.empty:
+        return pd.DataFrame()
+    pids = players["player_id"].to_numpy(dtype=np.int64)
+    sp = stats["player_id"].to_numpy(dtype=np.int64)
+    at = np.minimum(np.searchsorted(pids, sp), max(len(pids) - 1, 0))
+    found = pids[at] == sp if len(pids) else np.zeros(len(sp), dtype=bool)
+    if not found.all():
+        stats, at = stats[found], at[found]
+
+    tids = teams["id"].to_numpy(dtype=np.int64)
+    opp = stats["opponent_team_id"].to_numpy(dtype=np.int64)
+    opp_at = np.minimum(np.searchsorted(tids, opp), max(len(tids) - 1, 0))
+    opp_def = np.where(tids[opp_at] == opp, teams["strength_defense"].to_numpy()[opp_at], 50) if len(tids) \
+        else np.full(len(opp), 50)
+
+    out = {c: stats[c].to_numpy() for c in ("season", "gw", "season_gw", "player_id")}
+    for c in PLAYER_COLS:
+        out[c] = players[c].to_numpy()[at]
+    out["opp_strength_def"] = opp_def
+    for c in stats.columns:
+        if c not in out and c != "opponent_team_id":
+            out[c] = stats[c].to_numpy()
+    return _finish_flat_table(pd.DataFrame(out, copy=False))
+
+# --- Streaming loader --------------------------------------------------------------
+#
+# The flat table is read through a server-side cursor (stream_results; SSCursor on
+# MySQL) in chunks of STREAM_CHUNK_ROWS, and each chunk is converted column by column
+# into preallocated NumPy buffers of the compact dtypes below. Only one chunk of
+# driver rows is alive at a time, instead of a RowMapping per row plus a Python
+# object per cell before the DataFrame exists.
+# iter_flat_table yields the same rows ordered by player, in frames of whole players,
+# so the rolling windows can be built chunk by chunk (build_rolling_features_streamed).
+
+STREAM_CHUNK_ROWS = int(os.getenv("FLAT_TABLE_CHUNK_ROWS", "50000"))
+
+def _stream(db: Session, q: str, params: dict, chunk_rows: int | None = None):
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    return db.execute(text(q).execution_options(stream_results=True), params).yield_per(chunk_rows)
+
+class _ColumnBuffers:
+    """Typed column buffers filled from driver row chunks (categoricals held as int8 codes)."""
+
+    def __init__(self, names: list[str], capacity: int):
+        self.names = names
+        self.n = 0
+        self.cols = {c: np.empty(max(capacity, 0), dtype=self._buffer_dtype(c)) for c in names}
+
+    @staticmethod
+    def _buffer_dtype(c: str):
+        dtype = _column_dtype(c)
+        return np.int8 if isinstance(dtype, pd.CategoricalDtype) else dtype
+
+    def append(self, rows) -> None:
+        k = len(rows)
+        if not k:
+            return
+        if self.n + k > len(self.cols[self.names[0]]):
+            # more rows than counted (inserted since the COUNT): grow geometrically
+            cap = max(self.n + k, 2 * len(self.cols[self.names[0]]))
+            for c, buf in self.cols.items():
+                grown = np.empty(cap, dtype=buf.dtype)
+                grown[:self.n] = buf[:self.n]
+                self.cols[c] = grown
+        for c, values in zip(self.names, zip(*rows)):
+            self.cols[c][self.n:self.n + k] = _column_values(c, values)
+        self.n += k
+
+    def frame(self) -> pd.DataFrame:
+        out = {}
+        for c in self.names:
+            arr = self.cols[c][:self.n]
+            dtype = FLAT_TABLE_DTYPES.get(c)
+            out[c] = pd.Categorical.from_codes(arr, dtype=dtype) if isinstance(dtype, pd.CategoricalDtype) else arr
+        return pd.DataFrame(out)
+
+def _column_dtype(c: str):
+    if c in FLAT_TABLE_DTYPES:
+        return FLAT_TABLE_DTYPES[c]
+    # rolling features (SQL engine)
+    return np.float64 if c.endswith(("_avg_3", "_avg_5", "_trend")) else object
+
+def _column_values(c: str, values: tuple) -> np.ndarray:
+    """One column of a driver chunk as a NumPy array of the column's buffer dtype."""
+    dtype = _column_dtype(c)
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = {v: i for i, v in enumerate(dtype.categories)}
+        return np.fromiter((codes.get(v, -1) for v in values), dtype=np.int8, count=len(values))
+    if dtype is object:
+        return np.asarray(values, dtype=object)
+    try:
+        try:
+            # Decimal and bool convert directly; None becomes NaN for floats
+            return np.asarray(values, dtype=dtype)
+        except (TypeError, ValueError):
+            fill = 100 if c == "chance_playing_next" else 0
+            return np.asarray([fill if v is None else v for v in values], dtype=dtype)
+    except OverflowError as e:
+        raise ValueError(f"flat table column {c!r} has values outside {np.dtype(dtype).name}") from e
+
+def iter_flat_table(db: Session, chunk_rows: int | None = None):
+    """
+    The flat table ordered by (player_id, season, gw), as frames of about `chunk_rows` rows that
+    always hold a player's full history (a player is never split across frames).
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    with analytics_session(db) as adb:
+        q = f"""{_flat_table_sql(adb)}
+                ORDER BY s.player_id, s.season, s.gw"""
+        result = _stream(adb, q, {}, chunk_rows)
+        names = list(result.keys())
+        pid_at = names.index("player_id")
+        carry: list = []
+        for rows in result.partitions():
+            rows = carry + list(rows)
+            last = rows[-1][pid_at]
+            cut = len(rows)
+            while cut > 0 and rows[cut - 1][pid_at] == last:
+                cut -= 1
+            carry = rows[cut:]
+            if cut:
+                yield _chunk_frame(names, rows[:cut])
+        if carry:
+            yield _chunk_frame(names, carry)
+
+def _chunk_frame(names: list[str], rows: list) -> pd.DataFrame:
+    buf = _ColumnBuffers(names, len(rows))
+    buf.append(rows)
+    return _finish_flat_table(buf.frame())
+
+def _finish_flat_table(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
@@ -69,85 +399,338 @@ def load_flat_table(db: Session) -> pd.DataFrame:
     for c in ["price","team_att","team_def","opp_strength_def","difficulty"]:
         df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
 
+    return compact_flat_table(df)
+
+# --- Compact dtypes ----------------------------------------------------------------
+#
+# The flat table is held with the smallest dtype that fits each column instead of
+# int64/float64/object: categoricals for position/status, int8/int16 for flags and
+# per-GW counts, int32 for ids (archived clubs and players live at 10,000,000+, see
+# scripts/import_fpl_api.py), float32 for price. The stats the rolling windows average
+# (ROLLING_COLS) and the rolling features stay float64, so both engines average the
+# stored values and agree to float64 rounding; only the finished feature matrix
+# (dataset_for_training, predict) is cast to FEATURE_DTYPE, which the tree models split
+# on anyway. Values that do not fit their column's dtype raise instead of wrapping around.
+
+POSITIONS = ("GK", "DEF", "MID", "FWD")
+STATUSES = ("fit", "injured", "doubt", "suspended", "unknown")
+FEATURE_DTYPE = np.float32
+
+FLAT_TABLE_DTYPES = {
+    "season": np.int16, "gw": np.int16, "season_gw": np.int32, "player_id": np.int32, "team_id": np.int32,
+    # stats side only (load_flat_stats), 0 = unknown
+    "opponent_team_id": np.int32,
+    "position": pd.CategoricalDtype(POSITIONS), "price": np.float32,
+    "status": pd.CategoricalDtype(STATUSES), "chance_playing_next": np.int8,
+    "team_att": np.int16, "team_def": np.int16, "opp_strength_def": np.int16,
+    "started": np.int8, "minutes": np.int16, "expected_points_actual": np.int16,
+    "goals": np.int8, "assists": np.int8, "clean_sheet": np.int8, "saves": np.int8,
+    "yellow": np.int8, "red": np.int8, "bonus": np.int8, "bps": np.int16,
+    "influence": np.float64, "creativity": np.float64, "threat": np.float64, "ict_index": np.float64,
+    "xg": np.float64, "xa": np.float64,
+    "is_home": np.int8, "difficulty": np.int8, "injury_flag": np.int8,
+}
+
+def compact_flat_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast flat-table columns (and rolling features, if present) to the compact schema."""
+    for c, dtype in FLAT_TABLE_DTYPES.items():
+        if c not in df.columns:
+            continue
+        col = df[c]
+        if col.dtype == dtype:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[c] = col.astype(str).astype(dtype)
+        elif np.issubdtype(dtype, np.integer):
+            if col.dtype == object:
+                col = pd.to_numeric(col, errors="coerce")
+            col = col.fillna(100 if c == "chance_playing_next" else 0)
+            info = np.iinfo(dtype)
+            if len(col) and (col.min() < info.min or col.max() > info.max):
+                # astype would wrap around silently
+                raise ValueError(f"flat table column {c!r} has values outside {np.dtype(dtype).name}")
+            df[c] = col.astype(dtype)
+        else:
+            df[c] = pd.to_numeric(col, errors="coerce").astype(dtype)
+    roll = [c for c in rolling_feature_cols() if c in df.columns]
+    if roll:
+        df[roll] = df[roll].astype(np.float64)
     return df
 
+def frame_mb(df: pd.DataFrame) -> float:
+    """In-memory size of a frame (deep, so strings/objects count), in MiB."""
+    return round(float(df.memory_usage(deep=True).sum()) / 2**20, 2)
+
 # --- Feature engineering -----------------------------------------------------------
 
+# numeric series we want rolling stats for
+ROLLING_COLS = [
+    "minutes","expected_points_actual","goals","assists",
+    "xg","xa","ict_index","influence","creativity","threat",
+    "bonus","bps"
+]
+
+def rolling_feature_cols() -> list[str]:
+    """Rolling feature names in the order build_rolling_features creates them."""
+    return [f"{c}_{suffix}" for c in ROLLING_COLS for suffix in ("avg_3", "avg_5", "trend")]
+
+def _shifted_window_means(values: np.ndarray, group_start: np.ndarray, windows=(3, 5)) -> list[np.ndarray]:
+    """
+    Rolling means over the previous `w` rows (current row excluded) for every column of
+    `values` at once. Rows must be sorted by (player_id, season_gw); `group_start[i]` is the
+    index of the first row of row i's player, so windows never cross players.
+    Bit-identical to groupby.shift(1) + groupby.rolling(w, min_periods=1).mean(); NaN where
+    no history.
+
+    pandas does not sum each window afresh: per player it keeps one running sum, adding
+    the entering value and subtracting the leaving one with Kahan compensation (separate
+    terms for adds and removes), returns the value itself for a run of equal values and
+    clamps to 0 when the signs say the mean cannot be negative / positive (roll_mean in
+    pandas/_libs/window/aggregations.pyx). Windows summed independently differ from it in
+    the last bits of ~1 value in 8, so the same recurrence runs here, vectorized over
+    players and stepping through row positions within a player.
+    """
+    n, k = values.shape
+    if n == 0:
+        return [np.empty((0, k)) for _ in windows]
+    pos = np.arange(n)
+    step = pos - group_start
+    player = np.cumsum(step == 0) - 1
+    n_players, n_steps = int(player[-1]) + 1, int(step.max()) + 1
+
+    # the shifted series per player, NaN at its first row and past its last
+    x = np.full((n_steps, n_players, k), np.nan)
+    has_prev = step > 0
+    x[step[has_prev], player[has_prev]] = values[pos[has_prev] - 1]
+
+    shape = (len(windows), n_players, k)
+    nobs, neg_ct, same = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+    sum_x, comp_add, comp_remove = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    prev = np.full(shape, np.nan)
+    means = np.empty((n_steps,) + shape)
+    for t in range(n_steps):
+        leaving = np.stack([x[t - w] if t >= w else np.full((n_players, k), np.nan) for w in windows])
+        m = ~np.isnan(leaving)
+        nobs -= m
+        y = -leaving - comp_remove
+        tot = sum_x + y
+        comp_remove = np.where(m, tot - sum_x - y, comp_remove)
+        sum_x = np.where(m, tot, sum_x)
+        neg_ct -= m & np.signbit(leaving)
+
+        val = np.broadcast_to(x[t], shape)
+        m = ~np.isnan(val)
+        nobs += m
+        y = val - comp_add
+        tot = sum_x + y
+        comp_add = np.where(m, tot - sum_x - y, comp_add)
+        sum_x = np.where(m, tot, sum_x)
+        neg_ct += m & np.signbit(val)
+        same = np.where(m, np.where(val == prev, same + 1, 1), same)
+        prev = np.where(m, val, prev)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sum_x / nobs
+        mean = np.where(same >= nobs, prev, mean)
+        mean = np.where((same < nobs) & (((neg_ct == 0) & (mean < 0)) | ((neg_ct == nobs) & (mean > 0))), 0.0, mean)
+        means[t] = np.where(nobs > 0, mean, np.nan)
+    return [means[step, i, player] for i in range(len(windows))]
+
 def build_rolling_features(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
+    with span("build_rolling_features", rows=len(df)):
+        return _build_rolling_features(df)
 
-    df = df.sort_values(["player_id","gw"]).copy()
+def build_rolling_features_streamed(db: Session, chunk_rows: int | None = None) -> pd.DataFrame:
+    """
+    load_flat_table + build_rolling_features, one block of whole players at a time
+    (iter_flat_table): the raw rows and the window temporaries only ever exist for one
+    block. Rows come back sorted by (player_id, season_gw), as from build_rolling_features.
+    """
+    with span("build_rolling_features_streamed") as sp:
+        parts = [_build_rolling_features(chunk) for chunk in iter_flat_table(db, chunk_rows)]
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        sp.rows = len(df)
+    return df
 
-    # numeric series we want rolling stats for
-    num_cols = [
-        "minutes","expected_points_actual","goals","assists",
-        "xg","xa","ict_index","influence","creativity","threat",
-        "bonus","bps"
-    ]
+def _build_rolling_features(df: pd.DataFrame) -> pd.DataFrame:
 
-    # shift by 1 to avoid leakage (use history only)
-    for c in num_cols:
-        s = df.groupby("player_id")[c].shift(1)
-        df[f"{c}_avg_3"] = s.groupby(df["player_id"]).rolling(3, min_periods=1).mean().reset_index(level=0, drop=True)
-        df[f"{c}_avg_5"] = s.groupby(df["player_id"]).rolling(5, min_periods=1).mean().reset_index(level=0, drop=True)
-        df[f"{c}_trend"] = df[f"{c}_avg_3"] - df[f"{c}_avg_5"]
+    # windows run across seasons: a player's first GWs use the end of the previous season
+    df = df.sort_values(["player_id","season_gw"])
+
+    # one pass over all ROLLING_COLS: shift by 1 to avoid leakage (use history only)
+    pid = df["player_id"].to_numpy()
+    pos = np.arange(len(df))
+    first = np.ones(len(df), dtype=bool)
+    first[1:] = pid[1:] != pid[:-1]
+    group_start = np.maximum.accumulate(np.where(first, pos, 0))
+
+    values = df[ROLLING_COLS].to_numpy(dtype=float)
+    avg3, avg5 = _shifted_window_means(values, group_start, windows=(3, 5))
+    feats = np.stack([avg3, avg5, avg3 - avg5], axis=2).reshape(len(df), -1)
 
     # fill NaNs for early GWs
-    feat_cols = [c for c in df.columns if c.endswith("_avg_3") or c.endswith("_avg_5") or c.endswith("_trend")]
-    df[feat_cols] = df[feat_cols].fillna(0.0)
+    feats = np.nan_to_num(feats, nan=0.0)
+    df = pd.concat([df, pd.DataFrame(feats, index=df.index, columns=rolling_feature_cols())], axis=1)
 
     # ensure ints
-    df["injury_flag"] = df["injury_flag"].astype(int)
-    df["is_home"] = df["is_home"].astype(int)
+    df["injury_flag"] = df["injury_flag"].astype(np.int8)
+    df["is_home"] = df["is_home"].astype(np.int8)
 
     return df
 
+# --- Rolling features in SQL ---------------------------------------------------------
+#
+# The same features as build_rolling_features, computed by the database with window
+# functions next to the data: AVG over the 3 / 5 previous rows of the player (current
+# row excluded). AVG skips NULLs and is NULL without history, which is exactly the
+# NaN handling of _shifted_window_means; NULLs become 0 as in the pandas engine.
+# Needs window functions: MySQL 8+, SQLite 3.28+ or DuckDB.
+# FEATURE_ENGINE=sql (or --feature-engine sql) makes training and backfills use it.
+
+FEATURE_ENGINES = ("pandas", "sql")
+
+def resolve_feature_engine(engine: str | None = None) -> str:
+    engine = (engine or os.getenv("FEATURE_ENGINE") or "pandas").strip().lower()
+    if engine not in FEATURE_ENGINES:
+        raise ValueError(f"Unknown feature engine {engine!r}, expected one of {FEATURE_ENGINES}")
+    return engine
+
+def _rolling_select_sql(db: Session) -> str:
+    ft = float_type(db)
+    exprs = []
+    for c in ROLLING_COLS:
+        avg3 = f"AVG(CAST({c} AS {ft})) OVER w3"
+        avg5 = f"AVG(CAST({c} AS {ft})) OVER w5"
+        exprs += [f"COALESCE({avg3}, 0) AS {c}_avg_3",
+                  f"COALESCE({avg5}, 0) AS {c}_avg_5",
+                  f"COALESCE({avg3} - {avg5}, 0) AS {c}_trend"]
+    sep = ",\n                   "
+    return f"""WITH flat AS ({_flat_table_sql(db)})
+            SELECT flat.*,
+                   {sep.join(exprs)}
+            FROM flat
+            WINDOW w3 AS (PARTITION BY player_id ORDER BY season, gw ROWS BETWEEN 3 PRECEDING AND 1 PRECEDING),
+                   w5 AS (PARTITION BY player_id ORDER BY season, gw ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING)
+            ORDER BY player_id, season, gw"""
+
+def load_rolling_features_sql(db: Session) -> pd.DataFrame:
+    """load_flat_table + build_rolling_features in one query; rows sorted by (player_id, season_gw)."""
+    with analytics_session(db) as adb:
+        n = int(adb.execute(text(f"SELECT COUNT(*) {_FLAT_FROM}")).scalar() or 0)
+        with span("rolling_features_sql", rows=n) as sp:
+            # streamed into typed buffers like load_flat_table
+            result = _stream(adb, _rolling_select_sql(adb), {})
+            buf = _ColumnBuffers(list(result.keys()), n)
+            for rows in result.partitions():
+                buf.append(rows)
+            sp.rows = buf.n
+    return _finish_flat_table(buf.frame())
+
+def rolling_engine_max_diff(db: Session) -> float:
+    """
+    Largest difference between the pandas and SQL engines over every rolling feature
+    (parity check), relative to max(1, |value|). Both average the stored float64 values,
+    so they differ by summation-order rounding only.
+    """
+    cols = rolling_feature_cols()
+    pdf = build_rolling_features(load_flat_table(db))
+    sdf = load_rolling_features_sql(db)
+    if len(pdf) != len(sdf):
+        return float("inf")
+    if pdf.empty:
+        return 0.0
+    keys = ["player_id", "season_gw"]
+    a = pdf.sort_values(keys)[keys + cols].to_numpy(dtype=float)
+    b = sdf.sort_values(keys)[keys + cols].to_numpy(dtype=float)
+    if not np.array_equal(a[:, :2], b[:, :2]):
+        return float("inf")
+    return float((np.abs(a[:, 2:] - b[:, 2:]) / np.maximum(1.0, np.abs(a[:, 2:]))).max())
+
 def dataset_for_training(df_feat: pd.DataFrame):
     feature_cols = [c for c in df_feat.columns if c.endswith("_avg_3") or c.endswith("_avg_5") or c.endswith("_trend")]
     feature_cols += ["is_home","difficulty","opp_strength_def","team_att","team_def","injury_flag","price"]
 
-    X = df_feat[feature_cols].astype(float)
+    X = df_feat[feature_cols].astype(FEATURE_DTYPE)
     y_start = df_feat["started"].astype(int)
     y_points = df_feat["expected_points_actual"].astype(float)
-    meta = df_feat[["player_id","gw","team_id","position"]]
+    meta = df_feat[["player_id","season","gw","season_gw","team_id","position"]]
     return X, y_start, y_points, meta, feature_cols
 
+def rolling_features_asof_gws(df_feat: pd.DataFrame, gw_from: int, gw_to: int, season: int) -> pd.DataFrame:
+    """
+    For every target gw in [gw_from, gw_to] of `season` and every player, the rolling
+    features of the player's latest row before the target (earlier seasons included):
+    what features_for_gw serves for that GW.
+    Slices one build_rolling_features frame instead of rebuilding per GW: a history row
+    is the "as of" row for every target in (its season_gw, the player's next season_gw].
+    Returns season, gw, player_id + rolling cols (players without earlier history are absent).
+    """
+    cols = rolling_feature_cols()
+    if df_feat.empty:
+        return pd.DataFrame(columns=["season", "gw", "player_id", *cols])
+
+    # targets are consecutive keys within one season
+    key_from, key_to = season_key(int(season), int(gw_from)), season_key(int(season), int(gw_to))
+    df = df_feat.sort_values(["player_id", "season_gw"], kind="stable")
+    pid = df["player_id"].to_numpy()
+    key = df["season_gw"].to_numpy(dtype=np.int64)
+    nxt = np.full(len(df), key_to, dtype=np.int64)
+    same = pid[1:] == pid[:-1]
+    nxt[:-1][same] = np.minimum(key[1:][same], key_to)
+
+    lo = np.maximum(key + 1, key_from)
+    count = np.maximum(nxt - lo + 1, 0)
+    rows = np.repeat(np.arange(len(df)), count)
+    # offset of each expanded entry within its row's run of target GWs
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(count) - count, count)
+
+    out = pd.DataFrame(df[cols].to_numpy(dtype=float)[rows], columns=cols)
+    out.insert(0, "player_id", pid[rows])
+    out.insert(0, "gw", lo[rows] + offset - season_key(int(season), 0))
+    out.insert(0, "season", int(season))
+    return out
+
 # --- Features for prediction -------------------------------------------------------
 
-def features_for_gw(db: Session, gw: int) -> pd.DataFrame:
-    """Return one row per player for a target GW, using only history < gw, and context for gw."""
-    # We will build by taking latest known row per (player) from player_gameweek_stats where gw < target,
-    # then attach the fixture context for gw.
+def features_for_gw(db: Session, gw: int, store_dir: str | None = None, season: int | None = None) -> pd.DataFrame:
+    """
+    Return one row per player for a target GW of `season` (default: the current one),
+    using only history before it (earlier seasons included), and context for gw.
+    """
+    # Rolling features come from the latest known history row per player (history < gw),
+    # then we attach the fixture context for gw.
     # If player has no history, rolling features will become 0.
-    # We'll compute rolling features by loading flat table up to gw-1 and also a 'context' frame for gw.
+    # The rolling part is served by the persisted per-player state (see feature_store),
+    # which only folds in GWs that landed since it was last written.
+    from .feature_store import rolling_features_asof
 
-    df_hist = load_flat_table(db)
-    if df_hist.empty:
-        return df_hist
+    with analytics_session(db) as adb:
+        season = _season(adb, season)
+        with span("rolling_features_asof") as sp:
+            last = rolling_features_asof(adb, gw, store_dir=store_dir, season=season)
+            sp.rows = len(last)
+        if last.empty:
+            return last
 
-    df_hist = df_hist[df_hist["gw"] < gw].copy()
-    if df_hist.empty:
-        return df_hist
+        with span("context_for_gw") as sp:
+            ctx = context_for_gw(adb, gw, season)
+            sp.rows = len(ctx)
+    return attach_rolling_features(ctx, last)
 
-    df_feat_hist = build_rolling_features(df_hist)
-
-    # take ONLY rolling feature columns from the last available history row
-    # (avoid duplicating context cols like is_home/difficulty on merge, which causes is_home_x/is_home_y)
-    roll_cols = [c for c in df_feat_hist.columns if c.endswith("_avg_3") or c.endswith("_avg_5") or c.endswith("_trend")]
-    last = (
-        df_feat_hist.sort_values(["player_id", "gw"])
-        .groupby("player_id")
-        .tail(1)[["player_id", *roll_cols]]
-        .copy()
-    )
+def _season(db: Session, season: int | None) -> int:
+    return current_season(db) if season is None else int(season)
 
+def context_for_gw(db: Session, gw: int, season: int | None = None) -> pd.DataFrame:
+    """Per-player fixture/team context for a target GW (players of that season's import)."""
+    season = _season(db, season)
     # context for target gw from fixtures table
-    q_ctx = """SELECT
+    q_ctx = f"""SELECT
                  p.id AS player_id,
                  p.team_id,
                  p.position,
-                 CAST(p.price AS DOUBLE) AS price,
+                 CAST(p.price AS {float_type(db)}) AS price,
                  p.status,
                  COALESCE(p.chance_playing_next, 100) AS chance_playing_next,
                  t.strength_attack AS team_att,
@@ -172,28 +755,83 @@ def features_for_gw(db: Session, gw: int) -> pd.DataFrame:
                FROM players p
                JOIN teams t ON t.id = p.team_id
                LEFT JOIN matches f
-                 ON f.gw = :gw AND (f.home_team_id = p.team_id OR f.away_team_id = p.team_id)
+                 ON f.season = :season AND f.gw = :gw AND (f.home_team_id = p.team_id OR f.away_team_id = p.team_id)
                LEFT JOIN teams opp
                  ON opp.id = (CASE
                    WHEN f.home_team_id = p.team_id THEN f.away_team_id
                    WHEN f.away_team_id = p.team_id THEN f.home_team_id
                    ELSE NULL
                  END)
+               WHERE p.season = :season
                ORDER BY p.id"""
-    ctx = pd.DataFrame(db.execute(text(q_ctx), {"gw": gw}).mappings().all())
+    ctx = pd.DataFrame(db.execute(text(q_ctx), {"season": season, "gw": gw}).mappings().all())
     if ctx.empty:
         # if fixtures missing, still allow predicting with neutral context
-        ctx = pd.DataFrame(db.execute(text("""SELECT p.id AS player_id, p.team_id, p.position,
-                                              CAST(p.price AS DOUBLE) AS price, p.status,
+        ctx = pd.DataFrame(db.execute(text(f"""SELECT p.id AS player_id, p.team_id, p.position,
+                                              CAST(p.price AS {float_type(db)}) AS price, p.status,
                                               COALESCE(p.chance_playing_next, 100) AS chance_playing_next,
                                               t.strength_attack AS team_att, t.strength_defense AS team_def,
                                               0 AS is_home, 3 AS difficulty, 50 AS opp_strength_def
-                                            FROM players p JOIN teams t ON t.id=p.team_id""")).mappings().all())
+                                            FROM players p JOIN teams t ON t.id=p.team_id
+                                            WHERE p.season = :season"""), {"season": season}).mappings().all())
+    if ctx.empty:
+        return ctx
+
+    ctx["season"] = season
+    ctx["injury_flag"] = ((ctx["status"] != "fit") | (ctx["chance_playing_next"].fillna(100) < 75)).astype(int)
+    return ctx
+
+def context_for_gws(db: Session, gws: list[int], season: int | None = None) -> pd.DataFrame:
+    """
+    Per-player fixture/team context for several target GWs of one season (same columns
+    as context_for_gw, plus gw). Players are read once and every fixture of the range
+    comes from a single matches query; the per-GW join is done here instead of in SQL.
+    """
+    season = _season(db, season)
+    gws = sorted({int(g) for g in gws})
+    players = pd.DataFrame(db.execute(text(f"""SELECT p.id AS player_id, p.team_id, p.position,
+                                               CAST(p.price AS {float_type(db)}) AS price, p.status,
+                                               COALESCE(p.chance_playing_next, 100) AS chance_playing_next,
+                                               t.strength_attack AS team_att, t.strength_defense AS team_def
+                                             FROM players p JOIN teams t ON t.id = p.team_id
+                                             WHERE p.season = :season
+                                             ORDER BY p.id"""), {"season": season}).mappings().all())
+    if players.empty or not gws:
+        return pd.DataFrame()
+
+    q_fix = """SELECT f.gw, f.home_team_id, f.away_team_id, f.home_difficulty, f.away_difficulty,
+                      COALESCE(th.strength_defense, 50) AS home_def,
+                      COALESCE(ta.strength_defense, 50) AS away_def
+               FROM matches f
+               LEFT JOIN teams th ON th.id = f.home_team_id
+               LEFT JOIN teams ta ON ta.id = f.away_team_id
+               WHERE f.season = :season AND f.gw BETWEEN :gw_from AND :gw_to"""
+    fx = pd.DataFrame(db.execute(text(q_fix), {"season": season, "gw_from": gws[0], "gw_to": gws[-1]}).mappings().all())
+    # one row per (gw, team, fixture) from that team's point of view
+    fix_cols = ["gw", "team_id", "opponent_team_id", "is_home", "difficulty", "opp_strength_def"]
+    if fx.empty:
+        sides = pd.DataFrame(columns=fix_cols)
+    else:
+        fx = fx[fx["gw"].isin(gws)]
+        home = pd.DataFrame({"gw": fx["gw"], "team_id": fx["home_team_id"], "opponent_team_id": fx["away_team_id"],
+                             "is_home": 1, "difficulty": fx["home_difficulty"], "opp_strength_def": fx["away_def"]})
+        away = pd.DataFrame({"gw": fx["gw"], "team_id": fx["away_team_id"], "opponent_team_id": fx["home_team_id"],
+                             "is_home": 0, "difficulty": fx["away_difficulty"], "opp_strength_def": fx["home_def"]})
+        sides = pd.concat([home, away], ignore_index=True)[fix_cols]
 
+    grid = players.merge(pd.DataFrame({"gw": gws}), how="cross")
+    ctx = grid.merge(sides, on=["gw", "team_id"], how="left")
+    # blank GW: neutral context, as in context_for_gw
+    ctx["is_home"] = ctx["is_home"].fillna(0).astype(int)
+    ctx["opp_strength_def"] = ctx["opp_strength_def"].fillna(50)
+    ctx["season"] = season
     ctx["injury_flag"] = ((ctx["status"] != "fit") | (ctx["chance_playing_next"].fillna(100) < 75)).astype(int)
+    return ctx.sort_values(["gw", "player_id"], kind="stable").reset_index(drop=True)
 
+def attach_rolling_features(ctx: pd.DataFrame, last: pd.DataFrame, on=("player_id",)) -> pd.DataFrame:
+    """Merge per-player rolling features (`on` keys + rolling cols) onto a context frame."""
     # merge rolling features
-    out = ctx.merge(last, on="player_id", how="left")
+    out = ctx.merge(last, on=list(on), how="left")
     # fill missing rolling features with 0
     roll_cols = [c for c in out.columns if c.endswith("_avg_3") or c.endswith("_avg_5") or c.endswith("_trend")]
     out[roll_cols] = out[roll_cols].fillna(0.0)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+# --- Array-backed forests ------------------------------------------------------------
+#
+# sklearn trees copy their node arrays into private memory when unpickled, so every
+# uvicorn worker ends up with its own copy of both forests. Here a fitted forest is
+# flattened into one node table (all trees back to back) saved as uncompressed .npy
+# files, one per field; workers open them with mmap_mode="r" and share one
+# page-cache copy.
+#
+# Node fields are stored in compact dtypes (int16 features, float32 thresholds and
+# leaf values): about half the bytes of sklearn's node records. Thresholds are rounded
+# down to the nearest float32, which keeps `x <= threshold` exact for the float32
+# inputs sklearn compares against; leaf values differ from sklearn only by float32
+# rounding. save_artifacts checks that on the training rows before saving: a packed
+# forest further than PACKED_TOLERANCE from sklearn on any row fails the save.
+#
+# Leaves point to themselves as both children, so the batch traversal (leaf_indices)
+# steps every (tree, row) pair the same number of times without testing for leaves,
+# and drops the finished pairs only every TRAVERSAL_STEPS steps. Trees are walked
+# TREE_BLOCK at a time, so one block's nodes stay in cache while all rows pass through
+# them. On 2 x 900 trees and a GW of 700 rows that is ~15% faster than sklearn's
+# predict on one thread (and ~2x faster than compacting after every step).
+
+FIELDS = ("feature", "threshold", "children", "value", "roots")
+PACKED_TOLERANCE = 1e-4
+TREE_BLOCK = 16
+TRAVERSAL_STEPS = 8
+
+
+def packed_files(name: str) -> list[str]:
+    """Files making up packed artifact `name` (e.g. start_clf)."""
+    return [f"{name}.{field}.npy" for field in FIELDS]
+
+
+def can_pack(model) -> bool:
+    return hasattr(model, "estimators_") and all(hasattr(t, "tree_") for t in model.estimators_)
+
+
+def forest_kind(model) -> str:
+    return "classifier" if hasattr(model, "classes_") else "regressor"
+
+
+def _threshold_f32(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each float64 threshold, so float32 `x <= t` splits like sklearn."""
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+def pack_forest(model) -> Dict[str, np.ndarray]:
+    """
+    Flatten a fitted RandomForestClassifier/Regressor:
+      feature   int16   split feature, -1 on leaves
+      threshold float32 go left when x <= threshold
+      children  int32   (n_nodes, 2) global left/right child index, the node itself on leaves
+      value     float32 class-1 probability (classifier) or mean target (regressor)
+      roots     int32   root node of every tree
+    """
+    is_clf = forest_kind(model) == "classifier"
+    if is_clf and list(model.classes_) != [0, 1]:
+        raise ValueError("Only binary 0/1 classifiers can be packed")
+
+    feature, threshold, children, value, roots = [], [], [], [], []
+    off = 0
+    for est in model.estimators_:
+        tree = est.tree_
+        leaf = tree.children_left < 0
+        node = np.arange(tree.node_count) + off
+        feature.append(np.where(leaf, -1, tree.feature))
+        threshold.append(tree.threshold)
+        children.append(np.stack([
+            np.where(leaf, node, tree.children_left + off),
+            np.where(leaf, node, tree.children_right + off),
+        ], axis=1))
+        if is_clf:
+            counts = tree.value[:, 0, :]
+            value.append(counts[:, 1] / counts.sum(axis=1))
+        else:
+            value.append(tree.value[:, 0, 0])
+        roots.append(off)
+        off += tree.node_count
+
+    if model.n_features_in_ > np.iinfo(np.int16).max:
+        raise ValueError("Too many features to pack")
+
+    return {
+        "feature": np.concatenate(feature).astype(np.int16),
+        "threshold": _threshold_f32(np.concatenate(threshold).astype(np.float64)),
+        "children": np.concatenate(children).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float32),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+
+
+class PackedForest:
+    """Read-only forest over (possibly memory-mapped) node arrays; sklearn-like predict API."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], kind: str):
+        self.kind = kind
+        # plain ndarray views of the maps (no copy): np.memmap results cost extra per gather
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.children = np.asarray(arrays["children"]).reshape(-1)  # [2*node] left, [2*node+1] right
+        self.value = np.asarray(arrays["value"])
+        self.roots = np.asarray(arrays["roots"])
+
+    def leaf_indices(self, X) -> np.ndarray:
+        """(n_trees, n_rows) leaf node reached by every row in every tree."""
+        # sklearn trees compare float32 inputs against the stored thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_feat = X.shape
+        n_trees = len(self.roots)
+        flat = X.reshape(-1)
+        row_off = np.arange(n_rows, dtype=np.int32) * n_feat
+        out = np.empty(n_trees * n_rows, dtype=np.int32)
+
+        for t0 in range(0, n_trees, TREE_BLOCK):
+            roots = self.roots[t0:t0 + TREE_BLOCK]
+            # one entry per (tree, row) pair of the block, tree-major
+            node = np.repeat(roots, n_rows)
+            off = np.tile(row_off, len(roots))
+            pos = np.arange(t0 * n_rows, (t0 + len(roots)) * n_rows, dtype=np.int32)
+            while node.size:
+                for _ in range(TRAVERSAL_STEPS):
+                    prev = node
+                    # on a leaf the feature is -1: any in-range value is read, both children are the leaf
+                    node = self.children[2 * node + (flat[off + self.feature[node]] > self.threshold[node])]
+                # a pair that did not move in the last step sits on its leaf
+                done = node == prev
+                n_done = np.count_nonzero(done)
+                if n_done == node.size:
+                    out[pos] = node
+                    break
+                if n_done * 5 > node.size:
+                    out[pos[done]] = node[done]
+                    keep = ~done
+                    node, off, pos = node[keep], off[keep], pos[keep]
+        return out.reshape(n_trees, n_rows)
+
+    def tree_values(self, X) -> np.ndarray:
+        """(n_trees, n_rows) output of every tree for every row, from one batched traversal."""
+        return self.value[self.leaf_indices(X)]
+
+    def _mean_leaf_value(self, X) -> np.ndarray:
+        # accumulate in float64 over up to ~900 trees of float32 leaves
+        return self.tree_values(X).mean(axis=0, dtype=np.float64)
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba is only available on packed classifiers")
+        p = self._mean_leaf_value(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X) -> np.ndarray:
+        if self.kind == "classifier":
+            return (self._mean_leaf_value(X) >= 0.5).astype(int)
+        return self._mean_leaf_value(X)
+
+
+def save_packed(model, model_dir: str, name: str, arrays: Dict[str, np.ndarray] | None = None) -> Dict[str, Any]:
+    """Write the node arrays of `model` (pack_forest, unless already packed into `arrays`)."""
+    arrays = pack_forest(model) if arrays is None else arrays
+    for field, fname in zip(FIELDS, packed_files(name)):
+        path = os.path.join(model_dir, fname)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, arrays[field], allow_pickle=False)
+        os.replace(tmp, path)
+    return {
+        "kind": forest_kind(model),
+        "n_trees": int(len(arrays["roots"])),
+        "n_nodes": int(len(arrays["feature"])),
+        "leaf_loops": True,
+    }
+
+
+def load_packed(model_dir: str, name: str, info: Dict[str, Any], mmap: bool = True) -> PackedForest:
+    mode = "r" if mmap else None
+    arrays = {
+        field: np.load(os.path.join(model_dir, fname), mmap_mode=mode, allow_pickle=False)
+        for field, fname in zip(FIELDS, packed_files(name))
+    }
+    if not info.get("leaf_loops"):
+        # packed by an older version (leaf children 0): patched in private memory until retrained
+        leaf = arrays["feature"] < 0
+        children = np.array(arrays["children"])
+        children[leaf] = np.flatnonzero(leaf).astype(np.int32)[:, None]
+        arrays["children"] = children
+    return PackedForest(arrays, info["kind"])
+
+
+def packed_max_abs_diff(model, packed: PackedForest, X) -> float:
+    """Largest gap between sklearn's and the packed forest's scores on X (the save-time parity check)."""
+    if packed.kind == "classifier":
+        ref, got = model.predict_proba(X)[:, 1], packed.predict_proba(X)[:, 1]
+    else:
+        ref, got = model.predict(X), packed.predict(X)
+    return float(np.max(np.abs(np.asarray(ref, dtype=np.float64) - got))) if len(ref) else 0.0
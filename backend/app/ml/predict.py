@@ -1,62 +1,398 @@
 from __future__ import annotations
 
+import json
 import os
+import threading
+import time
+from typing import Any, Dict
+
 import joblib
 import numpy as np
 from sqlalchemy.orm import Session
 
-from .features import features_for_gw
-from .train import resolve_model_dir, resolve_model_version
+from .. import crud
+from ..crud import current_season
+from ..db import analytics_session
+from ..timing import span
+from .backends import predict_points_quantiles, predict_start
+from .feature_store import rolling_features_asof
+from .features import (
+    FEATURE_DTYPE,
+    attach_rolling_features,
+    context_for_gws,
+    features_for_gw,
+    latest_history_key,
+    rolling_features_asof_gws,
+    season_key,
+)
+from .packed import PackedForest, can_pack, load_packed, pack_forest, packed_files
+from .train import file_digest, load_feature_frame, resolve_model_dir, resolve_model_version
 
-def load_models(model_dir: str | None = None):
-    model_dir = resolve_model_dir(model_dir)
-    clf_path = os.path.join(model_dir, "start_clf.joblib")
-    reg_path = os.path.join(model_dir, "points_reg.joblib")
-    if not (os.path.exists(clf_path) and os.path.exists(reg_path)):
-        raise RuntimeError("Models not found. Run: python -m app.cli train")
-    clf = joblib.load(clf_path)
-    reg = joblib.load(reg_path)
-    return clf, reg
+# --- Model registry ------------------------------------------------------------------
+#
+# Models are loaded once per process and kept per model_dir. Each call only stats the
+# artifact files; when `cli train`/`cli update` has replaced them the new set is loaded
+# under a lock and swapped in with a single assignment, so a request sees either the old
+# or the new bundle, never a mix. metrics.json is written last and records the size and
+# sha256 of the model files it belongs to; a set that does not match (training
+# mid-write) is not picked up until it is complete. Hashes rather than mtimes, so a
+# models_store copied without its mtimes still loads.
+#
+# When the set includes packed forests (metrics["packed"]) they can be memory-mapped
+# read-only instead of unpickling the joblib files, so every uvicorn worker shares one
+# page-cache copy of the trees. Their blocked traversal (packed.py) usually also scores
+# a GW faster than sklearn's predict, but that depends on forest shape and machine:
+# MODEL_PACKED=auto (default) serves whichever scored the latest GW faster at train
+# time (metrics["timing"]), and the packed forests when the set has no joblib files
+# (MODEL_SAVE_JOBLIB=0); 1 always serves packed, 0 always joblib.
 
-def predict_for_gw(db: Session, gw: int, model_dir: str | None = None, model_version: str | None = None):
-    model_dir = resolve_model_dir(model_dir)
-    model_version = resolve_model_version(model_version)
-    clf, reg = load_models(model_dir=model_dir)
-    df = features_for_gw(db, gw)
-    if df.empty:
-        return [], model_version
+_MODELS: Dict[str, Dict[str, Any]] = {}
+_MODELS_LOCK = threading.Lock()
 
-    # Feature columns must match training
-    # (We load from metrics.json if exists; otherwise infer from df.)
+
+MODEL_FILES = ("start_clf.joblib", "points_reg.joblib")
+
+
+def _stamp(path: str) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _dir_stamp(model_dir: str) -> tuple:
+    return tuple(_stamp(os.path.join(model_dir, name)) for name in (*MODEL_FILES, "metrics.json"))
+
+
+def _artifact_matches(path: str, expected) -> bool:
+    """Whether the file at path is the one metrics.json lists (size first, then sha256)."""
+    if not os.path.exists(path):
+        return False
+    if isinstance(expected, list):
+        # [mtime_ns, size] from sets saved before hashes: the size is all that survives a copy
+        return os.path.getsize(path) == expected[1]
+    if not isinstance(expected, dict):
+        return False
+    if os.path.getsize(path) != expected.get("bytes"):
+        return False
+    return file_digest(path)["sha256"] == expected.get("sha256")
+
+
+def _has_joblib(model_dir: str, metrics: Dict[str, Any]) -> bool:
+    expected = metrics.get("artifacts")
+    if expected:
+        return all(name in expected for name in MODEL_FILES)
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in MODEL_FILES)
+
+
+def _use_packed(model_dir: str, metrics: Dict[str, Any]) -> bool:
+    packed = metrics.get("packed") or {}
+    if "start_clf" not in packed or "points_reg" not in packed:
+        return False
+    mode = os.getenv("MODEL_PACKED", "auto").strip().lower()
+    if mode == "0":
+        return False
+    if mode == "1" or not _has_joblib(model_dir, metrics):
+        return True
+    timing = metrics.get("timing") or {}
+    packed_ms, joblib_ms = timing.get("predict_ms_per_gw_packed"), timing.get("predict_ms_per_gw")
+    return packed_ms is not None and joblib_ms is not None and packed_ms <= joblib_ms
+
+
+def _load_bundle(model_dir: str) -> Dict[str, Any] | None:
+    clf_path = os.path.join(model_dir, "start_clf.joblib")
+    reg_path = os.path.join(model_dir, "points_reg.joblib")
     metrics_path = os.path.join(model_dir, "metrics.json")
-    feature_cols = None
+    stamp = _dir_stamp(model_dir)
+    metrics: Dict[str, Any] = {}
     if os.path.exists(metrics_path):
-        import json
         with open(metrics_path, "r", encoding="utf-8") as f:
             metrics = json.load(f)
-            feature_cols = metrics.get("feature_cols")
-            model_version = metrics.get("model_version") or model_version
+    use_packed = _use_packed(model_dir, metrics)
+    if not use_packed and not _has_joblib(model_dir, metrics):
+        raise RuntimeError("MODEL_PACKED=0 needs the joblib forests: retrain without MODEL_SAVE_JOBLIB=0")
+    expected = metrics.get("artifacts")
+    if expected:
+        # only the files this process will read
+        names = packed_files("start_clf") + packed_files("points_reg") if use_packed else list(MODEL_FILES)
+        if not all(_artifact_matches(os.path.join(model_dir, name), expected.get(name)) for name in names):
+            return None  # models replaced but metrics.json not yet: training is mid-write
+    if use_packed:
+        with span("load_packed"):
+            clf = load_packed(model_dir, "start_clf", metrics["packed"]["start_clf"])
+            reg = load_packed(model_dir, "points_reg", metrics["packed"]["points_reg"])
+    else:
+        with span("joblib.load"):
+            clf = joblib.load(clf_path)
+            reg = joblib.load(reg_path)
+    if _dir_stamp(model_dir) != stamp:
+        return None  # replaced while we were reading
+    return {"clf": clf, "reg": reg, "metrics": metrics, "stamp": stamp}
+
+
+def get_models(model_dir: str | None = None) -> Dict[str, Any]:
+    """Cached {clf, reg, metrics, stamp} for model_dir, reloaded when the artifacts change."""
+    model_dir = resolve_model_dir(model_dir)
+    stamp = _dir_stamp(model_dir)
+    entry = _MODELS.get(model_dir)
+    if entry is not None and entry["stamp"] == stamp:
+        return entry
+    if stamp[-1] is None and (stamp[0] is None or stamp[1] is None):
+        # neither metrics.json (packed-only sets) nor both joblib files
+        if entry is not None:
+            return entry
+        raise RuntimeError("Models not found. Run: python -m app.cli train")
+
+    with _MODELS_LOCK:
+        entry = _MODELS.get(model_dir)
+        if entry is not None and entry["stamp"] == _dir_stamp(model_dir):
+            return entry
+        fresh = _load_bundle(model_dir)
+        if fresh is None and entry is not None:
+            # keep serving the previous set until the new one is complete
+            return entry
+        for _ in range(3):
+            if fresh is not None:
+                _MODELS[model_dir] = fresh
+                return fresh
+            time.sleep(0.2)
+            fresh = _load_bundle(model_dir)
+        raise RuntimeError("Model artifacts are being written. Retry shortly.")
+
+
+def load_models(model_dir: str | None = None):
+    bundle = get_models(model_dir)
+    return bundle["clf"], bundle["reg"]
+
+def _feature_cols(metrics: Dict[str, Any], df) -> list[str]:
+    # Feature columns must match training
+    # (We take them from metrics.json if it exists; otherwise infer from df.)
+    feature_cols = metrics.get("feature_cols")
     if not feature_cols:
         feature_cols = [c for c in df.columns if c.endswith("_avg_3") or c.endswith("_avg_5") or c.endswith("_trend")]
         feature_cols += ["is_home","difficulty","opp_strength_def","team_att","team_def","injury_flag","price"]
+    return feature_cols
 
-    X = df[feature_cols].astype(float)
-    p_start = clf.predict_proba(X)[:, 1]
-    exp_pts = reg.predict(X)
+
+# P10 / P50 / P90 of the per-tree point predictions. Opt-in (PREDICTION_INTERVALS=1 or a
+# request's `intervals`): they need every tree's output, so the points forest is scored
+# by one packed traversal that also gives the mean. When sklearn's forests are served
+# (MODEL_PACKED=0, or auto picked them) a packed copy is built in memory once per bundle.
+# Boosting backends (hgb) have no per-tree outputs: PREDICTION_INTERVALS=1 leaves the
+# columns None there, and a request that asks for intervals is refused (ValueError).
+INTERVAL_QUANTILES = (0.1, 0.5, 0.9)
+
+
+def resolve_intervals(intervals: bool | None = None) -> bool:
+    if intervals is not None:
+        return bool(intervals)
+    return os.getenv("PREDICTION_INTERVALS", "0") == "1"
+
+
+def _interval_trees(bundle: Dict[str, Any]):
+    """Packed view of the points forest for per-tree outputs (built once per bundle), None for boosting."""
+    if "reg_trees" not in bundle:
+        reg = bundle["reg"]
+        if isinstance(reg, PackedForest):
+            bundle["reg_trees"] = reg
+        elif can_pack(reg):
+            # sklearn forest served (MODEL_PACKED=0 or auto): flatten once in memory
+            bundle["reg_trees"] = PackedForest(pack_forest(reg), "regressor")
+        else:
+            bundle["reg_trees"] = None
+    return bundle["reg_trees"]
+
+
+def _check_intervals(bundle: Dict[str, Any], intervals: bool | None) -> None:
+    """Refuse an explicit request for intervals from a model without per-tree outputs."""
+    if intervals and _interval_trees(bundle) is None:
+        backend = bundle["metrics"].get("backend") or "this backend"
+        raise ValueError(f"Prediction intervals need a forest model; {backend} has no per-tree outputs")
+
+
+def _score_rows(bundle: Dict[str, Any], df, gws, model_version: str, intervals: bool | None = None) -> list:
+    """
+    Score every row of a feature frame in one call per model; `gws` is the target GW of
+    each row, and df["season"] its season. P10/P50/P90 are None unless intervals resolve on.
+    """
+    X = df[_feature_cols(bundle["metrics"], df)].astype(FEATURE_DTYPE)
+    with span("predict_proba", rows=len(X)):
+        p_start = predict_start(bundle["clf"], X)
+    trees = _interval_trees(bundle) if resolve_intervals(intervals) else None
+    with span("predict_points", rows=len(X)):
+        exp_pts, q = predict_points_quantiles(bundle["reg"], trees, X, INTERVAL_QUANTILES)
+    if q is None:
+        q = np.full((len(INTERVAL_QUANTILES), len(X)), np.nan)
 
     out = []
-    for pid, ps, ep in zip(df["player_id"].to_numpy(), p_start, exp_pts):
+    for s, g, pid, ps, ep, p10, p50, p90 in zip(df["season"].to_numpy(), gws, df["player_id"].to_numpy(),
+                                                p_start, exp_pts, *q):
         out.append({
-            "gw": int(gw),
+            "season": int(s),
+            "gw": int(g),
             "player_id": int(pid),
             "p_start": float(ps),
             "expected_points": float(ep),
+            "points_p10": None if np.isnan(p10) else float(p10),
+            "points_p50": None if np.isnan(p50) else float(p50),
+            "points_p90": None if np.isnan(p90) else float(p90),
             "model_version": model_version
         })
-    return out, model_version
+    return out
+
+
+def predict_for_gw(db: Session, gw: int, model_dir: str | None = None, model_version: str | None = None,
+                   intervals: bool | None = None, return_features: bool = False, season: int | None = None):
+    """
+    Predictions for one GW of `season` (default: the current one). With return_features the feature frame is returned as a third
+    value so other model versions can score it without recomputing (see score_shadow_models).
+    """
+    model_dir = resolve_model_dir(model_dir)
+    model_version = resolve_model_version(model_version)
+    bundle = get_models(model_dir)
+    _check_intervals(bundle, intervals)
+    with span("features_for_gw") as sp:
+        df = features_for_gw(db, gw, store_dir=model_dir, season=season)
+        sp.rows = len(df)
+    if df.empty:
+        return ([], model_version, df) if return_features else ([], model_version)
+
+    model_version = bundle["metrics"].get("model_version") or model_version
+    rows = _score_rows(bundle, df, [gw] * len(df), model_version, intervals=intervals)
+    return (rows, model_version, df) if return_features else (rows, model_version)
+
+
+# --- Shadow models -------------------------------------------------------------------
+#
+# Candidate versions served next to the primary one: SHADOW_MODELS="hgb_v1=./models_hgb,
+# rf_v2=./models_rf2" maps a model_version to its model dir. They score the feature frame
+# the primary prediction already built; their rows go to `predictions` under their own
+# model_version and never reach the primary response.
+
+def resolve_shadow_models(spec: str | None = None) -> Dict[str, str]:
+    """{model_version: model_dir} from `spec` or env SHADOW_MODELS ("version=dir" pairs, comma separated)."""
+    spec = os.getenv("SHADOW_MODELS", "") if spec is None else spec
+    out: Dict[str, str] = {}
+    for item in spec.split(","):
+        version, sep, model_dir = item.strip().partition("=")
+        if not sep or not version.strip() or not model_dir.strip():
+            continue
+        out[version.strip()] = resolve_model_dir(model_dir.strip())
+    return out
+
+
+def score_shadow_models(df, gw: int, shadows: Dict[str, str], intervals: bool | None = None) -> Dict[str, list]:
+    """Score a features_for_gw frame with every shadow model: {model_version: rows}."""
+    out: Dict[str, list] = {}
+    if df is None or df.empty:
+        return out
+    for version, model_dir in shadows.items():
+        bundle = get_models(model_dir)
+        out[version] = _score_rows(bundle, df, [gw] * len(df), version, intervals=intervals)
+    return out
+
+
+def predict_for_horizon(db: Session, start_gw: int, horizon: int, model_dir: str | None = None,
+                        model_version: str | None = None, season: int | None = None,
+                        intervals: bool | None = None):
+    """
+    Predictions for start_gw .. start_gw + horizon - 1 of `season` in one pass. Rolling features are
+    the last known ones (history < start_gw) for every target GW; only the fixture
+    context differs, and it is fetched for the whole range at once. All GWs are stacked
+    into one matrix and scored with a single call per model.
+    """
+    model_dir = resolve_model_dir(model_dir)
+    model_version = resolve_model_version(model_version)
+    horizon = max(1, int(horizon))
+    bundle = get_models(model_dir)
+    _check_intervals(bundle, intervals)
+    with analytics_session(db) as adb:
+        season = current_season(adb) if season is None else int(season)
+        last = rolling_features_asof(adb, start_gw, store_dir=model_dir, season=season)
+        if last.empty:
+            return [], model_version
+        ctx = context_for_gws(adb, list(range(start_gw, start_gw + horizon)), season)
+    if ctx.empty:
+        return [], model_version
+    df = attach_rolling_features(ctx, last)
+
+    model_version = bundle["metrics"].get("model_version") or model_version
+    return _score_rows(bundle, df, df["gw"].to_numpy(), model_version, intervals=intervals), model_version
+
+
+def predictions_for_horizon(db: Session, start_gw: int, horizon: int, model_dir: str | None = None,
+                            model_version: str | None = None) -> Dict[int, list]:
+    """
+    Stored predictions (crud.get_predictions_for_gw rows) for start_gw .. start_gw + horizon - 1,
+    {gw: rows}. GWs without any are predicted and stored first, each from the rolling
+    features predict_for_gw would use for it (history before that GW), so they match the
+    rows stored GW by GW: GWs with the same latest history GW share one predict_for_horizon
+    pass. Rows are read and stored under the model set's own version, as in
+    backfill_predictions. GWs still without rows (no fixtures, no history) map to [].
+    """
+    model_dir = resolve_model_dir(model_dir)
+    model_version = get_models(model_dir)["metrics"].get("model_version") or resolve_model_version(model_version)
+    gws = list(range(start_gw, start_gw + max(1, int(horizon))))
+    out = {gw: crud.get_predictions_for_gw(db, gw, model_version=model_version) for gw in gws}
+    missing = [gw for gw in gws if not out[gw]]
+    if missing:
+        with analytics_session(db) as adb:
+            season = current_season(adb)
+            # the as-of GW only grows with gw, so every group is a run of consecutive GWs
+            groups: Dict[int, list] = {}
+            for gw in missing:
+                key = latest_history_key(adb, season_key(season, gw))
+                if key is not None:
+                    groups.setdefault(key, []).append(gw)
+        rows = []
+        for group in groups.values():
+            scored, _ver = predict_for_horizon(db, group[0], group[-1] - group[0] + 1, model_dir=model_dir,
+                                               model_version=model_version, season=season)
+            rows += [r for r in scored if int(r["gw"]) in group]
+        if rows:
+            crud.bulk_upsert_predictions(db, rows)
+            for gw in missing:
+                out[gw] = crud.get_predictions_for_gw(db, gw, model_version=model_version)
+    return out
+
+
+def backfill_predictions(db: Session, gw_from: int, gw_to: int, model_dir: str | None = None,
+                         model_version: str | None = None, chunk_gws: int = 8, use_snapshot: bool = True,
+                         persist: bool = True, feature_engine: str | None = None,
+                         season: int | None = None) -> Dict[str, Any]:
+    """
+    Predictions for every GW in [gw_from, gw_to] of `season` (default: the current one; backtesting). The flat table is loaded
+    and rolling features are built once, each GW's "as of" rows are sliced from that
+    frame, and GWs are scored and bulk-upserted `chunk_gws` at a time.
+    GWs with no earlier history are skipped, as predict_for_gw returns nothing for them.
+    """
+    model_dir = resolve_model_dir(model_dir)
+    model_version = resolve_model_version(model_version)
+    bundle = get_models(model_dir)
+    model_version = bundle["metrics"].get("model_version") or model_version
+
+    df_feat = load_feature_frame(db, model_dir, use_snapshot=use_snapshot, feature_engine=feature_engine)
+    season = current_season(db) if season is None else int(season)
+    asof = rolling_features_asof_gws(df_feat, gw_from, gw_to, season)
+    gws = sorted(int(g) for g in asof["gw"].unique())
+
+    chunk_gws = max(1, int(chunk_gws))
+    done, inserted = [], 0
+    for i in range(0, len(gws), chunk_gws):
+        chunk = gws[i:i + chunk_gws]
+        ctx = context_for_gws(db, chunk, season)
+        if ctx.empty:
+            continue
+        feats = attach_rolling_features(ctx, asof[asof["gw"].isin(chunk)], on=("season", "gw", "player_id"))
+        rows = _score_rows(bundle, feats, feats["gw"].to_numpy(), model_version)
+        if persist:
+            inserted += crud.bulk_upsert_predictions(db, rows)
+        done.extend(chunk)
+    return {"season": season, "gws": done, "model_version": model_version, "inserted": inserted}
 
 
 # Backward-compatible wrapper used by app.main
-def predict_gw(db: Session, gw: int, model_dir: str = None, model_version: str = None):
-    rows, _ver = predict_for_gw(db, gw, model_dir=model_dir, model_version=model_version)
+def predict_gw(db: Session, gw: int, model_dir: str = None, model_version: str = None, intervals: bool | None = None):
+    rows, _ver = predict_for_gw(db, gw, model_dir=model_dir, model_version=model_version, intervals=intervals)
     return rows
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from ..timing import span
+from .features import history_fingerprint, history_version, join_flat_table, load_flat_stats, load_player_columns
+
+# --- Columnar snapshot of the flat table's stats rows ------------------------------
+#
+# Training re-reads the full flat table on every run. We keep its stats side
+# (load_flat_stats) under the model dir as uncompressed structured .npy parts
+# (memory-mappable) plus a small JSON watermark (max season_gw + history_fingerprint up
+# to it, and the parts in order). The next run only queries GWs newer than the
+# watermark, which on a multi-season database is the current season's index range, and
+# appends them as a new part; after SNAPSHOT_MAX_PARTS parts they are rewritten as one.
+# A changed fingerprint (corrected or renumbered rows) means a full rebuild; it is only
+# recomputed when history_version moved since the meta was written (features.py,
+# "Change detection"), and an appended part adds its own rows' fingerprint.
+# Players / teams are not snapshotted: they are read and joined on every load
+# (join_flat_table), so price, status and strengths are current as in load_flat_table.
+
+SNAPSHOT_FILE = "flat_snapshot.npy"
+SNAPSHOT_META = "flat_snapshot.json"
+SNAPSHOT_MAX_PARTS = 8
+
+
+def _part_file(key: int) -> str:
+    return f"flat_snapshot.{int(key)}.npy"
+
+
+def _to_records(df: pd.DataFrame) -> np.ndarray:
+    arrays = []
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object)
+        if s.dtype == object:
+            num = pd.to_numeric(s, errors="coerce")
+            # DECIMAL columns come back as Decimal objects; strings become fixed-width unicode
+            if num.notna().sum() == s.notna().sum():
+                arrays.append(num.to_numpy(dtype=float))
+            else:
+                arrays.append(s.fillna("").astype(str).to_numpy(dtype=str))
+        else:
+            arrays.append(s.to_numpy())
+    return np.rec.fromarrays(arrays, names=list(df.columns))
+
+
+def _save_npy(path: str, df: pd.DataFrame) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, _to_records(df), allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _save_meta(model_dir: str, meta: dict) -> None:
+    meta_path = os.path.join(model_dir, SNAPSHOT_META)
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, meta_path)
+
+
+def read_snapshot(model_dir: str) -> tuple[pd.DataFrame, dict] | None:
+    """(stats rows, meta) from the snapshot parts; a single part is served as column views of the mmap."""
+    meta_path = os.path.join(model_dir, SNAPSHOT_META)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        parts = [(np.load(os.path.join(model_dir, name), mmap_mode="r"), n) for name, n in meta["parts"]]
+    except Exception:
+        # missing part, or written by an older version (whole flat table, no parts)
+        return None
+    if "max_season_gw" not in meta or "fingerprint" not in meta or not parts:
+        return None
+    if any(len(rec) != n for rec, n in parts) or len({rec.dtype for rec, _ in parts}) > 1:
+        # a part and the watermark written by different runs
+        return None
+    names = parts[0][0].dtype.names
+    if len(parts) == 1:
+        cols = {c: parts[0][0][c] for c in names}
+    else:
+        cols = {c: np.concatenate([rec[c] for rec, _ in parts]) for c in names}
+    return pd.DataFrame(cols, copy=False), meta
+
+
+def write_snapshot(db: Session, stats: pd.DataFrame, model_dir: str, version: int | None = None,
+                   fingerprint: list[int] | None = None) -> dict:
+    """Rewrite the snapshot as one part holding `stats` (load_flat_stats rows)."""
+    os.makedirs(model_dir, exist_ok=True)
+    key = int(stats["season_gw"].max())
+    _save_npy(os.path.join(model_dir, SNAPSHOT_FILE), stats)
+    meta = {"max_season_gw": key, "n_rows": int(len(stats)), "version": version,
+            "fingerprint": fingerprint if fingerprint is not None else history_fingerprint(db, key),
+            "parts": [[SNAPSHOT_FILE, int(len(stats))]]}
+    _save_meta(model_dir, meta)
+    # delta parts of the previous snapshot
+    for path in glob.glob(os.path.join(model_dir, "flat_snapshot.*.npy")):
+        if os.path.basename(path) != SNAPSHOT_FILE:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return meta
+
+
+def _add_fingerprint(db: Session, meta: dict, key: int) -> list[int]:
+    """meta's fingerprint plus that of the GWs after its watermark up to `key`."""
+    delta = history_fingerprint(db, key, key_from=meta["max_season_gw"])
+    return [a + b for a, b in zip(meta["fingerprint"], delta)]
+
+
+def append_snapshot(db: Session, delta: pd.DataFrame, model_dir: str, meta: dict, version: int | None = None) -> dict:
+    """Add the stats rows newer than the watermark as one more part; only `delta` is written."""
+    key = int(delta["season_gw"].max())
+    name = _part_file(key)
+    _save_npy(os.path.join(model_dir, name), delta)
+    meta = {"max_season_gw": key, "n_rows": int(meta["n_rows"]) + int(len(delta)), "version": version,
+            "fingerprint": _add_fingerprint(db, meta, key), "parts": [*meta["parts"], [name, int(len(delta))]]}
+    _save_meta(model_dir, meta)
+    return meta
+
+
+def load_flat_table_cached(db: Session, model_dir: str) -> pd.DataFrame:
+    """load_flat_table, with the stats rows served from the on-disk snapshot plus any newer GWs."""
+    # read before the rows: an import committed in between leaves the stored version stale
+    version = history_version(db)
+    with span("read_snapshot"):
+        snap = read_snapshot(model_dir)
+    if snap is not None and ((version is not None and version == snap[1].get("version"))
+                             or history_fingerprint(db, snap[1]["max_season_gw"]) == snap[1]["fingerprint"]):
+        stats, meta = snap
+        delta = load_flat_stats(db, key_from=meta["max_season_gw"])
+        if not delta.empty:
+            stats = pd.concat([stats, delta], ignore_index=True)
+            if len(meta["parts"]) >= SNAPSHOT_MAX_PARTS:
+                key = int(delta["season_gw"].max())
+                write_snapshot(db, stats, model_dir, version, _add_fingerprint(db, meta, key))
+            else:
+                append_snapshot(db, delta, model_dir, meta, version)
+        elif version != meta.get("version"):
+            # checked against the new version: record it so the next load skips the fingerprint
+            _save_meta(model_dir, {**meta, "version": version})
+    else:
+        # no snapshot, or rows at/below the watermark changed (fingerprint): full rebuild
+        stats = load_flat_stats(db)
+        if not stats.empty:
+            write_snapshot(db, stats, model_dir, version)
+
+    with span("join_flat_table", rows=len(stats)):
+        return join_flat_table(stats, *load_player_columns(db))
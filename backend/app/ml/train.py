@@ -1,15 +1,39 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import tempfile
+import time
 from typing import Any, Dict, Tuple
 
 import joblib
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+import sklearn
+from joblib import Parallel, delayed
 from sklearn.metrics import f1_score, roc_auc_score, mean_absolute_error, mean_squared_error
 
-from .features import build_rolling_features, dataset_for_training, load_flat_table
+from .backends import backend_params, make_models, predict_points, predict_start, resolve_backend
+from .features import (
+    build_rolling_features,
+    build_rolling_features_streamed,
+    dataset_for_training,
+    frame_mb,
+    load_rolling_features_sql,
+    resolve_feature_engine,
+)
+from .packed import (
+    PACKED_TOLERANCE,
+    PackedForest,
+    can_pack,
+    forest_kind,
+    pack_forest,
+    packed_files,
+    packed_max_abs_diff,
+    save_packed,
+)
+from .snapshot import load_flat_table_cached
+from ..timing import record, span
 
 
 def resolve_model_dir(model_dir: str | None = None) -> str:
@@ -30,103 +54,507 @@ def resolve_model_version(model_version: str | None = None) -> str:
         return str(env_ver)
     return "rf_v1"
 
+def load_feature_frame(db, model_dir: str, use_snapshot: bool = True, feature_engine: str | None = None):
+    """
+    Flat table + rolling features for training and backfills. The pandas engine reads the
+    flat table (through the snapshot, or streamed per block of players without it) and
+    builds the windows here; the sql engine has the database compute them
+    (features.load_rolling_features_sql) and bypasses the snapshot.
+    """
+    if resolve_feature_engine(feature_engine) == "sql":
+        return load_rolling_features_sql(db)
+    if not use_snapshot:
+        # straight from the database, one block of players at a time
+        return build_rolling_features_streamed(db)
+    with span("load_flat_table") as sp:
+        df = load_flat_table_cached(db, model_dir)
+        sp.rows = len(df)
+    return build_rolling_features(df)
+
 def _rmse(y_true, y_pred) -> float:
     return float(np.sqrt(mean_squared_error(y_true, y_pred)))
 
-def train_models(db, model_dir: str | None = None, model_version: str | None = None) -> Tuple[RandomForestClassifier, RandomForestRegressor, Dict[str, Any]]:
+FOLD_CACHE_FILE = "fold_cache.json"
+
+def fold_fingerprint(X, y_start, y_points, gws, test_gw: int, backend: str = "rf") -> str:
+    """Hash of everything a fold's metrics depend on: its train/test rows and the fold config."""
+    h = hashlib.sha1()
+    h.update(json.dumps([backend, *backend_params(backend, "fold"), sklearn.__version__], sort_keys=True).encode())
+    for mask in (gws < test_gw, gws == test_gw):
+        for arr in (X[mask], y_start[mask], y_points[mask]):
+            arr = np.ascontiguousarray(arr)
+            h.update(str(arr.shape).encode())
+            h.update(arr.tobytes())
+    return h.hexdigest()
+
+def _load_fold_cache(cache_dir: str | None) -> Dict[str, Any]:
+    if not cache_dir:
+        return {}
+    path = os.path.join(cache_dir, FOLD_CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_fold_cache(cache_dir: str | None, cache: Dict[str, Any]) -> None:
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, FOLD_CACHE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+
+def resolve_fold_budget(workers: int | None = None, threads: int | None = None) -> Tuple[int, int]:
+    """Fold workers (processes) and threads per fold fit; env TRAIN_FOLD_WORKERS / TRAIN_FOLD_THREADS."""
+    if workers is None:
+        workers = int(os.getenv("TRAIN_FOLD_WORKERS", "1"))
+    if threads is None:
+        # a single worker keeps today's behaviour: one fold at a time, all cores per fit
+        threads = int(os.getenv("TRAIN_FOLD_THREADS", "-1" if workers <= 1 else "1"))
+    return max(1, workers), threads
+
+def evaluate_fold(X, y_start, y_points, gws, test_gw: int, n_jobs: int = -1, backend: str = "rf") -> Dict[str, Any]:
+    """Fit on gws < test_gw, score on gws == test_gw. Top-level so it can run in a worker process."""
+    train_mask = gws < test_gw
+    test_mask = gws == test_gw
+
+    Xtr, Xte = X[train_mask], X[test_mask]
+    ytr_s, yte_s = y_start[train_mask], y_start[test_mask]
+    ytr_p, yte_p = y_points[train_mask], y_points[test_mask]
+
+    clf, reg = make_models(backend, "fold", n_jobs=n_jobs)
+
+    clf.fit(Xtr, ytr_s)
+    reg.fit(Xtr, ytr_p)
+
+    p_start = predict_start(clf, Xte)
+    yhat_start = (p_start >= 0.5).astype(int)
+    yhat_pts = predict_points(reg, Xte)
+
+    f1 = float(f1_score(yte_s, yhat_start, zero_division=0))
+    try:
+        auc = float(roc_auc_score(yte_s, p_start))
+    except Exception:
+        auc = float("nan")
+    mae = float(mean_absolute_error(yte_p, yhat_pts))
+    rmse = _rmse(yte_p, yhat_pts)
+
+    return {"test_gw": int(test_gw), "f1": f1, "roc_auc": auc, "mae": mae, "rmse": rmse}
+
+def run_folds(X, y_start, y_points, gws, test_gws, workers: int | None = None, threads: int | None = None,
+              cache_dir: str | None = None, backend: str = "rf") -> list:
+    """
+    Evaluate rolling-origin folds, concurrently across `workers` processes.
+    Forests are seeded, so per-fold metrics do not depend on the worker/thread split.
+    With `cache_dir`, a fold whose fingerprint (rows + config) is unchanged since the
+    last run is read back from fold_cache.json instead of being refit.
+    Results come back in test_gws order.
+    """
+    workers, threads = resolve_fold_budget(workers, threads)
+    cache = _load_fold_cache(cache_dir)
+    keys = [fold_fingerprint(X, y_start, y_points, gws, g, backend=backend) for g in test_gws]
+    todo = [g for g, k in zip(test_gws, keys) if k not in cache]
+
+    if workers <= 1 or len(todo) <= 1:
+        fresh = [evaluate_fold(X, y_start, y_points, gws, g, n_jobs=threads, backend=backend) for g in todo]
+    else:
+        # loky workers; large arrays are memory-mapped to the workers rather than copied
+        fresh = Parallel(n_jobs=min(workers, len(todo)))(
+            delayed(evaluate_fold)(X, y_start, y_points, gws, g, n_jobs=threads, backend=backend) for g in todo
+        )
+    by_gw = {r["test_gw"]: r for r in fresh}
+
+    out = []
+    for g, k in zip(test_gws, keys):
+        out.append(by_gw[int(g)] if int(g) in by_gw else cache[k])
+    # keep only folds that still exist, so the cache does not grow without bound
+    _save_fold_cache(cache_dir, dict(zip(keys, out)))
+    return out
+
+def train_models(
+    db,
+    model_dir: str | None = None,
+    model_version: str | None = None,
+    use_snapshot: bool = True,
+    fold_workers: int | None = None,
+    fold_threads: int | None = None,
+    use_fold_cache: bool = True,
+    backend: str | None = None,
+    feature_engine: str | None = None,
+    evaluate_only: bool = False,
+) -> Tuple[Any, Any, Dict[str, Any]]:
+    """
+    Rolling-origin evaluation, final fit and save into model_dir. With evaluate_only the
+    set is saved into a scratch dir and discarded instead (sizes and the packed parity
+    check as for a real save): only backends.json in model_dir records the run, and the
+    served models are left alone.
+    """
+    # per-stage wall time (and peak memory with PIPELINE_TIMING=mem) lands in metrics["stages"]
+    with record("train") as rec:
+        return _train_models(
+            db, rec, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+            fold_workers=fold_workers, fold_threads=fold_threads, use_fold_cache=use_fold_cache,
+            backend=backend, feature_engine=feature_engine, evaluate_only=evaluate_only,
+        )
+
+
+def _train_models(
+    db,
+    rec,
+    model_dir: str | None = None,
+    model_version: str | None = None,
+    use_snapshot: bool = True,
+    fold_workers: int | None = None,
+    fold_threads: int | None = None,
+    use_fold_cache: bool = True,
+    backend: str | None = None,
+    feature_engine: str | None = None,
+    evaluate_only: bool = False,
+) -> Tuple[Any, Any, Dict[str, Any]]:
     model_dir = resolve_model_dir(model_dir)
     model_version = resolve_model_version(model_version)
+    backend = resolve_backend(backend, model_version)
 
-    df = load_flat_table(db)
-    if df.empty:
+    # snapshot under model_dir: only GWs newer than its watermark are queried
+    df_feat = load_feature_frame(db, model_dir, use_snapshot=use_snapshot, feature_engine=feature_engine)
+    if df_feat.empty:
         raise RuntimeError("No data in player_gameweek_stats. Run import first.")
 
-    df_feat = build_rolling_features(df)
-    X, y_start, y_points, meta, feature_cols = dataset_for_training(df_feat)
+    with span("dataset_for_training", rows=len(df_feat)):
+        X, y_start, y_points, meta, feature_cols = dataset_for_training(df_feat)
+    memory_mb = {"features": frame_mb(df_feat), "X": frame_mb(X)}
 
-    gws = meta["gw"].to_numpy()
+    # folds run over season_gw keys (season * 100 + gw), so test GWs go in order across seasons
+    # and per_gw[i]["test_gw"] is such a key
+    gws = meta["season_gw"].to_numpy()
     unique_gws = sorted(set(gws))
     if len(unique_gws) < 4:
         raise RuntimeError("Not enough gameweeks for training/evaluation. Need at least 4 GWs.")
 
     # rolling-origin evaluation (test one GW at a time after initial warmup)
     test_gws = unique_gws[3:]
-    f1s, aucs, maes, rmses = [], [], [], []
-    per_gw = []
-
-    for test_gw in test_gws:
-        train_mask = gws < test_gw
-        test_mask = gws == test_gw
-
-        Xtr, Xte = X[train_mask], X[test_mask]
-        ytr_s, yte_s = y_start[train_mask], y_start[test_mask]
-        ytr_p, yte_p = y_points[train_mask], y_points[test_mask]
-
-        clf = RandomForestClassifier(
-            n_estimators=500,
-            max_depth=None,
-            min_samples_leaf=3,
-            random_state=42,
-            n_jobs=-1,
-        )
-        reg = RandomForestRegressor(
-            n_estimators=600,
-            max_depth=None,
-            min_samples_leaf=3,
-            random_state=42,
-            n_jobs=-1,
+    # an evaluation does not use the fold cache: it would evict the served backend's folds
+    use_fold_cache = use_fold_cache and not evaluate_only
+    t0 = time.perf_counter()
+    with span("rolling_origin_folds", rows=len(X)):
+        per_gw = run_folds(
+            X.to_numpy(), y_start.to_numpy(), y_points.to_numpy(), gws, test_gws,
+            workers=fold_workers, threads=fold_threads, cache_dir=model_dir if use_fold_cache else None,
+            backend=backend,
         )
-
-        clf.fit(Xtr, ytr_s)
-        reg.fit(Xtr, ytr_p)
-
-        p_start = clf.predict_proba(Xte)[:, 1]
-        yhat_start = (p_start >= 0.5).astype(int)
-        yhat_pts = reg.predict(Xte)
-
-        f1 = float(f1_score(yte_s, yhat_start, zero_division=0))
-        try:
-            auc = float(roc_auc_score(yte_s, p_start))
-        except Exception:
-            auc = float("nan")
-        mae = float(mean_absolute_error(yte_p, yhat_pts))
-        rmse = _rmse(yte_p, yhat_pts)
-
-        f1s.append(f1); aucs.append(auc); maes.append(mae); rmses.append(rmse)
-        per_gw.append({"test_gw": int(test_gw), "f1": f1, "roc_auc": auc, "mae": mae, "rmse": rmse})
+    fold_seconds = time.perf_counter() - t0
+    f1s = [r["f1"] for r in per_gw]
+    aucs = [r["roc_auc"] for r in per_gw]
+    maes = [r["mae"] for r in per_gw]
+    rmses = [r["rmse"] for r in per_gw]
 
     _toggle = lambda arr: float(np.nanmean(arr)) if len(arr) else float('nan')
 
     metrics = {
         "model_version": model_version,
+        "backend": backend,
+        "feature_engine": resolve_feature_engine(feature_engine),
         "n_rows": int(len(df_feat)),
-        "max_gw": int(max(unique_gws)),
+        "max_season": int(max(unique_gws)) // 100,
+        "max_gw": int(max(unique_gws)) % 100,
         "classification": {"f1_mean": _toggle(f1s), "roc_auc_mean": _toggle(aucs)},
         "regression": {"mae_mean": _toggle(maes), "rmse_mean": _toggle(rmses)},
         "per_gw": per_gw,
         "feature_cols": feature_cols,
+        "memory_mb": memory_mb,
     }
 
     # fit final models on all data
-    clf_final = RandomForestClassifier(
-        n_estimators=800, min_samples_leaf=3, random_state=42, n_jobs=-1
-    )
-    reg_final = RandomForestRegressor(
-        n_estimators=900, min_samples_leaf=3, random_state=42, n_jobs=-1
-    )
-    clf_final.fit(X, y_start)
-    reg_final.fit(X, y_points)
+    t0 = time.perf_counter()
+    clf_final, reg_final = make_models(backend, "final", n_jobs=-1)
+    with span("fit_start_clf", rows=len(X)):
+        clf_final.fit(X, y_start)
+    with span("fit_points_reg", rows=len(X)):
+        reg_final.fit(X, y_points)
+    final_fit_seconds = time.perf_counter() - t0
+
+    # inference latency on one GW worth of rows (what a /predict call scores), best of 3;
+    # with MODEL_PACKED=auto serving uses whichever of sklearn / packed was faster here
+    X_gw = X[gws == max(unique_gws)]
+    with span("predict_gw", rows=len(X_gw)):
+        predict_ms = _predict_ms(clf_final, reg_final, X_gw)
+
+    metrics["timing"] = {
+        "fold_seconds": fold_seconds,
+        "final_fit_seconds": final_fit_seconds,
+        "predict_ms_per_gw": predict_ms,
+    }
+    packed = None
+    if can_pack(clf_final) and can_pack(reg_final):
+        # the flattened float32 forests predict_for_gw can serve instead, on the same GW
+        with span("pack_forests"):
+            packed = {"start_clf": pack_forest(clf_final), "points_reg": pack_forest(reg_final)}
+        with span("predict_gw_packed", rows=len(X_gw)):
+            metrics["timing"]["predict_ms_per_gw_packed"] = _predict_ms(
+                PackedForest(packed["start_clf"], forest_kind(clf_final)),
+                PackedForest(packed["points_reg"], forest_kind(reg_final)), X_gw,
+            )
+    # metrics.json is written by save_artifacts, so its own stage is not in there
+    metrics["stages"] = rec.summary()
+    if evaluate_only:
+        os.makedirs(model_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=model_dir, prefix="evaluate.") as scratch:
+            save_artifacts(scratch, clf_final, reg_final, metrics, X_check=X_gw, packed=packed)
+    else:
+        save_artifacts(model_dir, clf_final, reg_final, metrics, X_check=X_gw, packed=packed)
+    record_backend(model_dir, metrics, served=not evaluate_only)
+    return clf_final, reg_final, metrics
+
+
+def _predict_ms(clf, reg, X, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        predict_start(clf, X)
+        predict_points(reg, X)
+        best = min(best, (time.perf_counter() - t0) * 1000.0)
+    return best
+
+
+# --- Backend comparison --------------------------------------------------------------
+#
+# backends.json in the model dir keeps the latest train (or `train --evaluate-only`) of
+# every model version side by side, with its backend: fold metrics, fit and per-GW
+# predict times, artifact size, and whether it is the set being served.
+# It is written next to the served set, never as part of it, so comparing hgb with rf
+# does not replace the models or metrics.json being served.
+
+BACKENDS_FILE = "backends.json"
 
+
+def _backend_summary(metrics: Dict[str, Any], artifact_bytes: int) -> Dict[str, Any]:
+    timing = metrics.get("timing") or {}
+    return {
+        "backend": metrics.get("backend", "rf"),
+        "max_gw": metrics.get("max_gw"),
+        "f1_mean": metrics["classification"]["f1_mean"],
+        "roc_auc_mean": metrics["classification"]["roc_auc_mean"],
+        "mae_mean": metrics["regression"]["mae_mean"],
+        "rmse_mean": metrics["regression"]["rmse_mean"],
+        "fold_seconds": timing.get("fold_seconds"),
+        "final_fit_seconds": timing.get("final_fit_seconds"),
+        "predict_ms_per_gw": timing.get("predict_ms_per_gw"),
+        "predict_ms_per_gw_packed": timing.get("predict_ms_per_gw_packed"),
+        "artifact_bytes": artifact_bytes,
+    }
+
+
+def record_backend(model_dir: str, metrics: Dict[str, Any], served: bool = True) -> Dict[str, Any]:
+    """Update the run's entry (by model_version) in backends.json; `served` = the set in model_dir is this run."""
+    path = os.path.join(model_dir, BACKENDS_FILE)
+    backends = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                backends = json.load(f)
+        except Exception:
+            backends = {}
+    summary = _backend_summary(metrics, sum(d["bytes"] for d in (metrics.get("artifacts") or {}).values()))
+    version = metrics.get("model_version")
+    backends[version] = {**summary, "served": served}
+    if served:
+        for name, entry in backends.items():
+            if name != version:
+                entry["served"] = False
     os.makedirs(model_dir, exist_ok=True)
-    joblib.dump(clf_final, os.path.join(model_dir, "start_clf.joblib"))
-    joblib.dump(reg_final, os.path.join(model_dir, "points_reg.joblib"))
-    with open(os.path.join(model_dir, "metrics.json"), "w", encoding="utf-8") as f:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(backends, f, indent=2)
+    os.replace(tmp, path)
+    return backends
+
+
+def file_digest(path: str) -> Dict[str, Any]:
+    """Size and sha256 of a file: identifies its content wherever it was copied to."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return {"bytes": os.path.getsize(path), "sha256": h.hexdigest()}
+
+
+# Forests are written as packed .npy arrays (see packed.py) and, unless
+# MODEL_SAVE_JOBLIB=0, also as joblib pickles: sklearn's own predict (served when it
+# timed faster, see MODEL_PACKED in predict.py) and `cli update`, which grows trees on
+# the sklearn objects, need them. Without them serving is packed-only and `cli update`
+# falls back to a full train.
+
+def _save_joblib(clf, reg) -> bool:
+    return os.getenv("MODEL_SAVE_JOBLIB", "1") != "0" or not (can_pack(clf) and can_pack(reg))
+
+
+def save_artifacts(model_dir: str, clf, reg, metrics: Dict[str, Any], X_check=None,
+                   packed: Dict[str, Dict[str, np.ndarray]] | None = None) -> None:
+    """
+    Write both models, then metrics.json last. Every file is replaced atomically and
+    metrics.json records the size and sha256 of the model files it belongs to, so readers
+    (see predict.get_models) can tell a complete set from one that is mid-write, also
+    after the directory was copied without its mtimes (cp, scp, git, image builds).
+    `packed` holds the forests' pack_forest arrays if the caller already built them.
+    With X_check, a packed forest further than PACKED_TOLERANCE from sklearn on any of
+    its rows raises before anything is written.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    metrics_path = os.path.join(model_dir, "metrics.json")
+
+    models = (("start_clf", clf), ("points_reg", reg))
+    if can_pack(clf) and can_pack(reg):
+        packed = packed or {name: pack_forest(model) for name, model in models}
+        if X_check is not None:
+            diffs = {
+                name: packed_max_abs_diff(model, PackedForest(packed[name], forest_kind(model)), X_check)
+                for name, model in models
+            }
+            metrics["packed_max_abs_diff"] = {"p_start": diffs["start_clf"], "expected_points": diffs["points_reg"]}
+            bad = {name: d for name, d in diffs.items() if not d <= PACKED_TOLERANCE}
+            if bad:
+                raise RuntimeError(f"Packed forests deviate from sklearn by {bad} (> {PACKED_TOLERANCE}); not saved")
+    else:
+        packed = None
+
+    digests = {}
+    save_joblib = _save_joblib(clf, reg)
+    if save_joblib:
+        for name, model in models:
+            path = os.path.join(model_dir, f"{name}.joblib")
+            tmp = f"{path}.{os.getpid()}.tmp"
+            joblib.dump(model, tmp)
+            os.replace(tmp, path)
+            digests[f"{name}.joblib"] = file_digest(path)
+
+    metrics["packed"] = {}
+    if packed is not None:
+        for name, model in models:
+            info = save_packed(model, model_dir, name, arrays=packed[name])
+            for fname in packed_files(name):
+                digests[fname] = file_digest(os.path.join(model_dir, fname))
+                info["bytes"] = info.get("bytes", 0) + digests[fname]["bytes"]
+            metrics["packed"][name] = info
+
+    # sets written before backends.json carried the comparison here (see record_backend)
+    metrics.pop("backends", None)
+    metrics["artifacts"] = digests
+    tmp = f"{metrics_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(metrics, f, indent=2)
+    os.replace(tmp, metrics_path)
+    if not save_joblib:
+        # pickles of an earlier set: `cli update` would otherwise grow trees on stale forests
+        for name, _ in models:
+            try:
+                os.remove(os.path.join(model_dir, f"{name}.joblib"))
+            except FileNotFoundError:
+                pass
 
-    return clf_final, reg_final, metrics
+
+def _slide_forest(forest, X, y, n_new: int, seed: int):
+    """Grow `n_new` trees on (X, y) with warm_start, then drop the `n_new` oldest ones."""
+    n_old = len(forest.estimators_)
+    n_new = max(1, min(int(n_new), n_old))
+    # a fresh seed per update, so the new trees do not replay earlier bootstrap draws
+    forest.set_params(warm_start=True, n_estimators=n_old + n_new, random_state=seed)
+    forest.fit(X, y)
+    forest.estimators_ = forest.estimators_[n_new:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    return n_new
+
+
+def update_models(db, model_dir: str | None = None, model_version: str | None = None, use_snapshot: bool = True,
+                  refresh_frac: float | None = None, feature_engine: str | None = None):
+    with record("update") as rec:
+        return _update_models(db, rec, model_dir=model_dir, model_version=model_version,
+                              use_snapshot=use_snapshot, refresh_frac=refresh_frac, feature_engine=feature_engine)
+
+
+def _update_models(db, rec, model_dir: str | None = None, model_version: str | None = None,
+                   use_snapshot: bool = True, refresh_frac: float | None = None, feature_engine: str | None = None):
+    """
+    Incremental refresh of the final forests: keep the saved ones, fit `refresh_frac` of
+    their size as new trees on the expanded dataset and retire as many of the oldest trees
+    (a sliding tree budget). Evaluation metrics from the last full train are kept.
+    Falls back to a full train_models when there is nothing compatible to update.
+    """
+    model_dir = resolve_model_dir(model_dir)
+    model_version = resolve_model_version(model_version)
+    if refresh_frac is None:
+        refresh_frac = float(os.getenv("TRAIN_REFRESH_FRAC", "0.15"))
+
+    clf_path = os.path.join(model_dir, "start_clf.joblib")
+    reg_path = os.path.join(model_dir, "points_reg.joblib")
+    metrics_path = os.path.join(model_dir, "metrics.json")
+    if not (os.path.exists(clf_path) and os.path.exists(reg_path) and os.path.exists(metrics_path)):
+        return train_models(db, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+                            feature_engine=feature_engine)
+
+    with open(metrics_path, "r", encoding="utf-8") as f:
+        metrics = json.load(f)
+    if metrics.get("backend", "rf") != "rf":
+        # only bagged forests can add/retire trees independently
+        return train_models(db, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+                            backend=metrics.get("backend"), feature_engine=feature_engine)
+
+    df_feat = load_feature_frame(db, model_dir, use_snapshot=use_snapshot, feature_engine=feature_engine)
+    if df_feat.empty:
+        raise RuntimeError("No data in player_gameweek_stats. Run import first.")
+    with span("dataset_for_training", rows=len(df_feat)):
+        X, y_start, y_points, meta, feature_cols = dataset_for_training(df_feat)
+    if feature_cols != metrics.get("feature_cols"):
+        # feature set changed since the saved forests were fit
+        return train_models(db, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+                            feature_engine=feature_engine)
+
+    with span("joblib.load"):
+        clf = joblib.load(clf_path)
+        reg = joblib.load(reg_path)
+    if not hasattr(clf, "estimators_") or not hasattr(reg, "estimators_"):
+        return train_models(db, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+                            feature_engine=feature_engine)
+
+    max_key = int(meta["season_gw"].max())
+    max_gw = max_key % 100
+    with span("slide_start_clf", rows=len(X)):
+        n_clf = _slide_forest(clf, X, y_start, round(len(clf.estimators_) * refresh_frac), seed=42 + max_key)
+    with span("slide_points_reg", rows=len(X)):
+        n_reg = _slide_forest(reg, X, y_points, round(len(reg.estimators_) * refresh_frac), seed=42 + max_key)
+
+    prev = metrics.get("incremental") or {}
+    metrics.update({
+        "model_version": model_version,
+        "n_rows": int(len(df_feat)),
+        "max_season": max_key // 100,
+        "max_gw": max_gw,
+        "incremental": {
+            "updates": int(prev.get("updates", 0)) + 1,
+            "refreshed_clf_trees": n_clf,
+            "refreshed_reg_trees": n_reg,
+            # evaluation metrics above come from the last full train
+            "evaluated_max_gw": int(prev.get("evaluated_max_gw", metrics.get("max_gw", max_gw))),
+        },
+    })
+    metrics["stages"] = rec.summary()
+
+    save_artifacts(model_dir, clf, reg, metrics, X_check=X[meta["season_gw"].to_numpy() == max_key])
+    record_backend(model_dir, metrics)
+    return clf, reg, metrics
 
 
 # Backward-compatible wrapper used by app.cli/app.main
-def train_and_save(db, model_dir: str = None, model_version: str = None):
-    _, _, metrics = train_models(db, model_dir=model_dir, model_version=model_version)
+def train_and_save(db, model_dir: str = None, model_version: str = None, use_snapshot: bool = True,
+                   fold_workers: int = None, fold_threads: int = None, use_fold_cache: bool = True,
+                   backend: str = None, feature_engine: str = None, evaluate_only: bool = False):
+    _, _, metrics = train_models(
+        db, model_dir=model_dir, model_version=model_version, use_snapshot=use_snapshot,
+        fold_workers=fold_workers, fold_threads=fold_threads, use_fold_cache=use_fold_cache,
+        backend=backend, feature_engine=feature_engine, evaluate_only=evaluate_only,
+    )
     return metrics
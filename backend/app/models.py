@@ -1,9 +1,18 @@
 from __future__ import annotations
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Boolean, BigInteger, DECIMAL, TIMESTAMP, text
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, DateTime, Enum, ForeignKey, Boolean, BigInteger, DECIMAL, TIMESTAMP, Index, UniqueConstraint, text
 
 Base = declarative_base()
 
+# SQLite only autoincrements INTEGER PRIMARY KEY (local/benchmark databases)
+_BigId = BigInteger().with_variant(Integer, "sqlite")
+
+# Seasons are the starting year (2025 = 2025/26). GW-keyed tables carry the season and
+# lead their keys with it, so reads of one season only touch that season's index range.
+# players/teams hold the ids of the latest import; `season` is the last season a row was
+# imported for (older ones are archived, see scripts/import_fpl_api.py) and `code` is
+# FPL's id that stays the same across seasons.
+
 class Team(Base):
     __tablename__ = "teams"
     id = Column(Integer, primary_key=True)
@@ -14,16 +23,18 @@ class Team(Base):
     strength_defense = Column(Integer, nullable=False, default=50)
     strength_overall_home = Column(Integer, nullable=True)
     strength_overall_away = Column(Integer, nullable=True)
+    code = Column(Integer, nullable=True)
+    season = Column(SmallInteger, nullable=False, index=True)
 
 class Player(Base):
     __tablename__ = "players"
     id = Column(Integer, primary_key=True)
     name = Column(String(128), nullable=False)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
-    position = Column(Enum("GK","DEF","MID","FWD"), nullable=False)
+    position = Column(Enum("GK","DEF","MID","FWD", name="player_position"), nullable=False)
 
     price = Column(DECIMAL(5,2), nullable=False, default=5.00)
-    status = Column(Enum("fit","injured","doubt","suspended","unknown"), nullable=False, default="fit")
+    status = Column(Enum("fit","injured","doubt","suspended","unknown", name="player_status"), nullable=False, default="fit")
 
     chance_playing_next = Column(Integer, nullable=True)
     chance_playing_this = Column(Integer, nullable=True)
@@ -33,11 +44,14 @@ class Player(Base):
     total_points = Column(Integer, nullable=True)
     now_cost = Column(Integer, nullable=True)
     photo = Column(String(64), nullable=True)
+    code = Column(Integer, nullable=True)
+    season = Column(SmallInteger, nullable=False, index=True)
 
     team = relationship("Team")
 
 class Gameweek(Base):
     __tablename__ = "gameweeks"
+    season = Column(SmallInteger, primary_key=True)
     gw = Column(Integer, primary_key=True)
     name = Column(String(32), nullable=True)
     deadline_time = Column(DateTime, nullable=True)
@@ -47,7 +61,9 @@ class Gameweek(Base):
 
 class Match(Base):
     __tablename__ = "matches"
-    id = Column(Integer, primary_key=True)  # FPL fixture id
+    __table_args__ = (Index("idx_matches_season_gw", "season", "gw"),)
+    season = Column(SmallInteger, primary_key=True)
+    id = Column(Integer, primary_key=True)  # FPL fixture id (renumbered every season)
     gw = Column(Integer, nullable=True)
     kickoff_time = Column(DateTime, nullable=True)
     home_team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
@@ -58,7 +74,12 @@ class Match(Base):
 
 class PlayerGameweekStats(Base):
     __tablename__ = "player_gameweek_stats"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    __table_args__ = (
+        UniqueConstraint("season", "gw", "player_id", name="uq_player_season_gw"),
+        Index("idx_pgs_player_season_gw", "player_id", "season", "gw"),
+    )
+    id = Column(_BigId, primary_key=True, autoincrement=True)
+    season = Column(SmallInteger, nullable=False)
     gw = Column(Integer, nullable=False)
     player_id = Column(Integer, ForeignKey("players.id"), nullable=False)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
@@ -90,12 +111,27 @@ class PlayerGameweekStats(Base):
     xg = Column(Float, nullable=False, default=0.0)
     xa = Column(Float, nullable=False, default=0.0)
 
+# One row (id = 1) whose version the importer bumps in every transaction that writes
+# stats or renumbers ids; the feature caches check it instead of the whole history
+# (see app.ml.features, "Change detection").
+class HistoryVersion(Base):
+    __tablename__ = "history_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
 class Prediction(Base):
     __tablename__ = "predictions"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    gw = Column(Integer, nullable=False, index=True)
+    __table_args__ = (
+        UniqueConstraint("season", "gw", "player_id", "model_version", name="uq_pred_season_gw_player_version"),
+    )
+    id = Column(_BigId, primary_key=True, autoincrement=True)
+    season = Column(SmallInteger, nullable=False)
+    gw = Column(Integer, nullable=False)
     player_id = Column(Integer, ForeignKey("players.id"), nullable=False)
     p_start = Column(Float, nullable=False)
     expected_points = Column(Float, nullable=False)
+    points_p10 = Column(Float, nullable=True)
+    points_p50 = Column(Float, nullable=True)
+    points_p90 = Column(Float, nullable=True)
     model_version = Column(String(32), nullable=False)
     created_at = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"), nullable=False)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Literal
 from datetime import date
 
@@ -91,6 +91,9 @@ class PredictionOut(BaseModel):
     player_id: int
     p_start: float
     expected_points: float
+    points_p10: float | None = None
+    points_p50: float | None = None
+    points_p90: float | None = None
     model_version: str
 
 class PredictResponse(BaseModel):
@@ -98,10 +101,24 @@ class PredictResponse(BaseModel):
     model_version: str
     inserted: int
 
+class PredictRangeRequest(BaseModel):
+    start_gw: int
+    horizon: int = 6
+    # P10/P50/P90 as well (forest models only: 400 with hgb); None = PREDICTION_INTERVALS
+    intervals: bool | None = None
+
+class PredictRangeResponse(BaseModel):
+    start_gw: int
+    gws: List[int]
+    model_version: str
+    inserted: int
+
 class LineupRequest(BaseModel):
     formation: str = "4-4-2"
     budget: float = 100.0
     max_per_team: int = 3
+    # search time budget; None = LINEUP_TIME_BUDGET_MS
+    time_budget_ms: float | None = None
 
 class LineupPlayer(BaseModel):
     player_id: int
@@ -119,8 +136,105 @@ class LineupResponse(BaseModel):
     budget: float
     total_expected_points: float
     total_score: float
+    # optimal: the search finished; otherwise total_score is at most gap below the best XI
+    # (bound = total_score + gap)
+    optimal: bool
+    gap: float
+    bound: float
+    search_ms: float
     players: List[LineupPlayer]
 
+class SquadRequest(BaseModel):
+    budget: float = 100.0
+    max_per_team: int = 3
+    # share of a bench player's score that counts; None = SQUAD_BENCH_WEIGHT
+    bench_weight: float | None = None
+    # whole search; None = SQUAD_TIME_BUDGET_MS
+    time_budget_ms: float | None = None
+
+class SquadPlayer(LineupPlayer):
+    role: Literal["XI", "bench"]
+    # 1 = bench GK, then outfield substitutes in order
+    bench_order: int | None = None
+    is_captain: bool = False
+    is_vice_captain: bool = False
+
+class SquadResponse(BaseModel):
+    gw: int
+    budget: float
+    formation: str
+    captain_id: int
+    vice_captain_id: int
+    total_price: float
+    # XI with the captain counted twice
+    xi_expected_points: float
+    xi_score: float
+    bench_score: float
+    # xi_score + bench_weight * bench_score, what the search maximises
+    objective: float
+    optimal: bool
+    gap: float
+    bound: float
+    search_ms: float
+    players: List[SquadPlayer]
+
+class TransferPlanRequest(BaseModel):
+    # the current 15: 2 GK, 5 DEF, 5 MID, 3 FWD
+    squad: List[int]
+    bank: float = 0.0
+    free_transfers: int = 1
+    start_gw: int
+    horizon: int = 6
+    max_per_team: int = 3
+    max_transfers_per_gw: int = 2
+    # None = SQUAD_BENCH_WEIGHT / PLANNER_BEAM_WIDTH / PLANNER_TIME_BUDGET_MS / PLANNER_NODE_BUDGET
+    bench_weight: float | None = None
+    beam_width: int | None = None
+    time_budget_ms: float | None = None
+    node_budget: int | None = None
+
+class TransferPlayer(BaseModel):
+    player_id: int
+    name: str | None = None
+    team_id: int
+    position: Position
+    price: float
+
+class Transfer(BaseModel):
+    out: TransferPlayer
+    # "in" in JSON (a keyword in Python)
+    in_: TransferPlayer = Field(alias="in")
+
+class TransferPlanGW(BaseModel):
+    gw: int
+    transfers: List[Transfer]
+    # free transfers available this GW (before these transfers)
+    free_transfers: int
+    hits: float
+    bank: float
+    # XI with the captain counted twice
+    points: float
+    objective: float
+    captain_id: int
+    xi: List[int]
+
+class TransferPlanResponse(BaseModel):
+    gws: List[int]
+    # GWs without predictions (blank GW): 0 points, no transfers, the free transfer carries over
+    skipped_gws: List[int] = []
+    plan: List[TransferPlanGW]
+    points: float
+    hits: float
+    net_points: float
+    # the squad kept unchanged over the same GWs
+    baseline_points: float
+    gain: float
+    objective: float
+    # false when the time or node budget cut the search short
+    complete: bool
+    nodes: int
+    search_ms: float
+
 class ActualLineupRequest(BaseModel):
     formation: str = "4-4-2"
     max_per_team: int = 3
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import os
+import time
+from typing import List, Dict
+
+import numpy as np
+
+from .lineup import POSITIONS, _scored_rows, budget_units, price_units, select
+
+# FPL squad: 2 GK, 5 DEF, 5 MID, 3 FWD; the XI is 1 GK, >= 3 DEF, >= 2 MID, >= 1 FWD
+SQUAD_NEED = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+XI_FORMATIONS = ["3-4-3", "3-5-2", "4-3-3", "4-4-2", "4-5-1", "5-2-3", "5-3-2", "5-4-1"]
+
+# whole search (all formations and captain positions together)
+SQUAD_TIME_BUDGET_MS = float(os.getenv("SQUAD_TIME_BUDGET_MS", "300"))
+# bench points count this much of a starter's (they only score when a starter doesn't play)
+SQUAD_BENCH_WEIGHT = float(os.getenv("SQUAD_BENCH_WEIGHT", "0.1"))
+
+# --- Squad search ------------------------------------------------------------------
+#
+# objective = XI score + captain score (doubled) + bench_weight * bench score, with
+# score = expected_points * p_start as for the XI. For a fixed formation and captain
+# position this is lineup.select with slot weights: within a position the best players
+# start (weight 1, the first one 2 if it holds the captain) and the rest sit on the bench
+# (bench_weight). The best squad is the best of these 8 formations x 4 captain positions,
+# run in order of a cheap bound until it can't beat the best so far; each run only looks
+# for squads above that (cutoff), so most stop at their root bound.
+# Bench order: the bench GK, then outfielders by score (p_start breaks ties).
+
+def _shape(formation: str) -> Dict[str, int]:
+    d, m, f = (int(x) for x in formation.split("-"))
+    return {"GK": 1, "DEF": d, "MID": m, "FWD": f}
+
+def optimize_squad(pred_rows: List[dict], budget: float = 100.0, max_per_team: int = 3,
+                   bench_weight: float | None = None, time_budget_ms: float | None = None) -> Dict:
+    """
+    Best 15-man squad with its XI, bench order, captain and vice-captain. Returns
+    {players (with role, bench_order, is_captain, is_vice_captain), formation, captain_id,
+    vice_captain_id, total_price, xi_expected, xi_score, bench_score, objective, optimal,
+    gap, bound, seconds}; players is empty when no squad fits (optimal) or none was
+    found in time (not optimal).
+    """
+    t0 = time.perf_counter()
+    bench_weight = SQUAD_BENCH_WEIGHT if bench_weight is None else float(bench_weight)
+    time_budget_ms = SQUAD_TIME_BUDGET_MS if time_budget_ms is None else float(time_budget_ms)
+    deadline = t0 + time_budget_ms / 1000.0
+
+    cand = [r for r in _scored_rows(pred_rows) if r["position"] in SQUAD_NEED]
+    score = [r["score"] for r in cand]
+    units = [price_units(r["price"]) for r in cand]
+    team = [int(r["team_id"]) for r in cand]
+    pos = [POSITIONS.index(r["position"]) for r in cand]
+    need = [SQUAD_NEED[p] for p in POSITIONS]
+
+    def weights(xi: Dict[str, int], captain_pos: str | None) -> List[List[float]]:
+        return [[2.0 if (k == 0 and p == captain_pos) else 1.0 if k < xi[p] else bench_weight
+                 for k in range(SQUAD_NEED[p])] for p in POSITIONS]
+
+    # without the captain, per formation: + the best score of the captain's position bounds
+    # each (formation, captain position) run; most promising first, so the cutoff bites early
+    top = {p: max((r["score"] for r in cand if r["position"] == p), default=0.0) for p in POSITIONS}
+    runs = []
+    for formation in XI_FORMATIONS:
+        base = select(score, units, team, pos, need, budget_units(budget), max_per_team,
+                      weights=weights(_shape(formation), None), cutoff=np.inf)["bound"]
+        runs += [(base + top[p], formation, p) for p in POSITIONS if np.isfinite(base)]
+    runs.sort(key=lambda run: (-run[0], XI_FORMATIONS.index(run[1]), POSITIONS.index(run[2])))
+
+    best, best_pick, best_formation = -np.inf, None, None
+    bound, optimal = -np.inf, True
+    for k, (run_bound, formation, captain_pos) in enumerate(runs):
+        if run_bound <= best:
+            break
+        left_ms = (deadline - time.perf_counter()) * 1000.0
+        if left_ms <= 0:
+            # not searched: only their bounds are known
+            optimal = False
+            bound = max(bound, max(run[0] for run in runs[k:]))
+            break
+        res = select(score, units, team, pos, need, budget_units(budget), max_per_team,
+                     time_budget_ms=left_ms, weights=weights(_shape(formation), captain_pos), cutoff=best)
+        bound = max(bound, res["bound"])
+        optimal = optimal and res["optimal"]
+        if res["picked"] is not None and res["score"] > best:
+            best, best_pick, best_formation = res["score"], res["picked"], formation
+
+    seconds = time.perf_counter() - t0
+    if best_pick is None:
+        return {"players": [], "formation": None, "captain_id": None, "vice_captain_id": None,
+                "total_price": 0.0, "xi_expected": 0.0, "xi_score": 0.0, "bench_score": 0.0,
+                "objective": 0.0, "optimal": optimal, "gap": 0.0, "bound": 0.0, "seconds": seconds}
+
+    # starters: the best of each position in select's order (score, then price, then index)
+    xi = _shape(best_formation)
+    picked = sorted(best_pick, key=lambda i: (pos[i], -score[i], units[i], i))
+    starters, bench = [], []
+    for p in range(len(POSITIONS)):
+        of_p = [i for i in picked if pos[i] == p]
+        starters += of_p[:xi[POSITIONS[p]]]
+        bench += of_p[xi[POSITIONS[p]]:]
+    by_score = sorted(starters, key=lambda i: (-score[i], -cand[i]["p_start"], cand[i]["player_id"]))
+    captain, vice = by_score[0], by_score[1]
+    bench.sort(key=lambda i: (pos[i] != 0, -score[i], -cand[i]["p_start"], cand[i]["player_id"]))
+
+    players = []
+    for i in starters:
+        players.append({**cand[i], "role": "XI", "bench_order": None,
+                        "is_captain": i == captain, "is_vice_captain": i == vice})
+    for k, i in enumerate(bench, start=1):
+        players.append({**cand[i], "role": "bench", "bench_order": k,
+                        "is_captain": False, "is_vice_captain": False})
+
+    xi_score = sum(score[i] for i in starters) + score[captain]
+    bench_score = sum(score[i] for i in bench)
+    bound = max(bound, best)
+    return {
+        "players": players,
+        "formation": best_formation,
+        "captain_id": int(cand[captain]["player_id"]),
+        "vice_captain_id": int(cand[vice]["player_id"]),
+        "total_price": round(sum(units[i] for i in picked) / 10.0, 1),
+        "xi_expected": sum(cand[i]["expected_points"] for i in starters) + cand[captain]["expected_points"],
+        "xi_score": xi_score,
+        "bench_score": bench_score,
+        "objective": best,
+        "optimal": optimal,
+        "gap": bound - best,
+        "bound": bound,
+        "seconds": seconds,
+    }
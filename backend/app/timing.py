@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+# --- Stage timing --------------------------------------------------------------------
+#
+# `with span("build_rolling_features") as sp: ...; sp.rows = len(df)` records wall time,
+# rows and (optionally) peak traced memory of one pipeline stage into the Recorder that
+# is active in the current context. With no active recorder a span is one ContextVar
+# lookup and a shared no-op object, so instrumented code costs nothing when disabled.
+#
+# PIPELINE_TIMING=1 records every API request (structured log line per request plus
+# the aggregate behind GET /metrics/pipeline); PIPELINE_TIMING=mem also tracks peak
+# memory with tracemalloc, which slows allocation-heavy stages noticeably.
+# Training always records wall time into metrics.json["stages"].
+
+log = logging.getLogger("app.timing")
+
+_RECORDER: contextvars.ContextVar["Recorder | None"] = contextvars.ContextVar("pipeline_recorder", default=None)
+
+
+def timing_mode() -> str:
+    """'' (off), '1' (wall time + rows) or 'mem' (also peak memory)."""
+    mode = os.getenv("PIPELINE_TIMING", "0").strip().lower()
+    return "" if mode in ("", "0", "false", "off") else ("mem" if mode == "mem" else "1")
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):  # `sp.rows = n` is a no-op when disabled
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    __slots__ = ("stage", "rows", "seconds", "peak_mb", "depth", "_peak")
+
+    def __init__(self, stage: str, rows: int | None, depth: int):
+        self.stage = stage
+        self.rows = rows
+        self.depth = depth
+        self.seconds = 0.0
+        self.peak_mb = None
+        self._peak = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = {"stage": self.stage, "seconds": round(self.seconds, 6), "depth": self.depth}
+        if self.rows is not None:
+            out["rows"] = int(self.rows)
+        if self.peak_mb is not None:
+            out["peak_mb"] = self.peak_mb
+        return out
+
+
+class Recorder:
+    """Spans of one run (a training job or an API request), in the order they finished."""
+
+    def __init__(self, name: str, memory: bool = False):
+        self.name = name
+        self.memory = memory
+        self.spans: List[Span] = []
+        self._stack: List[Span] = []
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [s.as_dict() for s in self.spans]
+
+
+@contextmanager
+def span(stage: str, rows: int | None = None):
+    rec = _RECORDER.get()
+    if rec is None:
+        yield _NULL
+        return
+
+    sp = Span(stage, rows, len(rec._stack))
+    parent = rec._stack[-1] if rec._stack else None
+    track = rec.memory and tracemalloc.is_tracing()
+    if track:
+        base, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            parent._peak = max(parent._peak, peak)
+        tracemalloc.reset_peak()
+    rec._stack.append(sp)
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    finally:
+        sp.seconds = time.perf_counter() - t0
+        rec._stack.pop()
+        if track:
+            peak = max(sp._peak, tracemalloc.get_traced_memory()[1])
+            sp.peak_mb = round(max(peak - base, 0) / 2**20, 2)
+            if parent is not None:
+                # keep the parent's peak across the reset above
+                parent._peak = max(parent._peak, peak)
+        rec.spans.append(sp)
+
+
+@contextmanager
+def record(name: str, memory: bool | None = None):
+    """Activate a Recorder for the enclosed code; yields it."""
+    if memory is None:
+        memory = timing_mode() == "mem"
+    rec = Recorder(name, memory=memory)
+    started = False
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started = True
+    token = _RECORDER.set(rec)
+    try:
+        yield rec
+    finally:
+        _RECORDER.reset(token)
+        if started:
+            tracemalloc.stop()
+
+
+# --- Serving aggregate ---------------------------------------------------------------
+
+_STATS: Dict[str, Dict[str, Dict[str, float]]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def observe(rec: Recorder, total_seconds: float, **fields) -> None:
+    """Fold a finished request into the per-endpoint aggregate and emit one JSON log line."""
+    stages = rec.summary()
+    with _STATS_LOCK:
+        per_stage = _STATS.setdefault(rec.name, {})
+        for st in [{"stage": "total", "seconds": total_seconds}, *stages]:
+            agg = per_stage.setdefault(st["stage"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            agg["count"] += 1
+            agg["total_seconds"] += st["seconds"]
+            agg["max_seconds"] = max(agg["max_seconds"], st["seconds"])
+            if "rows" in st:
+                agg["last_rows"] = st["rows"]
+            if "peak_mb" in st:
+                agg["max_peak_mb"] = max(agg.get("max_peak_mb", 0.0), st["peak_mb"])
+    log.info(json.dumps({"event": "pipeline_timing", "name": rec.name,
+                         "seconds": round(total_seconds, 6), **fields, "stages": stages}))
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        out = {}
+        for name, per_stage in _STATS.items():
+            out[name] = {
+                stage: {**agg, "mean_seconds": agg["total_seconds"] / agg["count"]}
+                for stage, agg in per_stage.items()
+            }
+        return out
@@ -0,0 +1,261 @@
+from __future__ import annotations
+import os
+import time
+from collections import Counter
+from itertools import combinations
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .lineup import POSITIONS, _scored_rows, budget_units, price_units
+from .squad import SQUAD_BENCH_WEIGHT, SQUAD_NEED
+
+# FPL rules: one free transfer per GW, unused ones bank up to MAX_FREE_TRANSFERS, each
+# transfer beyond the free ones costs TRANSFER_HIT_POINTS (and resets the bank to 1)
+MAX_FREE_TRANSFERS = int(os.getenv("MAX_FREE_TRANSFERS", "5"))
+TRANSFER_HIT_POINTS = float(os.getenv("TRANSFER_HIT_POINTS", "4"))
+
+# search limits per plan; the best plan found so far is returned when one runs out
+PLANNER_TIME_BUDGET_MS = float(os.getenv("PLANNER_TIME_BUDGET_MS", "2000"))
+PLANNER_NODE_BUDGET = int(os.getenv("PLANNER_NODE_BUDGET", "50000"))
+PLANNER_BEAM_WIDTH = int(os.getenv("PLANNER_BEAM_WIDTH", "32"))
+# (out, in) swaps combined into each GW's transfer sets, best by value over the rest of the horizon
+PLANNER_MOVES = 12
+
+# --- Transfer planning -------------------------------------------------------------
+#
+# Beam search over the horizon, one level per GW. A state is (squad, bank, free
+# transfers) with the points collected so far; the same state reached twice keeps the
+# better path (memo per level). Each GW a state tries holding, and every set of up to
+# max_transfers_per_gw swaps from its PLANNER_MOVES best (out, in) pairs, ranked by the
+# in-player's score over the remaining GWs minus the out-player's. Each pair is
+# checked for position, budget and club limit.
+# A child is ranked by points so far - hits + the points of keeping its squad to the end
+# (also the value of a complete plan: transfers up to here, then none), and each level
+# keeps the beam_width best. GW points of a squad = its best formation-valid XI with the
+# captain doubled + bench_weight * bench, score = expected_points * p_start as for
+# lineups. Squad points are memoised per (GW, squad).
+# Players are sold at their current price (FPL's half-of-the-rise selling price is not
+# tracked).
+# GWs from the first to the last of preds_by_gw without prediction rows (blank GW, no
+# fixtures yet) stay in the plan as skipped_gws: worth 0 points, no transfers, and the
+# unused free transfer carries over to the next GW.
+
+def _gw_points(s: np.ndarray, pos: np.ndarray, squad: Tuple[int, ...], bench_weight: float) -> Tuple[float, float, List[int]]:
+    """(objective, XI points with the captain doubled, XI) of a 15-man squad for one GW."""
+    by_pos: Dict[int, List[int]] = {0: [], 1: [], 2: [], 3: []}
+    for i in squad:
+        by_pos[int(pos[i])].append(i)
+    for v in by_pos.values():
+        v.sort(key=lambda i: (-s[i], i))
+    # 1 GK, at least 3 DEF, 2 MID, 1 FWD, then the best 4 other outfielders
+    xi = by_pos[0][:1] + by_pos[1][:3] + by_pos[2][:2] + by_pos[3][:1]
+    rest = sorted(by_pos[1][3:] + by_pos[2][2:] + by_pos[3][1:], key=lambda i: (-s[i], i))
+    xi += rest[:4]
+    bench = by_pos[0][1:] + rest[4:]
+    points = float(sum(s[i] for i in xi) + max(s[i] for i in xi))
+    return points + bench_weight * float(sum(s[i] for i in bench)), points, xi
+
+def plan_transfers(preds_by_gw: Dict[int, List[dict]], squad_rows: List[dict], bank: float = 0.0,
+                   free_transfers: int = 1, max_per_team: int = 3, max_transfers_per_gw: int = 2,
+                   hit_points: float | None = None, bench_weight: float | None = None,
+                   beam_width: int | None = None, time_budget_ms: float | None = None,
+                   node_budget: int | None = None) -> Dict:
+    """
+    Transfers for each GW of preds_by_gw (prediction rows per GW) starting from the 15
+    players in squad_rows. Returns {gws, skipped_gws, plan (per GW: transfers,
+    free_transfers, hits, bank, points, objective, captain_id, xi), points, hits,
+    net_points, baseline_points, gain, objective, complete, nodes, seconds}. complete is
+    False when the time or node budget cut the search short.
+    """
+    t0 = time.perf_counter()
+    hit_points = TRANSFER_HIT_POINTS if hit_points is None else float(hit_points)
+    bench_weight = SQUAD_BENCH_WEIGHT if bench_weight is None else float(bench_weight)
+    beam_width = PLANNER_BEAM_WIDTH if beam_width is None else max(1, int(beam_width))
+    deadline = t0 + (PLANNER_TIME_BUDGET_MS if time_budget_ms is None else float(time_budget_ms)) / 1000.0
+    node_budget = PLANNER_NODE_BUDGET if node_budget is None else int(node_budget)
+
+    # player pool: everyone predicted in some GW, plus the current squad
+    predicted = [gw for gw in preds_by_gw if preds_by_gw[gw]]
+    if not predicted:
+        raise ValueError("no predictions for any GW of the horizon")
+    gws = list(range(min(preds_by_gw), max(preds_by_gw) + 1))
+    skipped = [k for k, gw in enumerate(gws) if not preds_by_gw.get(gw)]
+    info: Dict[int, dict] = {int(r["player_id"]): dict(r) for r in squad_rows}
+    scored = {gw: _scored_rows(preds_by_gw.get(gw) or []) for gw in gws}
+    for gw in gws:
+        for r in scored[gw]:
+            info.setdefault(int(r["player_id"]), r)
+    ids = sorted(info)
+    index = {pid: i for i, pid in enumerate(ids)}
+    pos = np.array([POSITIONS.index(info[pid]["position"]) for pid in ids], dtype=np.int64)
+    team = np.array([int(info[pid]["team_id"]) for pid in ids], dtype=np.int64)
+    units = np.array([price_units(info[pid]["price"]) for pid in ids], dtype=np.int64)
+    S = np.zeros((len(gws), len(ids)))
+    for k, gw in enumerate(gws):
+        for r in scored[gw]:
+            S[k, index[int(r["player_id"])]] = r["score"]
+    # score over the remaining GWs, and each position's pool best first by it
+    remaining = np.cumsum(S[::-1], axis=0)[::-1]
+    order = [[np.flatnonzero(pos == p)[np.argsort(-remaining[k, pos == p], kind="stable")].tolist()
+              for p in range(len(POSITIONS))] for k in range(len(gws))]
+
+    squad0 = tuple(sorted(index[int(r["player_id"])] for r in squad_rows))
+    counts = Counter(POSITIONS[int(pos[i])] for i in squad0)
+    if len(set(squad0)) != 15 or any(counts[p] != SQUAD_NEED[p] for p in POSITIONS):
+        raise ValueError("squad must be 15 distinct players: 2 GK, 5 DEF, 5 MID, 3 FWD")
+    if max(Counter(team[i] for i in squad0).values()) > max_per_team:
+        raise ValueError(f"squad has more than {max_per_team} players from one club")
+
+    memo: Dict[Tuple[int, Tuple[int, ...]], Tuple[float, float, List[int]]] = {}
+    hold_memo: Dict[Tuple[int, Tuple[int, ...]], float] = {}
+
+    def points(k: int, squad: Tuple[int, ...]):
+        key = (k, squad)
+        if key not in memo:
+            memo[key] = _gw_points(S[k], pos, squad, bench_weight)
+        return memo[key]
+
+    def hold(k: int, squad: Tuple[int, ...]) -> float:
+        """Objective of GWs k.. without further transfers."""
+        if k >= len(gws):
+            return 0.0
+        key = (k, squad)
+        if key not in hold_memo:
+            hold_memo[key] = points(k, squad)[0] + hold(k + 1, squad)
+        return hold_memo[key]
+
+    def moves(k: int, squad: Tuple[int, ...], bank_units: int) -> List[Tuple[float, int, int]]:
+        """
+        Best (gain, out, in) swaps: per player out the best 3 ins and the best one affordable
+        on its own; at least half of the PLANNER_MOVES kept are affordable on their own.
+        """
+        in_squad = set(squad)
+        clubs = Counter(int(team[i]) for i in squad)
+        out = []
+        for o in squad:
+            found, affordable = 0, False
+            for i in order[k][int(pos[o])]:
+                if remaining[k, i] <= remaining[k, o] or (found >= 3 and affordable):
+                    break
+                if i in in_squad or (team[i] != team[o] and clubs[int(team[i])] >= max_per_team):
+                    continue
+                fits = units[i] <= bank_units + units[o]
+                if found < 3 or (fits and not affordable):
+                    out.append((float(remaining[k, i] - remaining[k, o]), o, i, fits))
+                    found += 1
+                    affordable = affordable or fits
+        out.sort(key=lambda m: (-m[0], m[1], m[2]))
+        kept = out[:PLANNER_MOVES]
+        n_fit = sum(m[3] for m in kept)
+        for m in out[PLANNER_MOVES:]:
+            if n_fit >= PLANNER_MOVES // 2:
+                break
+            if m[3]:
+                kept.append(m)
+                n_fit += 1
+        return [m[:3] for m in kept]
+
+    def transfer_sets(squad: Tuple[int, ...], bank_units: int, swaps: List[Tuple[float, int, int]]):
+        """(transfers, new squad, new bank) for holding and every legal set of up to max_transfers_per_gw swaps."""
+        yield (), squad, bank_units
+        for n in range(1, max_transfers_per_gw + 1):
+            for combo in combinations(swaps, n):
+                outs = {o for _, o, _ in combo}
+                ins = {i for _, _, i in combo}
+                if len(outs) < n or len(ins) < n:
+                    continue
+                new_bank = bank_units + sum(int(units[o]) - int(units[i]) for _, o, i in combo)
+                if new_bank < 0:
+                    continue
+                new = tuple(sorted((set(squad) - outs) | ins))
+                if max(Counter(int(team[i]) for i in new).values()) > max_per_team:
+                    continue
+                yield tuple((o, i) for _, o, i in combo), new, new_bank
+
+    # node: (parent, k, transfers, hits, bank, squad, points so far, free transfers next GW)
+    root = (None, -1, (), 0.0, budget_units(bank), squad0, 0.0, int(free_transfers))
+    best_rank, best_node = hold(0, squad0), root
+    beam = [root]
+    nodes, complete = 0, True
+    for k in range(len(gws)):
+        level: Dict[Tuple, Tuple[float, tuple]] = {}
+        for node in beam:
+            _, _, _, _, bank_u, squad, acc, ft = node
+            swaps = [] if k in skipped else moves(k, squad, bank_u)
+            for transfers, new, new_bank in transfer_sets(squad, bank_u, swaps):
+                nodes += 1
+                if nodes > node_budget or (nodes & 63 == 0 and time.perf_counter() > deadline):
+                    complete = False
+                    break
+                hits = max(0, len(transfers) - ft) * hit_points
+                acc_new = acc + points(k, new)[0] - hits
+                child = (node, k, transfers, hits, new_bank, new, acc_new, _next_free(ft, len(transfers)))
+                rank = acc_new + hold(k + 1, new)
+                key = (new, new_bank, child[7])
+                if key not in level or level[key][0] < rank:
+                    level[key] = (rank, child)
+                if rank > best_rank + 1e-9:
+                    best_rank, best_node = rank, child
+            if not complete:
+                break
+        if not complete:
+            break
+        ranked = sorted(level.values(), key=lambda rc: -rc[0])
+        beam = [child for _, child in ranked[:beam_width]]
+
+    # best plan: its transfers up to best_node, then hold
+    path = []
+    node = best_node
+    while node is not None and node[0] is not None:
+        path.append(node)
+        node = node[0]
+    path.reverse()
+    plan, ft, bank_u, squad = [], int(free_transfers), budget_units(bank), squad0
+    total_points = total_hits = objective = 0.0
+    for k, gw in enumerate(gws):
+        step = path[k] if k < len(path) else None
+        transfers = step[2] if step else ()
+        hits = step[3] if step else 0.0
+        if step:
+            bank_u, squad = step[4], step[5]
+        obj, pts, xi = points(k, squad)
+        captain = max(xi, key=lambda i: (S[k, i], -i))
+        plan.append({
+            "gw": gw,
+            "transfers": [{"out": _player(info[ids[o]]), "in": _player(info[ids[i]])} for o, i in transfers],
+            "free_transfers": ft,
+            "hits": hits,
+            "bank": bank_u / 10.0,
+            "points": pts,
+            "objective": obj,
+            "captain_id": ids[captain],
+            "xi": [ids[i] for i in xi],
+        })
+        ft = _next_free(ft, len(transfers))
+        total_points += pts
+        total_hits += hits
+        objective += obj - hits
+    baseline = sum(points(k, squad0)[1] for k in range(len(gws)))
+    return {
+        "gws": gws,
+        "skipped_gws": [gws[k] for k in skipped],
+        "plan": plan,
+        "points": total_points,
+        "hits": total_hits,
+        "net_points": total_points - total_hits,
+        "baseline_points": baseline,
+        "gain": total_points - total_hits - baseline,
+        "objective": objective,
+        "complete": complete,
+        "nodes": nodes,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def _next_free(free: int, used: int) -> int:
+    """Free transfers next GW: unused ones carry over (capped); after a hit there is 1."""
+    return min(MAX_FREE_TRANSFERS, free - used + 1) if used <= free else 1
+
+def _player(r: dict) -> dict:
+    return {"player_id": int(r["player_id"]), "name": r.get("name"), "team_id": int(r["team_id"]),
+            "position": r["position"], "price": float(r["price"])}
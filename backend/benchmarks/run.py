@@ -0,0 +1,253 @@
+"""
+Benchmark suite: times the data, feature, training, prediction, lineup and transfer-planning
+stages plus the main API endpoints against a synthetic SQLite database (benchmarks/synthetic.py).
+Runs offline, no MySQL needed. Results are one JSON document, so runs can be diffed.
+
+    python -m benchmarks.run --seasons 1 --players 700 --out bench.json
+    python -m benchmarks.run --seasons 5 --players 5000 --skip-train --baseline bench.json
+    python -m benchmarks.run --analytics duckdb   # read queries on DuckDB (pip install duckdb duckdb-engine)
+
+Every stage runs `--repeat` times (training once) and reports all timings plus min and
+median; `--baseline` adds the median ratio against an earlier report.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _timed(fn, repeat: int) -> tuple[dict, object]:
+    seconds, out = [], None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        seconds.append(time.perf_counter() - t0)
+    return {
+        "seconds": [round(s, 6) for s in seconds],
+        "min": round(min(seconds), 6),
+        "median": round(statistics.median(seconds), 6),
+    }, out
+
+
+def _widen(df):
+    """The frame with every column as int64 / float64 / object (the dtypes before the compact schema)."""
+    import numpy as np
+    import pandas as pd
+    return df.astype({c: (object if isinstance(t, pd.CategoricalDtype) else
+                          np.int64 if np.issubdtype(t, np.integer) else np.float64)
+                      for c, t in df.dtypes.items() if t != object})
+
+
+def _versions() -> dict:
+    import numpy, pandas, sklearn, sqlalchemy
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"git_commit": commit, "python": platform.python_version(), "numpy": numpy.__version__,
+            "pandas": pandas.__version__, "sklearn": sklearn.__version__, "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def run(args) -> dict:
+    work = args.work_dir or tempfile.mkdtemp(prefix="fpl-bench-")
+    os.makedirs(work, exist_ok=True)
+    db_path = os.path.join(work, "bench.sqlite")
+    model_dir = os.path.join(work, "models_store")
+    # app.db / app.main read these at import time
+    os.environ["MODEL_DIR"] = model_dir
+    os.environ["MODEL_VERSION"] = f"{args.backend}_bench"
+    analytics_path = os.path.join(work, f"analytics.{args.analytics}")
+    if args.analytics != "none":
+        os.environ["ANALYTICS_DATABASE_URL"] = f"{args.analytics}:///{analytics_path}"
+
+    from benchmarks.synthetic import generate, make_engine
+
+    results: dict = {}
+    t0 = time.perf_counter()
+    data = generate(db_path, seasons=args.seasons, players=args.players, seed=args.seed)
+    results["generate_data"] = {"seconds": [round(time.perf_counter() - t0, 6)], "rows": data["stats_rows"]}
+    if args.analytics != "none":
+        from app.db import analytics_engine
+        from app.localdb import copy_tables
+        if os.path.exists(analytics_path):
+            os.remove(analytics_path)
+        t0 = time.perf_counter()
+        copy_tables(make_engine(db_path), analytics_engine)
+        results["sync_analytics"] = {"seconds": [round(time.perf_counter() - t0, 6)], "rows": data["stats_rows"]}
+
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+    from app.lineup import optimize_lineup
+    from app.squad import optimize_squad
+    from app.transfers import plan_transfers
+    from app.ml.features import (build_rolling_features, dataset_for_training, frame_mb, load_flat_table,
+                                 load_rolling_features_sql, rolling_engine_max_diff)
+    from app.ml.predict import predict_for_gw
+    from app.ml.train import train_models
+
+    engine = make_engine(db_path)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    # GW 38 of the last season; every endpoint below reads that season only
+    target_gw = data["target_gw"]
+
+    results["load_flat_table"], df = _timed(lambda: load_flat_table(db), args.repeat)
+    results["load_flat_table"]["rows"] = len(df)
+    results["build_rolling_features"], df_feat = _timed(lambda: build_rolling_features(df), args.repeat)
+    results["build_rolling_features"]["rows"] = len(df)
+    # footprint of the compact schema vs the same frames as int64/float64/object
+    X = dataset_for_training(df_feat)[0]
+    memory_mb = {
+        "flat_table": frame_mb(df), "flat_table_wide": frame_mb(_widen(df)),
+        "features": frame_mb(df_feat), "features_wide": frame_mb(_widen(df_feat)),
+        "X": frame_mb(X), "X_wide": frame_mb(X.astype(float)),
+    }
+    # the same features computed by the database (FEATURE_ENGINE=sql), plus its parity with pandas
+    results["rolling_features_sql"], _ = _timed(lambda: load_rolling_features_sql(db), args.repeat)
+    results["rolling_features_sql"]["rows"] = len(df)
+    results["rolling_features_sql"]["max_rel_diff"] = rolling_engine_max_diff(db)
+
+    if args.skip_train and not os.path.exists(os.path.join(model_dir, "metrics.json")):
+        raise SystemExit("--skip-train needs a trained model in --work-dir (run once without it)")
+    if not args.skip_train:
+        results["train_models"], (_, _, metrics) = _timed(
+            lambda: train_models(db, model_dir=model_dir, backend=args.backend, use_snapshot=False,
+                                 use_fold_cache=False, fold_workers=args.fold_workers),
+            1,
+        )
+        results["train_models"]["stages"] = metrics.get("stages")
+
+    # first call loads the models and builds the rolling state; later ones hit both caches
+    results["predict_for_gw_cold"], (rows, _ver) = _timed(lambda: predict_for_gw(db, target_gw, model_dir=model_dir), 1)
+    results["predict_for_gw"], _ = _timed(lambda: predict_for_gw(db, target_gw, model_dir=model_dir), args.repeat)
+    results["predict_for_gw"]["rows"] = len(rows)
+
+    players = {int(p["id"]): p for p in db.execute(
+        text("SELECT id, team_id, position, CAST(price AS REAL) AS price, status FROM players")
+    ).mappings().all()}
+    pred_rows = [{**r, **players[r["player_id"]]} for r in rows]
+    # exact XI search: a roomy budget, and a tight one where the budget binds across positions
+    for budget in (100.0, 83.0):
+        name = f"optimize_lineup budget={budget:g}"
+        results[name], res = _timed(lambda: optimize_lineup(pred_rows, budget=budget), args.repeat)
+        results[name].update({k: res[k] for k in ("optimal", "gap", "nodes", "candidates")}, rows=len(pred_rows))
+    results["optimize_squad"], res = _timed(lambda: optimize_squad(pred_rows), args.repeat)
+    results["optimize_squad"].update({k: res[k] for k in ("optimal", "gap", "formation")}, rows=len(pred_rows))
+    # transfer plans over the last K GWs, from the best squad for the first of them
+    horizon_gws = list(range(max(1, target_gw - 5), target_gw + 1))
+    preds = {gw: [{**r, **players[r["player_id"]]} for r in predict_for_gw(db, gw, model_dir=model_dir)[0]]
+             for gw in horizon_gws}
+    squad = optimize_squad(preds[horizon_gws[0]], time_budget_ms=5000)["players"]
+    squad_ids = [p["player_id"] for p in squad]
+    for k in (1, 3, 6):
+        plan_preds = {gw: preds[gw] for gw in horizon_gws[:k]}
+        name = f"plan_transfers K={len(plan_preds)}"
+        results[name], res = _timed(lambda: plan_transfers(plan_preds, squad, bank=0.5), args.repeat)
+        results[name].update({key: res[key] for key in ("complete", "nodes", "gain")}, rows=len(pred_rows))
+    db.close()
+
+    # API endpoints through the ASGI app, with the synthetic database behind get_db
+    from fastapi.testclient import TestClient
+    from app.db import get_db
+    from app.main import app
+
+    def _get_db():
+        s = Session()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    client = TestClient(app)
+
+    def _call(method: str, path: str, **kw):
+        r = client.request(method, path, **kw)
+        if r.status_code != 200:
+            raise RuntimeError(f"{method} {path} -> {r.status_code}: {r.text[:200]}")
+        return r
+
+    endpoints = [
+        ("POST", f"/predict/gw/{target_gw}", {}),
+        ("GET", f"/predictions/gw/{target_gw}", {}),
+        ("POST", f"/lineup/gw/{target_gw}", {"json": {"formation": "4-4-2", "budget": 100.0, "max_per_team": 3}}),
+        ("POST", f"/squad/gw/{target_gw}", {"json": {"budget": 100.0, "max_per_team": 3}}),
+        ("POST", "/transfers/plan", {"json": {"squad": squad_ids, "bank": 0.5, "start_gw": horizon_gws[0],
+                                              "horizon": len(horizon_gws)}}),
+        ("GET", "/players", {}),
+        ("GET", "/leaders", {}),
+    ]
+    for method, path, kw in endpoints:
+        results[f"api {method} {path}"], _ = _timed(lambda: _call(method, path, **kw), args.repeat)
+    app.dependency_overrides.clear()
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "data": data,
+            "backend": args.backend,
+            "analytics": args.analytics,
+            "repeat": args.repeat,
+            "work_dir": work,
+            **_versions(),
+        },
+        "results": results,
+        "memory_mb": memory_mb,
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Median ratio (this run / baseline) per benchmark present in both."""
+    out = {}
+    for name, res in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        cur = res.get("median", min(res["seconds"]))
+        old = base.get("median", min(base["seconds"]))
+        out[name] = round(cur / old, 3) if old else None
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seasons", type=int, default=1)
+    ap.add_argument("--players", type=int, default=700)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=5, help="runs per stage (training runs once)")
+    ap.add_argument("--backend", default="hgb", help="model backend for train_models (rf is much slower)")
+    ap.add_argument("--fold-workers", type=int, default=1)
+    ap.add_argument("--analytics", choices=["none", "sqlite", "duckdb"], default="none",
+                    help="copy the data into an embedded analytics engine and route the read queries to it")
+    ap.add_argument("--skip-train", action="store_true", help="reuse the model already in --work-dir")
+    ap.add_argument("--work-dir", default=None, help="database + models (default: a fresh temp dir)")
+    ap.add_argument("--baseline", default=None, help="earlier JSON report to compare medians against")
+    ap.add_argument("--out", default=None, help="also write the JSON report here")
+    args = ap.parse_args()
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Synthetic FPL-scale data for the benchmarks: teams, players, matches, gameweeks and
+player_gameweek_stats written into a local SQLite file with the app's schema
+(app/localdb.py), so the real queries and feature code run against it without MySQL.
+
+Everything is drawn from one seeded generator, so the same (seasons, players, seed)
+always produces the same database. Seasons run GW 1..38 each from FIRST_SEASON on, with
+the same player / team ids throughout (as after the importer's id rollover); the last
+season's final GW is left unplayed: it is the one to predict.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.db import make_engine as app_make_engine
+from app.localdb import create_schema
+from app.models import Base
+
+N_TEAMS = 20
+GWS_PER_SEASON = 38
+FIRST_SEASON = 2020
+# share of a squad per position (2 GK, 8 DEF, 8 MID, 5 FWD out of 23)
+POSITIONS = np.array(["GK", "DEF", "MID", "FWD"])
+POSITION_P = np.array([2, 8, 8, 5]) / 23
+STATUSES = np.array(["fit", "injured", "doubt", "suspended"])
+STATUS_P = np.array([0.88, 0.05, 0.05, 0.02])
+
+# per-90 goal / assist rates by position
+GOAL_RATE = {"GK": 0.0, "DEF": 0.04, "MID": 0.15, "FWD": 0.38}
+ASSIST_RATE = {"GK": 0.01, "DEF": 0.06, "MID": 0.14, "FWD": 0.12}
+GOAL_POINTS = {"GK": 6, "DEF": 6, "MID": 5, "FWD": 4}
+CS_POINTS = {"GK": 4, "DEF": 4, "MID": 1, "FWD": 0}
+
+
+def sqlite_url(path: str) -> str:
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def make_engine(path: str):
+    return app_make_engine(sqlite_url(path))
+
+
+def _season_gw(g):
+    """Running GW number (1-based, across seasons) -> (season, gw)."""
+    return FIRST_SEASON + (g - 1) // GWS_PER_SEASON, (g - 1) % GWS_PER_SEASON + 1
+
+
+def _fixtures(rng: np.random.Generator, n_gws: int) -> np.ndarray:
+    """(n_gws * N_TEAMS/2, 3) gw, home, away: every team plays once per GW."""
+    out = []
+    for gw in range(1, n_gws + 1):
+        teams = rng.permutation(N_TEAMS) + 1
+        for home, away in teams.reshape(-1, 2):
+            out.append((gw, home, away))
+    return np.asarray(out, dtype=np.int64)
+
+
+def generate(path: str, seasons: int = 1, players: int = 700, seed: int = 42) -> dict:
+    """(Re)create the SQLite database at `path`; returns a summary of what was written."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    # running GW numbers 1..n_gws are played, n_gws + 1 (last season's GW 38) is not
+    n_gws = GWS_PER_SEASON * seasons - 1
+    season, target_gw = _season_gw(n_gws + 1)
+    engine = make_engine(path)
+    create_schema(engine)
+
+    # teams
+    strength_att = rng.integers(1000, 1400, N_TEAMS)
+    strength_def = rng.integers(1000, 1400, N_TEAMS)
+    teams = [
+        {"id": i + 1, "name": f"Team {i + 1:02d}", "short_name": f"T{i + 1:02d}",
+         "strength_attack": int(strength_att[i]), "strength_defense": int(strength_def[i]),
+         "code": i + 1, "season": season}
+        for i in range(N_TEAMS)
+    ]
+
+    # players: a squad per team, position mix as in real squads
+    team_of = np.arange(players) % N_TEAMS + 1
+    position = rng.choice(POSITIONS, size=players, p=POSITION_P)
+    quality = rng.beta(2, 5, players)                       # drives price, starts and returns
+    price = np.round(4.0 + quality * 9.0, 1)
+    status = rng.choice(STATUSES, size=players, p=STATUS_P)
+    chance = np.where(status == "fit", 100, rng.choice([0, 25, 50, 75], size=players))
+    player_rows = [
+        {"id": i + 1, "name": f"Player {i + 1:05d}", "team_id": int(team_of[i]), "position": str(position[i]),
+         "price": float(price[i]), "status": str(status[i]), "chance_playing_next": int(chance[i]),
+         "photo": None, "code": i + 1, "season": season}
+        for i in range(players)
+    ]
+
+    # fixtures and gameweeks
+    fx = _fixtures(rng, n_gws + 1)
+    diff = rng.integers(2, 6, size=(len(fx), 2))
+
+    def kickoff(g):
+        s, gw = _season_gw(g)
+        return datetime(s, 8, 1) + timedelta(days=7 * (gw - 1))
+
+    matches = [
+        {"season": _season_gw(int(g))[0], "id": i + 1, "gw": _season_gw(int(g))[1],
+         "home_team_id": int(h), "away_team_id": int(a),
+         "home_difficulty": int(diff[i, 0]), "away_difficulty": int(diff[i, 1]),
+         "kickoff_time": kickoff(int(g)), "finished": bool(g <= n_gws)}
+        for i, (g, h, a) in enumerate(fx)
+    ]
+    gameweeks = [
+        {"season": _season_gw(g)[0], "gw": _season_gw(g)[1], "name": f"Gameweek {_season_gw(g)[1]}",
+         "deadline_time": kickoff(g), "finished": g <= n_gws, "is_current": g == n_gws, "is_next": g == n_gws + 1}
+        for g in range(1, n_gws + 2)
+    ]
+
+    # one stats row per player per played GW, vectorised over the whole season(s)
+    played = fx[fx[:, 0] <= n_gws]
+    opp = np.zeros((n_gws + 1, N_TEAMS + 1), dtype=np.int64)
+    home = np.zeros((n_gws + 1, N_TEAMS + 1), dtype=bool)
+    team_diff = np.zeros((n_gws + 1, N_TEAMS + 1), dtype=np.int64)
+    for (g, h, a), (dh, da) in zip(played, diff[: len(played)]):
+        opp[g, h], opp[g, a] = a, h
+        home[g, h] = True
+        team_diff[g, h], team_diff[g, a] = dh, da
+
+    gw_col = np.repeat(np.arange(1, n_gws + 1), players)
+    pidx = np.tile(np.arange(players), n_gws)
+    team_col = team_of[pidx]
+    pos_col = position[pidx]
+    q = quality[pidx]
+    n = len(gw_col)
+
+    started = rng.random(n) < (0.25 + 0.7 * q) * (status[pidx] != "injured")
+    minutes = np.where(started, rng.integers(45, 91, n), np.where(rng.random(n) < 0.3, rng.integers(1, 30, n), 0))
+    share = minutes / 90.0
+    g_rate = np.vectorize(GOAL_RATE.get)(pos_col) * (0.5 + q) * share
+    a_rate = np.vectorize(ASSIST_RATE.get)(pos_col) * (0.5 + q) * share
+    goals = rng.poisson(g_rate)
+    assists = rng.poisson(a_rate)
+    clean_sheet = ((rng.random(n) < 0.3) & (minutes >= 60)).astype(int)
+    goals_conceded = np.where(clean_sheet == 1, 0, rng.poisson(1.3 * share))
+    saves = np.where(pos_col == "GK", rng.poisson(3.0 * share), 0)
+    yellow = (rng.random(n) < 0.08 * share).astype(int)
+    red = (rng.random(n) < 0.004 * share).astype(int)
+    xg = np.round(g_rate * rng.uniform(0.6, 1.4, n), 2)
+    xa = np.round(a_rate * rng.uniform(0.6, 1.4, n), 2)
+    influence = np.round(share * rng.uniform(0, 40, n) + goals * 20, 1)
+    creativity = np.round(share * rng.uniform(0, 40, n) + assists * 20, 1)
+    threat = np.round(share * rng.uniform(0, 40, n) + xg * 50, 1)
+    bps = (share * rng.integers(0, 25, n) + goals * 24 + assists * 9 + clean_sheet * 12).astype(int)
+    bonus = np.where(bps > 35, np.minimum((bps - 30) // 10, 3), 0)
+
+    points = (np.where(minutes >= 60, 2, np.where(minutes > 0, 1, 0))
+              + goals * np.vectorize(GOAL_POINTS.get)(pos_col) + assists * 3
+              + clean_sheet * np.vectorize(CS_POINTS.get)(pos_col) + saves // 3
+              - yellow - 3 * red + bonus)
+
+    season_col, gw_in_season = _season_gw(gw_col)
+    stats = {
+        "season": season_col, "gw": gw_in_season, "player_id": pidx + 1, "team_id": team_col,
+        "opponent_team_id": opp[gw_col, team_col], "was_home": home[gw_col, team_col],
+        "difficulty": team_diff[gw_col, team_col], "started": started, "minutes": minutes,
+        "total_points": points, "goals": goals, "assists": assists, "clean_sheet": clean_sheet,
+        "goals_conceded": goals_conceded, "saves": saves, "penalties_saved": np.zeros(n, dtype=int),
+        "penalties_missed": np.zeros(n, dtype=int), "own_goals": np.zeros(n, dtype=int),
+        "yellow": yellow, "red": red, "bonus": bonus, "bps": bps, "influence": influence,
+        "creativity": creativity, "threat": threat, "ict_index": np.round((influence + creativity + threat) / 10, 1),
+        "xg": xg, "xa": xa,
+    }
+    cols = list(stats)
+    stat_rows = list(zip(*(stats[c].tolist() for c in cols)))
+
+    with engine.begin() as conn:
+        conn.execute(Base.metadata.tables["teams"].insert(), teams)
+        conn.execute(Base.metadata.tables["players"].insert(), player_rows)
+        conn.execute(Base.metadata.tables["matches"].insert(), matches)
+        conn.execute(Base.metadata.tables["gameweeks"].insert(), gameweeks)
+        conn.exec_driver_sql(
+            f"INSERT INTO player_gameweek_stats ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            stat_rows,
+        )
+        conn.execute(Base.metadata.tables["history_version"].insert(), [{"id": 1, "version": 1}])
+    engine.dispose()
+
+    return {"seasons": seasons, "players": players, "teams": N_TEAMS, "gameweeks": n_gws,
+            "season": season, "target_gw": target_gw, "stats_rows": n, "matches": len(matches), "seed": seed}
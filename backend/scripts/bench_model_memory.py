@@ -0,0 +1,139 @@
+"""
+Worker memory / cold-start benchmark for the model artifacts.
+
+Starts N fresh processes (like N uvicorn workers), each loading the models from
+MODEL_DIR and scoring one batch, once with the joblib pickles and once with the
+memory-mapped packed forests. While all workers are alive, each reports its RSS,
+PSS (shared pages split between the processes mapping them) and private memory
+from /proc, so the saving from sharing one page-cache copy shows up in PSS.
+
+    python scripts/bench_model_memory.py --model-dir models_store --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _proc_kb(path: str, keys: tuple) -> dict:
+    out = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in keys:
+                    out[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return out
+
+
+def memory_mb() -> dict:
+    status = _proc_kb("/proc/self/status", ("VmRSS",))
+    smaps = _proc_kb("/proc/self/smaps_rollup", ("Pss", "Private_Clean", "Private_Dirty"))
+    mb = lambda kb: round(kb / 1024, 1) if kb is not None else None
+    private = None
+    if "Private_Clean" in smaps:
+        private = smaps["Private_Clean"] + smaps["Private_Dirty"]
+    return {"rss_mb": mb(status.get("VmRSS")), "pss_mb": mb(smaps.get("Pss")), "private_mb": mb(private)}
+
+
+def _worker(model_dir: str, packed: bool, n_rows: int, barrier, queue) -> None:
+    os.environ["MODEL_PACKED"] = "1" if packed else "0"
+    t0 = time.perf_counter()
+    import numpy as np
+    import pandas as pd
+    from app.ml.backends import predict_points, predict_start
+    from app.ml.predict import get_models
+    base = memory_mb()
+    t1 = time.perf_counter()
+    bundle = get_models(model_dir)
+    t2 = time.perf_counter()
+
+    rng = np.random.default_rng(0)
+    cols = bundle["metrics"].get("feature_cols") or []
+    X = pd.DataFrame(rng.normal(size=(n_rows, len(cols))), columns=cols)
+    predict_start(bundle["clf"], X)
+    predict_points(bundle["reg"], X)
+    t3 = time.perf_counter()
+
+    barrier.wait()  # every worker has its models resident
+    mem = memory_mb()
+    queue.put({
+        "pid": os.getpid(),
+        "import_s": round(t1 - t0, 3),
+        "load_s": round(t2 - t1, 3),
+        "first_predict_s": round(t3 - t2, 3),
+        "cold_start_s": round(t3 - t0, 3),
+        "baseline": base,
+        **mem,
+    })
+    barrier.wait()  # keep the mappings alive until everyone has measured
+
+
+def run(model_dir: str, packed: bool, workers: int, n_rows: int) -> dict:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(model_dir, packed, n_rows, barrier, queue)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    def total(key):
+        vals = [r[key] for r in rows if r.get(key) is not None]
+        return round(sum(vals), 1) if vals else None
+
+    return {
+        "mode": "packed" if packed else "joblib",
+        "workers": workers,
+        "total_rss_mb": total("rss_mb"),
+        "total_pss_mb": total("pss_mb"),
+        "total_private_mb": total("private_mb"),
+        "max_cold_start_s": max(r["cold_start_s"] for r in rows),
+        "max_load_s": max(r["load_s"] for r in rows),
+        "per_worker": rows,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "models_store"))
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--rows", type=int, default=700, help="rows scored per worker (about one GW)")
+    ap.add_argument("--out", default=None, help="also write the JSON report here")
+    args = ap.parse_args()
+
+    from app.ml.train import resolve_model_dir
+    model_dir = resolve_model_dir(args.model_dir)
+    with open(os.path.join(model_dir, "metrics.json"), "r", encoding="utf-8") as f:
+        metrics = json.load(f)
+    has_packed = bool(metrics.get("packed"))
+
+    report = {"model_dir": model_dir, "results": []}
+    if "start_clf.joblib" in (metrics.get("artifacts") or {"start_clf.joblib": None}):
+        report["results"].append(run(model_dir, False, args.workers, args.rows))
+    else:
+        report["note"] = "packed-only model dir (trained with MODEL_SAVE_JOBLIB=0): no joblib run"
+    if has_packed:
+        report["results"].append(run(model_dir, True, args.workers, args.rows))
+    else:
+        report["note"] = "no packed forests in this model dir (re-run `python -m app.cli train`)"
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
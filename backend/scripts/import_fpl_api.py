@@ -51,6 +51,87 @@ def truncate_all(cur):
         cur.execute(f"TRUNCATE TABLE {t};")
     cur.execute("SET FOREIGN_KEY_CHECKS=1;")
 
+# --- Seasons ---------------------------------------------------------------------------
+#
+# Every run imports one season (the starting year, 2025 = 2025/26) and only replaces that
+# season's rows, so earlier seasons stay in the database for training.
+# FPL renumbers teams and players every season; `code` is the id that stays. On the first
+# import of a new season the stored ids are moved to the new season's ids (matched by
+# code) in every table that references them, so a player's history carries over. Players
+# and teams that are gone (transfers out, relegation) are archived under
+# ARCHIVE_ID_BASE + code, out of the range FPL uses, with their last season kept.
+# The ids are part of app.ml.features.history_fingerprint, so the cached rolling state
+# and flat-table snapshot under MODEL_DIR are rebuilt after a remap. Every transaction
+# that writes stats or ids also bumps history_version, which tells those caches to
+# check the history again (sql/add_history_version.sql).
+
+ARCHIVE_ID_BASE = 10_000_000
+# ids are moved in two steps through ID_SHIFT so old and new ids never collide mid-update
+ID_SHIFT = 100_000_000
+
+# (table, column) referencing teams.id / players.id
+TEAM_ID_COLUMNS = [("teams", "id"), ("players", "team_id"), ("player_gameweek_stats", "team_id"),
+                   ("player_gameweek_stats", "opponent_team_id"), ("matches", "home_team_id"),
+                   ("matches", "away_team_id")]
+PLAYER_ID_COLUMNS = [("players", "id"), ("player_gameweek_stats", "player_id"), ("predictions", "player_id")]
+
+def season_of(bootstrap) -> int:
+    """Starting year of the bootstrap's season (from the first GW deadline)."""
+    for ev in bootstrap["events"]:
+        if ev.get("deadline_time"):
+            return int(ev["deadline_time"][:4])
+    raise SystemExit("Cannot tell the season from bootstrap-static; pass --season")
+
+def bump_history_version(cur):
+    cur.execute("INSERT INTO history_version (id, version) VALUES (1, 1) "
+                "ON DUPLICATE KEY UPDATE version = version + 1")
+
+def clear_season(cur, season: int):
+    print(f"Clearing season {season} (predictions, player_gameweek_stats, matches, gameweeks)...")
+    for t in ["predictions","player_gameweek_stats","matches","gameweeks"]:
+        cur.execute(f"DELETE FROM {t} WHERE season=%s", (season,))
+
+def _id_map(cur, table: str, new_by_code: dict, season: int) -> dict:
+    """{old id: new id} for the rows of `table` last imported before `season`."""
+    cur.execute(f"SELECT id, code FROM {table} WHERE season < %s", (season,))
+    out = {}
+    for r in cur.fetchall():
+        old, code = int(r["id"]), r["code"]
+        if code is None:
+            if old >= ARCHIVE_ID_BASE:
+                continue
+            # imported before codes were stored: cannot be matched, keep it out of FPL's range
+            new = ARCHIVE_ID_BASE * 2 + old
+        else:
+            new = new_by_code.get(int(code), ARCHIVE_ID_BASE + int(code))
+        if new != old:
+            out[old] = new
+    return out
+
+def _apply_id_map(cur, mapping: dict, columns):
+    cur.execute("DROP TEMPORARY TABLE IF EXISTS id_map")
+    cur.execute("CREATE TEMPORARY TABLE id_map (old_id INT PRIMARY KEY, new_id INT NOT NULL)")
+    cur.executemany("INSERT INTO id_map (old_id, new_id) VALUES (%s,%s)", list(mapping.items()))
+    for table, col in columns:
+        cur.execute(f"UPDATE {table} t JOIN id_map m ON t.{col} = m.old_id SET t.{col} = m.new_id + %s", (ID_SHIFT,))
+    for table, col in columns:
+        cur.execute(f"UPDATE {table} SET {col} = {col} - %s WHERE {col} >= %s", (ID_SHIFT, ID_SHIFT))
+    cur.execute("DROP TEMPORARY TABLE id_map")
+
+def roll_over_ids(cur, bootstrap, season: int):
+    """Move stored team / player ids to `season`'s ids (no-op when they already are)."""
+    teams = _id_map(cur, "teams", {int(t["code"]): int(t["id"]) for t in bootstrap["teams"]}, season)
+    players = _id_map(cur, "players", {int(e["code"]): int(e["id"]) for e in bootstrap["elements"]}, season)
+    if not teams and not players:
+        return
+    print(f"Season {season}: remapping {len(teams)} team ids and {len(players)} player ids by code...")
+    cur.execute("SET FOREIGN_KEY_CHECKS=0;")
+    if teams:
+        _apply_id_map(cur, teams, TEAM_ID_COLUMNS)
+    if players:
+        _apply_id_map(cur, players, PLAYER_ID_COLUMNS)
+    cur.execute("SET FOREIGN_KEY_CHECKS=1;")
+
 def map_position(element_type: int) -> str:
     # FPL element_type: 1 GK, 2 DEF, 3 MID, 4 FWD
     return {1:"GK",2:"DEF",3:"MID",4:"FWD"}.get(int(element_type), "MID")
@@ -74,19 +155,22 @@ def map_status(status: str, chance_next, chance_this) -> str:
         pass
     return "unknown"
 
-def import_teams(cur, bootstrap):
+def import_teams(cur, bootstrap, season: int):
     print("Importing teams...")
     teams = bootstrap["teams"]
     sql = """INSERT INTO teams
-             (id, name, short_name, strength_attack, strength_defense, strength_overall_home, strength_overall_away)
-             VALUES (%s,%s,%s,%s,%s,%s,%s)
+             (id, name, short_name, strength_attack, strength_defense, strength_overall_home, strength_overall_away,
+              code, season)
+             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
              ON DUPLICATE KEY UPDATE
                name=VALUES(name),
                short_name=VALUES(short_name),
                strength_attack=VALUES(strength_attack),
                strength_defense=VALUES(strength_defense),
                strength_overall_home=VALUES(strength_overall_home),
-               strength_overall_away=VALUES(strength_overall_away)
+               strength_overall_away=VALUES(strength_overall_away),
+               code=VALUES(code),
+               season=VALUES(season)
           """
     n=0
     for t in teams:
@@ -100,17 +184,18 @@ def import_teams(cur, bootstrap):
             sa, sd,
             t.get("strength_overall_home"),
             t.get("strength_overall_away"),
+            t.get("code"), season,
         ))
         n+=1
     print(f"Inserted/updated {n} teams.")
 
-def import_players(cur, bootstrap):
+def import_players(cur, bootstrap, season: int):
     print("Importing players...")
     elements = bootstrap["elements"]
     sql = """INSERT INTO players
              (id, name, team_id, position, price, status, chance_playing_next, chance_playing_this,
-              selected_by_percent, form, points_per_game, total_points, now_cost, photo)
-             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+              selected_by_percent, form, points_per_game, total_points, now_cost, photo, code, season)
+             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
              ON DUPLICATE KEY UPDATE
                name=VALUES(name),
                team_id=VALUES(team_id),
@@ -124,7 +209,9 @@ def import_players(cur, bootstrap):
                points_per_game=VALUES(points_per_game),
                total_points=VALUES(total_points),
                now_cost=VALUES(now_cost),
-               photo=VALUES(photo)
+               photo=VALUES(photo),
+               code=VALUES(code),
+               season=VALUES(season)
           """
     n=0
     for e in elements:
@@ -153,15 +240,16 @@ def import_players(cur, bootstrap):
             int(e.get("total_points", 0)),
             now_cost,
             e.get("photo"),
+            e.get("code"), season,
         ))
         n+=1
     print(f"Inserted/updated {n} players.")
 
-def import_gameweeks(cur, bootstrap):
+def import_gameweeks(cur, bootstrap, season: int):
     print("Importing gameweeks...")
     events = bootstrap["events"]
-    sql = """INSERT INTO gameweeks (gw, name, deadline_time, finished, is_current, is_next)
-             VALUES (%s,%s,%s,%s,%s,%s)
+    sql = """INSERT INTO gameweeks (season, gw, name, deadline_time, finished, is_current, is_next)
+             VALUES (%s,%s,%s,%s,%s,%s,%s)
              ON DUPLICATE KEY UPDATE
                name=VALUES(name),
                deadline_time=VALUES(deadline_time),
@@ -181,7 +269,7 @@ def import_gameweeks(cur, bootstrap):
             except Exception:
                 dt = None
         cur.execute(sql, (
-            gw,
+            season, gw,
             ev.get("name"),
             dt,
             1 if ev.get("finished") else 0,
@@ -194,12 +282,12 @@ def import_gameweeks(cur, bootstrap):
     finished = [int(ev["id"]) for ev in events if ev.get("finished")]
     return finished
 
-def import_fixtures(cur):
+def import_fixtures(cur, season: int):
     print("Importing fixtures (matches)...")
     fixtures = http_get(FPL_FIXTURES)
     sql = """INSERT INTO matches
-             (id, gw, kickoff_time, home_team_id, away_team_id, home_difficulty, away_difficulty, finished)
-             VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+             (season, id, gw, kickoff_time, home_team_id, away_team_id, home_difficulty, away_difficulty, finished)
+             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
              ON DUPLICATE KEY UPDATE
                gw=VALUES(gw),
                kickoff_time=VALUES(kickoff_time),
@@ -222,17 +310,17 @@ def import_fixtures(cur):
             except Exception:
                 kt = None
         cur.execute(sql, (
-            fid, gw, kt, int(f["team_h"]), int(f["team_a"]),
+            season, fid, gw, kt, int(f["team_h"]), int(f["team_a"]),
             f.get("team_h_difficulty"), f.get("team_a_difficulty"),
             1 if f.get("finished") else 0
         ))
         n+=1
     print(f"Inserted/updated {n} fixtures.")
 
-def build_fixture_lookup(cur, gw: int):
+def build_fixture_lookup(cur, season: int, gw: int):
     """Return dict team_id -> (opp_id, was_home, difficulty)."""
     cur.execute("""SELECT home_team_id, away_team_id, home_difficulty, away_difficulty
-                   FROM matches WHERE gw=%s""", (gw,))
+                   FROM matches WHERE season=%s AND gw=%s""", (season, gw))
     lookup = {}
     for r in cur.fetchall():
         h = int(r["home_team_id"]); a = int(r["away_team_id"])
@@ -240,18 +328,18 @@ def build_fixture_lookup(cur, gw: int):
         lookup[a] = (h, 0, r.get("away_difficulty"))
     return lookup
 
-def import_gw_stats(cur, finished_gws, max_gw=None):
+def import_gw_stats(cur, season: int, finished_gws, max_gw=None):
     if max_gw is not None:
         finished_gws = [g for g in finished_gws if g <= max_gw]
     finished_gws = sorted(finished_gws)
     print("Importing GW stats...")
     sql = """INSERT INTO player_gameweek_stats
-             (gw, player_id, team_id, opponent_team_id, was_home, difficulty,
+             (season, gw, player_id, team_id, opponent_team_id, was_home, difficulty,
               started, minutes, total_points, goals, assists, clean_sheet, goals_conceded, saves,
              penalties_saved, penalties_missed, own_goals,
               yellow, red,
               bonus, bps, influence, creativity, threat, ict_index, xg, xa)
-             VALUES (%s,%s,%s,%s,%s,%s,
+             VALUES (%s,%s,%s,%s,%s,%s,%s,
                      %s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,
                      %s,%s,%s,%s,%s,%s,%s,%s,%s)
              ON DUPLICATE KEY UPDATE
@@ -282,14 +370,14 @@ def import_gw_stats(cur, finished_gws, max_gw=None):
               xa=VALUES(xa)
           """
     # we need players team_id for lookup
-    cur.execute("SELECT id, team_id FROM players")
+    cur.execute("SELECT id, team_id FROM players WHERE season=%s", (season,))
     player_team = {int(r["id"]): int(r["team_id"]) for r in cur.fetchall()}
 
     for gw in finished_gws:
         print(f"  GW {gw}...")
         live = http_get(FPL_EVENT_LIVE.format(gw=gw))
         elements = live.get("elements", [])
-        fixture_lookup = build_fixture_lookup(cur, gw)
+        fixture_lookup = build_fixture_lookup(cur, season, gw)
 
         batch = 0
         for el in elements:
@@ -334,7 +422,7 @@ def import_gw_stats(cur, finished_gws, max_gw=None):
             }
 
             cur.execute(sql, (
-                int(gw), pid, team_id, opp_id, was_home, diff,
+                season, int(gw), pid, team_id, opp_id, was_home, diff,
                 started, minutes,
                 int(stats.get("total_points", 0) or 0),
                 stat_map["goals"],
@@ -362,24 +450,34 @@ def import_gw_stats(cur, finished_gws, max_gw=None):
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--max-gw", type=int, default=None, help="Only import finished gameweeks up to this GW")
-    ap.add_argument("--no-truncate", action="store_true", help="Do not truncate tables before import")
+    ap.add_argument("--season", type=int, default=None,
+                    help="Season (starting year) the FPL API is serving (default: year of the GW1 deadline)")
+    ap.add_argument("--no-truncate", action="store_true", help="Do not clear the season's rows before import")
+    ap.add_argument("--truncate-all", action="store_true", help="Truncate every table, all seasons, before import")
     args = ap.parse_args()
 
     bootstrap = http_get(FPL_BOOTSTRAP)
+    season = args.season if args.season is not None else season_of(bootstrap)
+    print(f"Season {season}/{(season + 1) % 100:02d}")
     conn = connect()
     try:
         with conn.cursor() as cur:
-            if not args.no_truncate:
+            if args.truncate_all:
                 truncate_all(cur)
+            elif not args.no_truncate:
+                clear_season(cur, season)
+            roll_over_ids(cur, bootstrap, season)
 
-            import_teams(cur, bootstrap)
-            import_players(cur, bootstrap)
-            finished_gws = import_gameweeks(cur, bootstrap)
-            import_fixtures(cur)
+            import_teams(cur, bootstrap, season)
+            import_players(cur, bootstrap, season)
+            finished_gws = import_gameweeks(cur, bootstrap, season)
+            import_fixtures(cur, season)
 
+            bump_history_version(cur)
             conn.commit()
 
-            import_gw_stats(cur, finished_gws, max_gw=args.max_gw)
+            import_gw_stats(cur, season, finished_gws, max_gw=args.max_gw)
+            bump_history_version(cur)
             conn.commit()
 
         print("DONE.")
@@ -0,0 +1,11 @@
+-- Version of the stats history, bumped by scripts/import_fpl_api.py in every transaction
+-- that writes player_gameweek_stats or renumbers ids. The rolling-feature state and the
+-- flat-table snapshot read this one row per call instead of checksumming the history.
+-- For databases created from epl_predictor.sql before this table existed.
+CREATE TABLE `history_version` (
+  `id` int(11) NOT NULL,
+  `version` bigint(20) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+INSERT INTO `history_version` (`id`, `version`) VALUES (1, 0);
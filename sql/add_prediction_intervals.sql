@@ -0,0 +1,6 @@
+-- Per-tree P10 / P50 / P90 of expected points, stored next to each prediction.
+-- For databases created from epl_predictor.sql before these columns existed.
+ALTER TABLE `predictions`
+  ADD COLUMN `points_p10` decimal(6,3) DEFAULT NULL AFTER `expected_points`,
+  ADD COLUMN `points_p50` decimal(6,3) DEFAULT NULL AFTER `points_p10`,
+  ADD COLUMN `points_p90` decimal(6,3) DEFAULT NULL AFTER `points_p50`;
@@ -0,0 +1,6 @@
+-- One prediction per (gw, player, model_version), so shadow model versions
+-- (SHADOW_MODELS) are stored next to the primary one instead of overwriting it.
+-- For databases created from epl_predictor.sql before this key changed.
+ALTER TABLE `predictions`
+  DROP INDEX `uq_pred_gw_player`,
+  ADD UNIQUE KEY `uq_pred_gw_player_version` (`gw`,`player_id`,`model_version`);
@@ -0,0 +1,46 @@
+-- Season dimension (season = starting year, 2025 = 2025/26) so earlier seasons can stay
+-- in the database for training. GW-keyed tables get a `season` column that leads their
+-- keys: a one-season read is a range scan on the key prefix. The tables are indexed, not
+-- PARTITIONed: InnoDB does not allow foreign keys on partitioned tables.
+-- For databases created from epl_predictor.sql before seasons existed. Existing rows are
+-- assigned to 2025; change the DEFAULTs below if they belong to another season.
+-- Run it after add_prediction_versions.sql: the predictions block replaces the
+-- uq_pred_gw_player_version key that file creates (MySQL has no DROP INDEX IF EXISTS),
+-- and fails on a database that still has the older uq_pred_gw_player.
+
+ALTER TABLE `gameweeks`
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025 FIRST,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`season`,`gw`);
+
+ALTER TABLE `matches`
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025 FIRST,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`season`,`id`),
+  DROP INDEX `idx_matches_gw`,
+  ADD KEY `idx_matches_season_gw` (`season`,`gw`);
+
+ALTER TABLE `player_gameweek_stats`
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025 AFTER `id`,
+  DROP INDEX `uq_player_gw`,
+  ADD UNIQUE KEY `uq_player_season_gw` (`season`,`gw`,`player_id`),
+  ADD KEY `idx_pgs_player_season_gw` (`player_id`,`season`,`gw`),
+  DROP INDEX `idx_pgs_player`;
+
+ALTER TABLE `predictions`
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025 AFTER `id`,
+  DROP INDEX `uq_pred_gw_player_version`,
+  ADD UNIQUE KEY `uq_pred_season_gw_player_version` (`season`,`gw`,`player_id`,`model_version`),
+  DROP INDEX `idx_pred_gw`;
+
+-- players / teams hold the latest import's ids; `code` is FPL's id that is stable across
+-- seasons (used to carry history over when FPL renumbers), `season` the last season seen
+ALTER TABLE `players`
+  ADD COLUMN `code` int(11) DEFAULT NULL,
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025,
+  ADD KEY `idx_player_season` (`season`);
+
+ALTER TABLE `teams`
+  ADD COLUMN `code` int(11) DEFAULT NULL,
+  ADD COLUMN `season` smallint(6) NOT NULL DEFAULT 2025,
+  ADD KEY `idx_team_season` (`season`);
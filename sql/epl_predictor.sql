@@ -28,6 +28,7 @@ SET time_zone = "+00:00";
 --
 
 CREATE TABLE `gameweeks` (
+  `season` smallint(6) NOT NULL DEFAULT 2025,
   `gw` int(11) NOT NULL,
   `name` varchar(32) DEFAULT NULL,
   `deadline_time` datetime DEFAULT NULL,
@@ -87,6 +88,7 @@ INSERT INTO `gameweeks` (`gw`, `name`, `deadline_time`, `finished`, `is_current`
 --
 
 CREATE TABLE `matches` (
+  `season` smallint(6) NOT NULL DEFAULT 2025,
   `id` int(11) NOT NULL,
   `gw` int(11) DEFAULT NULL,
   `kickoff_time` datetime DEFAULT NULL,
@@ -503,7 +505,9 @@ CREATE TABLE `players` (
   `points_per_game` decimal(6,3) DEFAULT NULL,
   `total_points` int(11) DEFAULT NULL,
   `now_cost` int(11) DEFAULT NULL,
-  `photo` varchar(64) DEFAULT NULL
+  `photo` varchar(64) DEFAULT NULL,
+  `code` int(11) DEFAULT NULL,
+  `season` smallint(6) NOT NULL DEFAULT 2025
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -1281,6 +1285,7 @@ INSERT INTO `players` (`id`, `name`, `team_id`, `position`, `price`, `status`, `
 
 CREATE TABLE `player_gameweek_stats` (
   `id` bigint(20) NOT NULL,
+  `season` smallint(6) NOT NULL DEFAULT 2025,
   `gw` int(11) NOT NULL,
   `player_id` int(11) NOT NULL,
   `team_id` int(11) NOT NULL,
@@ -1319,16 +1324,34 @@ CREATE TABLE `player_gameweek_stats` (
 
 CREATE TABLE `predictions` (
   `id` bigint(20) NOT NULL,
+  `season` smallint(6) NOT NULL DEFAULT 2025,
   `gw` int(11) NOT NULL,
   `player_id` int(11) NOT NULL,
   `p_start` decimal(5,4) NOT NULL,
   `expected_points` decimal(6,3) NOT NULL,
+  `points_p10` decimal(6,3) DEFAULT NULL,
+  `points_p50` decimal(6,3) DEFAULT NULL,
+  `points_p90` decimal(6,3) DEFAULT NULL,
   `model_version` varchar(32) NOT NULL,
   `created_at` timestamp NOT NULL DEFAULT current_timestamp()
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `history_version`
+--
+
+CREATE TABLE `history_version` (
+  `id` int(11) NOT NULL,
+  `version` bigint(20) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+INSERT INTO `history_version` (`id`, `version`) VALUES (1, 0);
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `teams`
 --
@@ -1340,7 +1363,9 @@ CREATE TABLE `teams` (
   `strength_attack` tinyint(4) NOT NULL DEFAULT 50,
   `strength_defense` tinyint(4) NOT NULL DEFAULT 50,
   `strength_overall_home` tinyint(4) DEFAULT NULL,
-  `strength_overall_away` tinyint(4) DEFAULT NULL
+  `strength_overall_away` tinyint(4) DEFAULT NULL,
+  `code` int(11) DEFAULT NULL,
+  `season` smallint(6) NOT NULL DEFAULT 2025
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -1377,14 +1402,14 @@ INSERT INTO `teams` (`id`, `name`, `short_name`, `strength_attack`, `strength_de
 -- Indexes for table `gameweeks`
 --
 ALTER TABLE `gameweeks`
-  ADD PRIMARY KEY (`gw`);
+  ADD PRIMARY KEY (`season`,`gw`);
 
 --
 -- Indexes for table `matches`
 --
 ALTER TABLE `matches`
-  ADD PRIMARY KEY (`id`),
-  ADD KEY `idx_matches_gw` (`gw`),
+  ADD PRIMARY KEY (`season`,`id`),
+  ADD KEY `idx_matches_season_gw` (`season`,`gw`),
   ADD KEY `idx_matches_home` (`home_team_id`),
   ADD KEY `idx_matches_away` (`away_team_id`);
 
@@ -1393,15 +1418,16 @@ ALTER TABLE `matches`
 --
 ALTER TABLE `players`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `idx_player_team` (`team_id`);
+  ADD KEY `idx_player_team` (`team_id`),
+  ADD KEY `idx_player_season` (`season`);
 
 --
 -- Indexes for table `player_gameweek_stats`
 --
 ALTER TABLE `player_gameweek_stats`
   ADD PRIMARY KEY (`id`),
-  ADD UNIQUE KEY `uq_player_gw` (`gw`,`player_id`),
-  ADD KEY `idx_pgs_player` (`player_id`),
+  ADD UNIQUE KEY `uq_player_season_gw` (`season`,`gw`,`player_id`),
+  ADD KEY `idx_pgs_player_season_gw` (`player_id`,`season`,`gw`),
   ADD KEY `idx_pgs_team` (`team_id`),
   ADD KEY `fk_pgs_opp` (`opponent_team_id`);
 
@@ -1410,8 +1436,7 @@ ALTER TABLE `player_gameweek_stats`
 --
 ALTER TABLE `predictions`
   ADD PRIMARY KEY (`id`),
-  ADD UNIQUE KEY `uq_pred_gw_player` (`gw`,`player_id`),
-  ADD KEY `idx_pred_gw` (`gw`),
+  ADD UNIQUE KEY `uq_pred_season_gw_player_version` (`season`,`gw`,`player_id`,`model_version`),
   ADD KEY `fk_pred_player` (`player_id`);
 
 --
@@ -1419,7 +1444,8 @@ ALTER TABLE `predictions`
 --
 ALTER TABLE `teams`
   ADD PRIMARY KEY (`id`),
-  ADD UNIQUE KEY `uq_team_name` (`name`);
+  ADD UNIQUE KEY `uq_team_name` (`name`),
+  ADD KEY `idx_team_season` (`season`);
 
 --
 -- AUTO_INCREMENT for dumped tables